@@ -21,6 +21,22 @@ a = Analysis(
         'src',
         'src.main',
         'src.engine',
+        'src.model_cache',
+        'src.config',
+        'src.corpus',
+        'src.calibrate',
+        'src.lazy',
+        'src.backends',
+        'src.walker',
+        'src.decode',
+        'src.protocol',
+        'src.metrics',
+        'src.profiling',
+        'src.book',
+        'src.lines',
+        'src.rating',
+        'src.registry',
+        'src.trace',
         'src.server',
         'src.tray',
         'src.updater',
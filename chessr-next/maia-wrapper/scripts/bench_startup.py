@@ -0,0 +1,108 @@
+"""
+Startup benchmark: time from a fresh interpreter to the first Maia-2 inference.
+
+Usage:
+    python -m scripts.bench_startup [--model model.onnx] [--runs 5] [--provider cpu]
+
+Every run is a new Python process, so imports, model hashing and session
+creation are measured cold. Three scenarios are compared:
+
+    no-cache    session built from the raw model.onnx (the old startup path)
+    cold-cache  first launch: optimizes the model and fills the ORT cache
+    warm-cache  later launches: loads the cached optimized model (mmapped)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def _child(args):
+    t0 = time.perf_counter()
+    from src.engine import MaiaEngine, EngineConfig
+    import_ms = (time.perf_counter() - t0) * 1000
+
+    config = EngineConfig(provider=args.provider, threads=args.threads,
+                          model_cache=not args.no_cache)
+    engine = MaiaEngine(args.model, config)
+    total_ms = (time.perf_counter() - t0) * 1000
+    print(json.dumps({
+        "import_ms": import_ms,
+        **engine.startup_timings,
+        "total_ms": total_ms,
+        "cache_hit": engine.model_cache_hit,
+    }))
+
+
+def _spawn(args, cache_dir: str, no_cache: bool) -> dict:
+    cmd = [sys.executable, "-m", "scripts.bench_startup", "--child",
+           "--model", args.model, "--provider", args.provider, "--threads", str(args.threads)]
+    if no_cache:
+        cmd.append("--no-cache")
+    env = dict(os.environ, MAIA_ORT_CACHE=cache_dir)
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall_ms
+    return result
+
+
+def _report(name: str, runs: list[dict]):
+    keys = ["wall_ms", "total_ms", "import_ms", "runtime_ms", "hash_ms",
+            "optimize_ms", "session_ms", "first_inference_ms"]
+    print(f"\n[ {name} ]  ({len(runs)} runs, median)")
+    for k in keys:
+        values = [r[k] for r in runs if k in r]
+        if values:
+            print(f"  {k.removesuffix('_ms'):18s} {statistics.median(values):8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=str(ROOT / "model.onnx"))
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--provider", default="auto")
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    args.model = os.path.abspath(args.model)
+    if not os.path.exists(args.model):
+        raise SystemExit(f"missing model: {args.model}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        no_cache = [_spawn(args, tmp, no_cache=True) for _ in range(args.runs)]
+
+        cold = []
+        for i in range(args.runs):
+            cold.append(_spawn(args, os.path.join(tmp, f"cold{i}"), no_cache=False))
+
+        warm_dir = os.path.join(tmp, "warm")
+        _spawn(args, warm_dir, no_cache=False)  # fill the cache, not recorded
+        warm = [_spawn(args, warm_dir, no_cache=False) for _ in range(args.runs)]
+
+    _report("no-cache", no_cache)
+    _report("cold-cache", cold)
+    _report("warm-cache", warm)
+
+    base = statistics.median(r["total_ms"] for r in no_cache)
+    best = statistics.median(r["total_ms"] for r in warm)
+    print(f"\nTime to first inference: {base:.0f} ms → {best:.0f} ms ({base / best:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,30 @@
 """
-Export Maia-2 PyTorch model to ONNX format.
+Export Maia-2 PyTorch models to ONNX format.
 
 Usage:
     pip install torch maia2
-    python -m scripts.export_onnx
+    python -m scripts.export_onnx                 # rapid -> model.onnx
+    python -m scripts.export_onnx --type blitz    # blitz -> blitz_model.onnx
 
-This only needs to be run once to generate model.onnx.
-The resulting ONNX file is then bundled into the app.
+This only needs to be run once per model. model.onnx is bundled into the
+app; blitz_model.onnx (and any fp16 / int8 conversion from maia2-wasm/python)
+placed next to it is picked up by the model registry and used for blitz
+and bullet games.
 """
 
-import sys
+import argparse
 from pathlib import Path
 
 import torch
 
+OUTPUT_NAMES = {"rapid": "model.onnx", "blitz": "blitz_model.onnx"}
 
-def export():
+
+def export(model_type: str = "rapid", output_path: Path = None):
     from maia2 import model as maia_model
 
-    print("Loading Maia-2 pretrained model (rapid)...")
-    m = maia_model.from_pretrained(type="rapid", device="cpu")
+    print(f"Loading Maia-2 pretrained model ({model_type})...")
+    m = maia_model.from_pretrained(type=model_type, device="cpu")
     m.eval()
 
     print("Preparing dummy inputs...")
@@ -27,7 +32,7 @@ def export():
     dummy_elo_self = torch.tensor([5], dtype=torch.long)  # category index
     dummy_elo_oppo = torch.tensor([5], dtype=torch.long)
 
-    output_path = Path(__file__).parent.parent / "model.onnx"
+    output_path = output_path or Path(__file__).parent.parent / OUTPUT_NAMES[model_type]
 
     print(f"Exporting to {output_path}...")
     # Use dynamo=False to force legacy TorchScript-based export
@@ -42,6 +47,9 @@ def export():
             "boards": {0: "batch"},
             "elos_self": {0: "batch"},
             "elos_oppo": {0: "batch"},
+            "logits_maia": {0: "batch"},
+            "logits_side_info": {0: "batch"},
+            "logits_value": {0: "batch"},
         },
         opset_version=17,
         dynamo=False,
@@ -52,4 +60,8 @@ def export():
 
 
 if __name__ == "__main__":
-    export()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", choices=sorted(OUTPUT_NAMES), default="rapid")
+    parser.add_argument("--out", type=Path, help="output path (default: next to the app)")
+    args = parser.parse_args()
+    export(args.type, args.out)
@@ -0,0 +1,55 @@
+"""
+Per-operator profile of the Maia-2 model on this machine.
+
+Usage:
+    python -m scripts.profile_ops [--model model.onnx] [--provider cpu] [--threads 4]
+                                  [--batch 1 8] [--runs 50] [--json out.json] [--trace trace.json]
+
+Prints time per op type, per model module and the hottest nodes for each
+batch size — run it before and after a quantization or graph change to see
+where the time went.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from src.engine import MaiaEngine, EngineConfig
+from src.profiling import profile_engine, format_report
+
+ROOT = Path(__file__).parent.parent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.environ.get("MAIA_MODEL", str(ROOT / "model.onnx")))
+    ap.add_argument("--provider", default="cpu")
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 8])
+    ap.add_argument("--runs", type=int, default=50)
+    ap.add_argument("--max-seconds", type=float, default=10.0)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--json", help="write the full reports here")
+    ap.add_argument("--trace", help="keep the raw ORT trace (last batch size) here")
+    args = ap.parse_args()
+
+    engine = MaiaEngine(args.model, EngineConfig(provider=args.provider, threads=args.threads))
+    if not engine.supports_profiling:
+        raise SystemExit(f"--provider {engine.active_provider} has no per-operator profiling; "
+                         f"use an ONNX Runtime provider (cpu, coreml, directml)")
+    reports = []
+    for batch_size in args.batch:
+        report = profile_engine(engine, runs=args.runs, batch_size=batch_size,
+                                max_seconds=args.max_seconds, keep_trace=args.trace)
+        reports.append(report)
+        print(format_report(report, rows=args.top))
+        print()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(reports, indent=2))
+        print(f"Saved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
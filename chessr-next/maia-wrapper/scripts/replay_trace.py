@@ -0,0 +1,200 @@
+"""
+Replay a recorded request trace (src/trace.py) against engine configurations.
+
+Usage:
+    python -m scripts.replay_trace trace.jsonl.gz [--model model.onnx]
+        [--provider cpu,native] [--threads 1,4] [--cache-size 4096,0]
+        [--window-ms 0,5] [--max-batch 64] [--speed 1] [--limit N] [--json out.json]
+
+Each comma-separated option is a list; every combination is replayed in
+turn, on a fresh engine (empty result cache), and reported side by side.
+
+Requests are issued at their recorded times divided by --speed (2 = twice
+as fast; 0 = back to back, for peak throughput) and served one at a time,
+like the server does. Latency is measured from a request's scheduled
+arrival to its reply, so it includes queueing behind earlier requests.
+
+--window-ms simulates a batching front end: the first `analyze` waiting
+opens a window, and every `analyze` arriving within it (same model variant,
+up to --max-batch) is answered by one batched pass. `analyze_batch`
+requests always run alone, as they do in the server.
+"""
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def _list(cast):
+    return lambda text: [cast(v) for v in text.split(",") if v.strip()]
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _serve(registry, group: list, chess):
+    """Answer a group of events the way the server would."""
+    head = group[0]
+    with registry.engine(head.time_control, head.precision) as engine:
+        if head.batch:
+            fens, elos_self, elos_oppo = zip(*head.positions)
+            engine.predict_batch(list(fens), list(elos_self), list(elos_oppo), top_n=head.top_n)
+        elif len(group) == 1:
+            fen, elo_self, elo_oppo = head.positions[0]
+            engine.predict(fen, elo_self, elo_oppo, top_n=head.top_n)
+        else:
+            # predict_boards batches positions sharing an Elo pair and top_n.
+            by_key: dict[tuple, list] = {}
+            for ev in group:
+                fen, elo_self, elo_oppo = ev.positions[0]
+                by_key.setdefault((elo_self, elo_oppo, ev.top_n), []).append(chess.Board(fen))
+            for (elo_self, elo_oppo, top_n), boards in by_key.items():
+                engine.predict_boards(boards, elo_self, elo_oppo, top_n=top_n)
+
+
+def replay(events: list, registry, speed: float, window_ms: float, max_batch: int) -> dict:
+    from src.lazy import chess
+    from src.metrics import REGISTRY as metrics
+
+    hits0, misses0 = metrics.cache_hits.value, metrics.cache_misses.value
+    latencies, batch_sizes, positions, errors = [], [], 0, 0
+    start = time.perf_counter()
+
+    def arrival(ev) -> float:
+        return start + ev.t_ms / 1000 / speed if speed > 0 else time.perf_counter()
+
+    def wait_until(t: float):
+        delay = t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    i = 0
+    while i < len(events):
+        head = events[i]
+        due = arrival(head)
+        wait_until(due)
+        group, dues = [head], [due]
+        i += 1
+        if window_ms > 0 and not head.batch:
+            deadline = due + window_ms / 1000
+            while i < len(events) and len(group) < max_batch:
+                ev = events[i]
+                if ev.batch or ev.route != head.route:
+                    break
+                ev_due = arrival(ev)
+                if ev_due > deadline:
+                    break
+                wait_until(ev_due)
+                group.append(ev)
+                dues.append(ev_due)
+                i += 1
+            if len(group) < max_batch and speed > 0:
+                wait_until(deadline)  # the window stays open its full length
+        try:
+            _serve(registry, group, chess)
+        except Exception as e:  # a bad FEN in the trace: the server answers with an error too
+            errors += len(group)
+            print(f"  request failed: {e}", file=sys.stderr)
+        done = time.perf_counter()
+        latencies += [(done - d) * 1000 for d in dues]
+        batch_sizes.append(sum(len(ev.positions) for ev in group))
+        positions += batch_sizes[-1]
+
+    wall = time.perf_counter() - start
+    latencies.sort()
+    hits = metrics.cache_hits.value - hits0
+    lookups = hits + metrics.cache_misses.value - misses0
+    return {
+        "requests": len(latencies),
+        "positions": positions,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(latencies) / wall, 1),
+        "positions_per_s": round(positions / wall, 1),
+        "p50_ms": round(_percentile(latencies, 0.50), 2),
+        "p90_ms": round(_percentile(latencies, 0.90), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "mean_batch": round(statistics.mean(batch_sizes), 2) if batch_sizes else None,
+        "cache_hit_rate": round(hits / lookups, 3) if lookups else None,
+    }
+
+
+def _summary(events: list) -> str:
+    positions = sum(len(ev.positions) for ev in events)
+    unique = len({p[0].split(" ")[0] for ev in events for p in ev.positions})
+    elo_pairs = len({p[1:] for ev in events for p in ev.positions})
+    span = events[-1].t_ms / 1000 if events else 0
+    return (f"{len(events)} requests ({sum(ev.batch for ev in events)} batches), {positions} positions, "
+            f"{unique} distinct boards, {elo_pairs} Elo pairs over {span:.1f} s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("trace")
+    ap.add_argument("--model", default=str(ROOT / "model.onnx"))
+    ap.add_argument("--provider", type=_list(str), default=["auto"])
+    ap.add_argument("--threads", type=_list(int), default=[0])
+    ap.add_argument("--cache-size", type=_list(int), default=None,
+                    help="result cache entries (default: the engine's)")
+    ap.add_argument("--window-ms", type=_list(float), default=[0.0])
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="replay rate vs. recorded (0 = back to back)")
+    ap.add_argument("--limit", type=int, default=0, help="first N requests only")
+    ap.add_argument("--json", help="write the results here as well")
+    args = ap.parse_args()
+
+    from src.engine import EngineConfig, RESULT_CACHE_SIZE
+    from src.registry import ModelRegistry
+    from src.trace import read_trace
+
+    events = list(read_trace(args.trace))
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        raise SystemExit(f"no requests in {args.trace}")
+    print(f"Trace: {_summary(events)}", file=sys.stderr)
+
+    results = []
+    combos = itertools.product(args.provider, args.threads, args.cache_size or [RESULT_CACHE_SIZE],
+                               args.window_ms)
+    for provider, threads, cache_size, window_ms in combos:
+        config = EngineConfig(provider=provider, threads=threads, result_cache_size=cache_size)
+        registry = ModelRegistry(args.model, config)
+        engine = registry.default
+        name = (f"{engine.active_provider} t={engine.active_threads} "
+                f"cache={cache_size} window={window_ms:g}ms")
+        print(f"Replaying on {name}...", file=sys.stderr)
+        stats = replay(events, registry, args.speed, window_ms, args.max_batch)
+        results.append({"config": {"provider": engine.active_provider, "threads": engine.active_threads,
+                                   "cache_size": cache_size, "window_ms": window_ms,
+                                   "max_batch": args.max_batch, "speed": args.speed},
+                        "name": name, **stats})
+
+    print(f"\n{'config':40s} {'req/s':>8s} {'pos/s':>8s} {'p50':>8s} {'p90':>8s} {'p99':>8s} "
+          f"{'max':>8s} {'batch':>6s} {'cache':>6s}")
+    for r in results:
+        hit = f"{r['cache_hit_rate']:.0%}" if r["cache_hit_rate"] is not None else "-"
+        print(f"{r['name']:40s} {r['requests_per_s']:8.1f} {r['positions_per_s']:8.1f} "
+              f"{r['p50_ms']:8.2f} {r['p90_ms']:8.2f} {r['p99_ms']:8.2f} {r['max_ms']:8.2f} "
+              f"{r['mean_batch']:6.2f} {hit:>6s}")
+    print("(latencies in ms, from scheduled arrival to reply)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"trace": args.trace, "events": len(events),
+                                               "results": results}, indent=2))
+        print(f"✓ {args.json}")
+
+
+if __name__ == "__main__":
+    main()
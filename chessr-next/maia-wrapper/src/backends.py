@@ -0,0 +1,352 @@
+"""
+Inference backends for MaiaEngine.
+
+A backend runs the raw forward pass on already-encoded boards; board encoding,
+legal-move masking and decoding stay in MaiaEngine, so every backend returns
+identical results for identical logits.
+
+    OrtBackend     ONNX Runtime session (cpu / coreml / directml providers)
+    NativeBackend  the hand-written C++ runtime from maia2-wasm/maia-runtime,
+                   loaded in-process from a shared library via ctypes
+"""
+
+from __future__ import annotations
+
+import ctypes
+import logging
+import mmap
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from . import model_cache
+from .lazy import np, ort
+
+logger = logging.getLogger("maia-engine")
+
+NUM_MOVES = 1880
+
+
+def available_providers() -> list[str]:
+    return ort.get_available_providers()
+
+
+def available_provider_names(model_path: str = None) -> list[str]:
+    """Short names of the non-default backends usable here ("cpu" is implied)."""
+    available = available_providers()
+    names = []
+    if "CoreMLExecutionProvider" in available:
+        names.append("coreml")
+    if "DmlExecutionProvider" in available:
+        names.append("directml")
+    if model_path and find_native_runtime(model_path):
+        names.append("native")
+    return names
+
+
+def _resolve_provider(provider: str) -> tuple[list, str]:
+    """Returns (providers_list, resolved_name) — falls back to CPU if unavailable."""
+    available = ort.get_available_providers()
+
+    if provider == "auto":
+        if platform.system() == "Darwin" and "CoreMLExecutionProvider" in available:
+            return ["CoreMLExecutionProvider", "CPUExecutionProvider"], "coreml"
+        if platform.system() == "Windows" and "DmlExecutionProvider" in available:
+            return ["DmlExecutionProvider", "CPUExecutionProvider"], "directml"
+        return ["CPUExecutionProvider"], "cpu"
+
+    provider_map = {
+        "coreml": "CoreMLExecutionProvider",
+        "directml": "DmlExecutionProvider",
+        "cpu": "CPUExecutionProvider",
+    }
+    ep = provider_map.get(provider, "CPUExecutionProvider")
+    if ep in available:
+        providers = [ep, "CPUExecutionProvider"] if ep != "CPUExecutionProvider" else ["CPUExecutionProvider"]
+        return providers, provider
+    return ["CPUExecutionProvider"], "cpu"
+
+
+class OrtBackend:
+    """ONNX Runtime session, optionally loaded from the optimized-model cache."""
+
+    supports_profiling = True  # per-operator traces, see profile()
+
+    def __init__(self, model_path: str, provider: str, threads: int,
+                 use_cache: bool = True, progress: Callable[[str], None] = None):
+        self._model_path = model_path
+        self._progress = progress or (lambda phase: None)
+        self.timings: dict[str, float] = {}
+
+        providers, self.name = _resolve_provider(provider)
+        self.threads = threads
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+
+        t0 = time.perf_counter()
+        path = self._model_path
+        self.model_cache_hit = False
+        if use_cache:
+            try:
+                path = self._cached_model(opts)
+            except Exception:
+                # A broken cache must never stop the engine from starting.
+                path = self._model_path
+        if path == self._model_path:
+            self._progress("load")
+        self.session = ort.InferenceSession(
+            str(path),
+            sess_options=opts,
+            providers=providers,
+        )
+        self.timings["session_ms"] = (time.perf_counter() - t0) * 1000
+        # Kept so profile() can rebuild an identical session.
+        self._session_path, self._providers = str(path), providers
+        self._graph_level = opts.graph_optimization_level
+
+    def profile(self, feeds: list[tuple], prefix: str, max_seconds: float) -> str:
+        """Replay (boards, elos_self, elos_oppo) feeds with ORT profiling on.
+
+        Runs on a separate session built like the live one, so the live
+        session never pays for profiling. Stops after `max_seconds` (at least
+        one run). Returns the path of the Chrome-trace JSON ORT wrote.
+        """
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = self.threads
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = self._graph_level
+        opts.enable_profiling = True
+        opts.profile_file_prefix = prefix
+        session = ort.InferenceSession(self._session_path, sess_options=opts, providers=self._providers)
+
+        deadline = time.perf_counter() + max_seconds
+        for boards, elos_self, elos_oppo in feeds:
+            session.run(["logits_maia", "logits_value"], {
+                "boards": boards,
+                "elos_self": elos_self,
+                "elos_oppo": elos_oppo,
+            })
+            if time.perf_counter() > deadline:
+                break
+        return session.end_profiling()
+
+    def _cached_model(self, opts) -> str:
+        """Return the ORT-optimized model for the active provider, building it on a miss.
+
+        The cached graph is optimized offline on the CPU provider (compiling
+        EPs like CoreML cannot serialize their nodes). CPU targets get the full
+        ORT_ENABLE_ALL pass set and load with optimizations off; other
+        providers only get the EP-agnostic basic passes and keep optimizing at
+        load time.
+        """
+        t0 = time.perf_counter()
+        self._progress("hash")
+        digest = model_cache.model_digest(self._model_path)
+        key = model_cache.cache_key(digest, self.name, ort.__version__)
+        self.timings["hash_ms"] = (time.perf_counter() - t0) * 1000
+
+        cpu_target = self.name == "cpu"
+        cached = model_cache.entry_path(key)
+        if not cached.exists():
+            self._progress("optimize")
+            t0 = time.perf_counter()
+            staged = model_cache.staging_path(key)
+            build = ort.SessionOptions()
+            build.graph_optimization_level = (
+                ort.GraphOptimizationLevel.ORT_ENABLE_ALL if cpu_target
+                else ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+            )
+            build.optimized_model_filepath = str(staged)
+            build.log_severity_level = 3  # expected "hardware specific" save warning
+            # Weights go to an external file: ORT memory-maps it on load.
+            build.add_session_config_entry(
+                "session.optimized_model_external_initializers_file_name",
+                model_cache.external_data_name(),
+            )
+            build.add_session_config_entry(
+                "session.optimized_model_external_initializers_min_size_in_bytes", "1024",
+            )
+            ort.InferenceSession(self._model_path, sess_options=build,
+                                 providers=["CPUExecutionProvider"])
+            cached = model_cache.commit(staged, key)
+            self.timings["optimize_ms"] = (time.perf_counter() - t0) * 1000
+        else:
+            model_cache.touch(key)
+            self.model_cache_hit = True
+
+        self._progress("load")
+        if cpu_target:
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return str(cached)
+
+    def run(self, boards: np.ndarray, elos_self: np.ndarray, elos_oppo: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        outputs = self.session.run(
+            ["logits_maia", "logits_value"],
+            {
+                "boards": boards,
+                "elos_self": elos_self,
+                "elos_oppo": elos_oppo,
+            },
+        )
+        return outputs[0], outputs[1]
+
+
+# ---------------------------------------------------------------------------
+# Native C++ runtime
+# ---------------------------------------------------------------------------
+
+_LIB_NAMES = {"Darwin": "libmaia.dylib", "Windows": "maia.dll"}
+
+
+def _native_weights_name(model_path: str) -> str | None:
+    """weights.bin for model.onnx, {kind}_weights.bin for {kind}_model.onnx;
+    None for fp16 / int8 exports (the runtime is fp32 only)."""
+    stem = Path(model_path).name.removesuffix(".onnx")
+    if "." in stem:
+        return None
+    kind, sep, rest = stem.partition("_model")
+    return f"{kind}_weights.bin" if sep and kind and not rest else "weights.bin"
+
+
+def find_native_runtime(model_path: str) -> tuple[Path, Path] | None:
+    """Locate (shared library, weights blob) for the native backend.
+
+    Defaults to files next to the model; MAIA_NATIVE_LIB / MAIA_NATIVE_WEIGHTS
+    override (the latter for model.onnx only). Build them with
+    maia2-wasm/maia-runtime/native/build_shared.sh.
+    """
+    name = _native_weights_name(model_path)
+    if name is None:
+        return None
+    base = Path(model_path).parent
+    lib = Path(os.environ.get("MAIA_NATIVE_LIB", base / _LIB_NAMES.get(platform.system(), "libmaia.so")))
+    weights = base / name
+    if name == "weights.bin":
+        weights = Path(os.environ.get("MAIA_NATIVE_WEIGHTS", weights))
+    if lib.exists() and weights.exists():
+        return lib, weights
+    return None
+
+
+class NativeBackend:
+    """In-process binding to the C++ forward pass (native/maia_capi.cpp).
+
+    The weights file is memory-mapped copy-on-write and handed to the
+    runtime as-is, so loading costs no copy and pages fault in on first use.
+    Batches are split across `threads` concurrent calls; each borrows its
+    own activation context and all of them read the one mapping.
+    """
+
+    MIN_ROWS_PER_THREAD = 4
+    supports_profiling = False  # no per-operator trace from the C++ runtime
+
+    def __init__(self, lib_path: Path, weights_path: Path, threads: int = 1):
+        t0 = time.perf_counter()
+        self.name = "native"
+        self.model_cache_hit = False
+        self.timings: dict[str, float] = {}
+
+        lib = ctypes.CDLL(str(lib_path))
+        lib.maia_create.restype = ctypes.c_void_p
+        lib.maia_create.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        lib.maia_destroy.restype = None
+        lib.maia_destroy.argtypes = [ctypes.c_void_p]
+        lib.maia_forward_batch.restype = ctypes.c_int
+        lib.maia_forward_batch.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_float),
+            ctypes.POINTER(ctypes.c_int64),
+            ctypes.POINTER(ctypes.c_int64),
+            ctypes.c_size_t,
+            ctypes.POINTER(ctypes.c_float),
+            ctypes.POINTER(ctypes.c_float),
+        ]
+        self._lib = lib
+        # Libraries built before maia_context_bytes existed share one set of
+        # activation buffers per handle: calls must be serialized.
+        self._reentrant = hasattr(lib, "maia_context_bytes")
+        self.threads = max(1, threads) if self._reentrant else 1
+
+        with open(weights_path, "rb") as f:
+            self._weights = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._weights_buf = (ctypes.c_char * len(self._weights)).from_buffer(self._weights)
+        self._handle = lib.maia_create(ctypes.addressof(self._weights_buf), len(self._weights))
+        if not self._handle:
+            raise RuntimeError(f"Native runtime rejected {weights_path} (size mismatch?)")
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="maia-native") if self.threads > 1 else None
+        self.timings["session_ms"] = (time.perf_counter() - t0) * 1000
+
+    def run(self, boards: np.ndarray, elos_self: np.ndarray, elos_oppo: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        n = len(boards)
+        boards = np.ascontiguousarray(boards, dtype=np.float32)
+        elos_self = np.ascontiguousarray(elos_self, dtype=np.int64)
+        elos_oppo = np.ascontiguousarray(elos_oppo, dtype=np.int64)
+        logits = np.empty((n, NUM_MOVES), dtype=np.float32)
+        values = np.empty(n, dtype=np.float32)
+        shards = min(self.threads, n // self.MIN_ROWS_PER_THREAD)
+        if shards > 1:
+            bounds = np.linspace(0, n, shards + 1).astype(np.int64)
+            ok = all(self._pool.map(
+                lambda s: self._forward(boards, elos_self, elos_oppo, logits, values, bounds[s], bounds[s + 1]),
+                range(shards),
+            ))
+        else:
+            ok = self._forward(boards, elos_self, elos_oppo, logits, values, 0, n)
+        if not ok:
+            raise RuntimeError("Native forward pass failed")
+        return logits, values
+
+    def _forward(self, boards, elos_self, elos_oppo, logits, values, start: int, end: int) -> bool:
+        f32 = ctypes.POINTER(ctypes.c_float)
+        i64 = ctypes.POINTER(ctypes.c_int64)
+        args = (
+            self._handle,
+            boards[start:end].ctypes.data_as(f32),
+            elos_self[start:end].ctypes.data_as(i64),
+            elos_oppo[start:end].ctypes.data_as(i64),
+            int(end - start),
+            logits[start:end].ctypes.data_as(f32),
+            values[start:end].ctypes.data_as(f32),
+        )
+        # ctypes drops the GIL for the call itself.
+        if self._reentrant:
+            return bool(self._lib.maia_forward_batch(*args))
+        with self._lock:
+            return bool(self._lib.maia_forward_batch(*args))
+
+    def __del__(self):
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=True)
+        handle = getattr(self, "_handle", None)
+        if handle:
+            self._lib.maia_destroy(handle)
+            self._handle = None
+
+
+def create_backend(model_path: str, provider: str, threads: int, use_cache: bool = True,
+                   progress: Callable[[str], None] = None):
+    """Build the backend for an EngineConfig provider name.
+
+    Like unavailable ORT providers, a missing or broken native runtime falls
+    back to the CPU provider (check `.name` for what actually got loaded).
+    """
+    if provider == "native":
+        found = find_native_runtime(model_path)
+        if found is not None:
+            (progress or (lambda phase: None))("load")
+            try:
+                return NativeBackend(*found, threads=threads)
+            except Exception as e:
+                logger.warning(f"Native runtime failed to load ({e}), using CPU")
+        else:
+            logger.warning(f"Native runtime not found next to {model_path}, using CPU")
+        provider = "cpu"
+    return OrtBackend(model_path, provider, threads, use_cache=use_cache, progress=progress)
@@ -0,0 +1,94 @@
+"""
+Polyglot opening-book lookups.
+
+The book (maia2-wasm/python/build_book.py output, or any Polyglot .bin) is
+memory-mapped and never loaded: lookups binary-search the sorted 16-byte
+entries in place, vectorized over a batch of position keys, so tagging a
+game's opening costs ~log2(entries) page reads per position whatever the
+book size.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from .lazy import chess, np
+
+BOOK_NAME = "book.bin"
+
+
+def book_dtype() -> np.dtype:
+    """One Polyglot entry: big-endian key, raw move, weight, learn (16 bytes)."""
+    return np.dtype([("key", ">u8"), ("move", ">u2"), ("weight", ">u2"), ("learn", ">u4")])
+
+
+def polyglot_key(board: chess.Board) -> int:
+    import chess.polyglot
+    return chess.polyglot.zobrist_hash(board)
+
+
+def find_book(model_path: str) -> Path | None:
+    """book.bin next to the model; MAIA_BOOK overrides."""
+    path = Path(os.environ.get("MAIA_BOOK", Path(model_path).parent / BOOK_NAME))
+    return path if path.exists() else None
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = Path(path)
+        size = self.path.stat().st_size
+        if size % 16:
+            raise ValueError(f"{path}: {size} bytes is not a whole number of Polyglot entries")
+        if size:
+            self._entries = np.memmap(self.path, dtype=book_dtype(), mode="r")
+        else:
+            self._entries = np.zeros(0, dtype=book_dtype())
+        self._keys = self._entries["key"]  # strided view, still backed by the map
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lower_bound(self, keys: np.ndarray) -> np.ndarray:
+        """Index of the first entry with key >= each of `keys`."""
+        n = len(self._keys)
+        lo = np.zeros(len(keys), dtype=np.int64)
+        hi = np.full(len(keys), n, dtype=np.int64)
+        while True:
+            active = lo < hi
+            if not active.any():
+                return lo
+            mid = (lo + hi) // 2
+            probe = self._keys[np.minimum(mid, n - 1)].astype(np.uint64)
+            right = active & (probe < keys)
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(active & ~right, mid, hi)
+
+    def contains(self, keys) -> np.ndarray:
+        """[N] bool: which position keys have at least one book move."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self._keys) or not len(keys):
+            return np.zeros(len(keys), dtype=bool)
+        idx = self._lower_bound(keys)
+        found = idx < len(self._keys)
+        found[found] = self._keys[idx[found]].astype(np.uint64) == keys[found]
+        return found
+
+    def moves(self, board: chess.Board, key: int = None) -> list[tuple[str, int]]:
+        """(UCI move, weight) of every book move from `board`, heaviest first."""
+        key = polyglot_key(board) if key is None else key
+        i = int(self._lower_bound(np.array([key], dtype=np.uint64))[0])
+        found = []
+        while i < len(self._keys) and int(self._keys[i]) == key:
+            found.append((self._decode(board, int(self._entries["move"][i])), int(self._entries["weight"][i])))
+            i += 1
+        return sorted(found, key=lambda m: -m[1])
+
+    @staticmethod
+    def _decode(board: chess.Board, raw: int) -> str:
+        to_sq, from_sq, promo = raw & 0x3F, (raw >> 6) & 0x3F, (raw >> 12) & 0x7
+        # Polyglot castles king-takes-own-rook (e1h1); play it as the king move.
+        if board.piece_type_at(from_sq) == chess.KING and board.piece_at(to_sq) == chess.Piece(chess.ROOK, board.turn):
+            file = 6 if chess.square_file(to_sq) > chess.square_file(from_sq) else 2
+            to_sq = chess.square(file, chess.square_rank(from_sq))
+        return chess.Move(from_sq, to_sq, promo + 1 if promo else None).uci()
@@ -0,0 +1,160 @@
+"""
+One-time engine calibration.
+
+Benchmarks every available provider, a range of thread counts and a few batch
+sizes on this machine with the bench corpus, then stores the fastest
+provider/thread combination, along with the measured numbers, in
+~/.chessr/maia_config.json.
+
+Usage:
+    python -m src.calibrate [--model model.onnx]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Callable
+
+from .config import load_config, save_config
+from .corpus import BENCH_FENS
+from .engine import (
+    MaiaEngine, EngineConfig, available_provider_names,
+    chess, np, encode_position, _elo_to_category,
+)
+
+logger = logging.getLogger("maia-calibrate")
+
+CALIBRATION_VERSION = 1
+BATCH_SIZES = (1, 8, 32)
+REPEATS = 3
+
+
+def thread_candidates(cpu_count: int) -> list[int]:
+    """Powers of two up to the core count, plus half and all cores."""
+    counts = {1, max(1, cpu_count // 2), cpu_count}
+    n = 2
+    while n < cpu_count:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def _encode_corpus() -> tuple[np.ndarray, np.ndarray]:
+    boards = np.stack([encode_position(chess.Board(fen)) for fen in BENCH_FENS])
+    elos = np.full(len(BENCH_FENS), _elo_to_category(1500), dtype=np.int64)
+    return boards, elos
+
+
+def _measure(engine: MaiaEngine, boards: np.ndarray, elos: np.ndarray,
+             batch_sizes=BATCH_SIZES, repeats: int = REPEATS) -> dict:
+    """Median single-position latency and positions/s for each batch size."""
+    n = len(boards)
+    latencies = []
+    for _ in range(repeats):
+        for i in range(n):
+            t0 = time.perf_counter()
+            engine.infer(boards[i:i + 1], elos[i:i + 1], elos[i:i + 1])
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    throughput = {}
+    for size in batch_sizes:
+        idx = np.arange(size) % n
+        batch, batch_elos = np.ascontiguousarray(boards[idx]), elos[idx]
+        engine.infer(batch, batch_elos, batch_elos)  # first run at this shape allocates
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            engine.infer(batch, batch_elos, batch_elos)
+            times.append(time.perf_counter() - t0)
+        throughput[str(size)] = round(size / statistics.median(times), 1)
+
+    return {
+        "latency_ms": round(statistics.median(latencies), 2),
+        "throughput": throughput,
+    }
+
+
+def calibrate(model_path: str, batch_sizes=BATCH_SIZES, repeats: int = REPEATS,
+              progress: Callable[[str], None] = None) -> dict:
+    """Benchmark every provider × thread count and pick the lowest latency.
+
+    Live play analyzes one position at a time, so the winner is chosen on
+    batch-1 latency; batch throughput is recorded alongside for reference.
+    """
+    progress = progress or (lambda step: None)
+    cpu_count = os.cpu_count() or 2
+    boards, elos = _encode_corpus()
+
+    # Accelerated providers still run leftover nodes on CPU threads, but the
+    # thread count barely matters there — only the CPU-bound providers (ORT's
+    # CPU provider and the native runtime's worker pool) get a sweep.
+    configs = [("cpu", t) for t in thread_candidates(cpu_count)]
+    for p in available_provider_names(model_path):
+        if p == "native":
+            configs += [(p, t) for t in thread_candidates(cpu_count)]
+        else:
+            configs.append((p, max(1, cpu_count // 2)))
+
+    results = []
+    for i, (provider, threads) in enumerate(configs):
+        progress(f"{provider} · {threads} threads ({i + 1}/{len(configs)})")
+        try:
+            engine = MaiaEngine(model_path, EngineConfig(provider=provider, threads=threads))
+            if engine.active_provider != provider:
+                continue  # provider fell back to CPU — already measured
+            measured = _measure(engine, boards, elos, batch_sizes, repeats)
+        except Exception as e:
+            logger.warning(f"Calibration of {provider}/{threads} failed: {e}")
+            continue
+        finally:
+            engine = None
+        results.append({"provider": provider, "threads": threads, **measured})
+        logger.info(f"Calibration {provider}/{threads}: {measured['latency_ms']:.2f} ms, "
+                    f"throughput {measured['throughput']}")
+
+    if not results:
+        raise RuntimeError("Calibration failed for every configuration")
+
+    best = min(results, key=lambda r: r["latency_ms"])
+    return {
+        "version": CALIBRATION_VERSION,
+        "timestamp": int(time.time()),
+        "cpu_count": cpu_count,
+        "positions": len(BENCH_FENS),
+        "winner": {"provider": best["provider"], "threads": best["threads"]},
+        "results": results,
+    }
+
+
+def apply_calibration(config: dict, result: dict) -> dict:
+    """Merge the winning provider/threads into `config` and persist it."""
+    new_config = {
+        **config,
+        "provider": result["winner"]["provider"],
+        "threads": result["winner"]["threads"],
+        "calibration": result,
+    }
+    save_config(new_config)
+    return new_config
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.environ.get(
+        "MAIA_MODEL", str(Path(__file__).parent.parent / "model.onnx")))
+    args = ap.parse_args()
+
+    result = calibrate(args.model, progress=lambda step: print(f"  {step}"))
+    apply_calibration(load_config(), result)
+    w = result["winner"]
+    print(f"\nSaved: provider={w['provider']} threads={w['threads']}")
+
+
+if __name__ == "__main__":
+    main()
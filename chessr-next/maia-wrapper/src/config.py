@@ -0,0 +1,20 @@
+"""
+Persisted engine settings (~/.chessr/maia_config.json).
+"""
+
+import json
+from pathlib import Path
+
+CONFIG_PATH = Path.home() / ".chessr" / "maia_config.json"
+
+
+def load_config() -> dict:
+    try:
+        return json.loads(CONFIG_PATH.read_text())
+    except Exception:
+        return {"provider": "auto", "threads": 0}
+
+
+def save_config(config: dict):
+    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CONFIG_PATH.write_text(json.dumps(config))
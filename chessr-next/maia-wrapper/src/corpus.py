@@ -0,0 +1,42 @@
+"""
+Fixed position corpus used to benchmark and calibrate the engine.
+
+A mix of opening, middlegame and endgame positions with both sides to move,
+taken from the runtime parity set and from real Chessr games.
+"""
+
+BENCH_FENS = [
+    # Parity reference set (maia2-wasm/maia-runtime/scripts/make_reference.py)
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/2N2N2/PPPP1PPP/R1BQK2R b KQkq - 5 4",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "8/8/4k3/8/4K3/8/4P3/8 w - - 0 1",
+    "rnbqkb1r/pp3ppp/2p1pn2/3p4/2PP4/2N1PN2/PP3PPP/R1BQKB1R w KQkq - 0 5",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R1BQ1RK1 w - - 0 8",
+    # Real games (scripts/calibration/find-phase-thresholds.py)
+    "rnbqk2r/ppp2ppp/3b1n2/3pp3/8/1QPP2P1/PP2PPBP/RNB1K1NR b KQkq - 3 5",
+    "r1bqk2r/1p1n1ppp/2p2n2/p3p1B1/1bPpN3/1Q1P2P1/PP2PPBP/R3K1NR w KQkq - 2 10",
+    "r1b1k2r/1p1n1ppp/2p5/p3p1B1/1bPp4/3P2P1/PP2PPBP/n4KNR b kq - 1 14",
+    "r1b1k2r/1p2bpp1/2p4p/2n5/p1P1p3/P2PPNP1/1Pn1K1BP/2B4R w kq - 0 21",
+    "r2qkbnr/pppb1ppp/2n1p3/3p4/3P1B2/2P1PN2/PP3PPP/RN1QKB1R b KQkq - 0 5",
+    "r2q1rk1/pppbbp1p/2n1p1p1/3p3n/3P1B2/2PBPN1P/PPQN1PP1/R3K2R w KQ - 1 10",
+    "r2q1rk1/pp1b1pnp/2npp1p1/8/3PB3/P1P2N1P/1PQN1PP1/R3K2R b KQ - 0 14",
+    "r2qbrk1/pp4np/4ppp1/3p1n2/3P2N1/P1PB1N1P/1P1Q1PP1/R4RK1 w - - 4 21",
+    "r3qrk1/1p1b2n1/p3pppQ/3p3p/P1PP4/1P1B1N1P/5PP1/2R1R1K1 b - - 2 28",
+    "r7/1p1b3k/p3rp2/5p1p/P2P4/1P5P/5PP1/2R1R1K1 w - - 0 36",
+    "rnb1kbnr/pp2pppp/2p5/q7/8/2N2N2/PPPPBPPP/R1BQK2R b KQkq - 1 5",
+    "r3kbnr/ppqn1ppp/2p1p3/8/3P4/2N2B2/PPP1QPPP/R1B2RK1 w kq - 3 10",
+    "2kr2nr/p1qn1ppp/2pb4/4p3/8/2N1BB2/PPP1QPPP/3R1RK1 b - - 5 14",
+    "k2r3r/p1q2ppp/1np5/3np3/4N3/Q3BB2/PPP2PPP/5RK1 w - - 1 21",
+    "k2r3r/p7/1nq3p1/2Bn1p1p/2P1p3/Q7/P3BPPP/1R4K1 b - - 0 28",
+    "kr4r1/p7/1n6/2B2B1p/2P2p2/Q3p3/P4q1P/1R2K3 w - - 0 36",
+    "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R b KQkq - 2 5",
+    "r1bq1rk1/1p2ppbp/p1np1np1/8/3NP1P1/2N1B2P/PPPQ1P2/R3KB1R w KQ - 5 10",
+    "r4rk1/4ppbp/p2pbnp1/qp4P1/3BP3/P1N4P/1PPQ1P2/1K1R1B1R b - - 0 14",
+    "3q1rk1/4ppnp/3p2p1/ppr3P1/4P2P/P7/1PPQBP2/1K1R3R w - - 0 21",
+    "6k1/2q3n1/3p1r2/p1r1pP2/Pp6/7R/1PPQB3/1K1R4 b - - 0 28",
+]
@@ -0,0 +1,159 @@
+"""
+Vectorized move decoding.
+
+Turns a batch of raw policy/value heads into compact NumPy results: per
+position, the top-k legal moves as (vocab index uint16, probability float16)
+records plus the win probability. Nothing here builds Python dicts except
+`BatchResult.to_json`, which callers use only at the output edge (the
+WebSocket server).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cache
+
+from .lazy import np
+
+# `idx` of the padding entries when a position has fewer than top_n legal moves.
+NO_MOVE = 0xFFFF
+
+
+@cache
+def move_dtype() -> np.dtype:
+    """Structured dtype of one decoded move (4 bytes)."""
+    return np.dtype([("idx", "<u2"), ("prob", "<f2")])
+
+
+def _mirror_move(move_uci: str) -> str:
+    """Mirror a UCI move vertically (for black positions)."""
+    def mirror_sq(sq_name):
+        file = sq_name[0]
+        rank = str(9 - int(sq_name[1]))
+        return file + rank
+
+    from_sq = move_uci[:2]
+    to_sq = move_uci[2:4]
+    promo = move_uci[4:] if len(move_uci) > 4 else ""
+    return mirror_sq(from_sq) + mirror_sq(to_sq) + promo
+
+
+class MoveDecoder:
+    """Maps between real-orientation UCI moves and model vocab indices."""
+
+    def __init__(self, all_moves: list[str]):
+        self.all_moves = all_moves
+        self.num_moves = len(all_moves)
+        # The model sees black-to-move positions mirrored: a real black move
+        # is looked up under its mirrored UCI, and decoded back the same way.
+        self._white_idx = {m: i for i, m in enumerate(all_moves)}
+        self._black_idx = {_mirror_move(m): i for i, m in enumerate(all_moves)}
+        self._black_uci = [_mirror_move(m) for m in all_moves]
+
+    def legal_indices(self, legal_uci: list[str], is_black: bool) -> np.ndarray:
+        """Vocab indices of a position's legal moves (real-orientation UCI)."""
+        table = self._black_idx if is_black else self._white_idx
+        return np.fromiter((table[m] for m in legal_uci if m in table), dtype=np.int64)
+
+    def move_index(self, uci: str, is_black: bool) -> int:
+        """Vocab index of a real-orientation UCI move, or -1 if not in the vocab."""
+        table = self._black_idx if is_black else self._white_idx
+        return table.get(uci, -1)
+
+    def move_uci(self, idx: int, is_black: bool) -> str:
+        return self._black_uci[idx] if is_black else self.all_moves[idx]
+
+    def decode(self, logits: np.ndarray, values: np.ndarray, legal: list[np.ndarray],
+               is_black: np.ndarray, top_n: int, played: np.ndarray = None) -> BatchResult:
+        """Softmax over legal moves and top-k selection for a whole batch.
+
+        Args:
+            logits: [N, num_moves] policy logits.
+            values: [N] value head (white's perspective, in [-1, 1]).
+            legal: N arrays of legal vocab indices (see `legal_indices`).
+            is_black: [N] bool, side to move.
+            top_n: moves kept per position.
+            played: optional [N] vocab index of the move actually played
+                (-1 for none); its probability goes to `played_prob`.
+        """
+        n = len(logits)
+        k = max(1, min(top_n, self.num_moves))
+        counts = np.fromiter((len(l) for l in legal), dtype=np.int64, count=n)
+
+        masked = np.full((n, self.num_moves), -np.inf, dtype=np.float32)
+        if counts.sum():
+            rows = np.repeat(np.arange(n), counts)
+            cols = np.concatenate(legal)
+            masked[rows, cols] = logits[rows, cols]
+
+        # Rank on masked logits: illegal moves sit at -inf, below every legal one.
+        top = np.argpartition(masked, self.num_moves - k, axis=1)[:, -k:]
+        top_logits = np.take_along_axis(masked, top, axis=1)
+        order = np.argsort(-top_logits, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_logits = np.take_along_axis(top_logits, order, axis=1)
+
+        peak = top_logits[:, :1].copy()
+        peak[~np.isfinite(peak)] = 0.0
+        total = np.exp(masked - peak).sum(axis=1, keepdims=True)
+        total[total == 0] = 1.0  # no legal moves
+        probs = np.exp(top_logits - peak) / total
+
+        moves = np.empty((n, k), dtype=move_dtype())
+        moves["idx"] = top
+        moves["prob"] = probs
+        pad = np.arange(k)[np.newaxis, :] >= counts[:, np.newaxis]
+        moves["idx"][pad] = NO_MOVE
+        moves["prob"][pad] = 0
+
+        played_prob = None
+        if played is not None:
+            has_move = played >= 0
+            played_logits = masked[np.arange(n), np.where(has_move, played, 0)]
+            played_prob = np.exp(played_logits - peak[:, 0]) / total[:, 0]
+            played_prob = np.where(has_move, played_prob, np.nan).astype(np.float16)
+
+        is_black = np.asarray(is_black, dtype=bool)
+        win_prob_white = np.clip(np.asarray(values, dtype=np.float32) / 2 + 0.5, 0, 1)
+        win_prob = np.where(is_black, 1 - win_prob_white, win_prob_white).astype(np.float32)
+        return BatchResult(moves=moves, win_prob=win_prob, is_black=is_black, decoder=self,
+                           played_prob=played_prob)
+
+
+@dataclass
+class BatchResult:
+    """Decoded batch: [N, k] move records, [N] win probabilities (side to move)."""
+    moves: np.ndarray
+    win_prob: np.ndarray
+    is_black: np.ndarray
+    decoder: MoveDecoder
+    played_prob: np.ndarray = None  # [N] float16, NaN where nothing was played
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def to_json(self, i: int) -> dict:
+        """Position `i` in the JSON shape the server sends."""
+        is_black = bool(self.is_black[i])
+        moves = []
+        for idx, prob in self.moves[i].tolist():
+            if idx == NO_MOVE:
+                break
+            moves.append({
+                "move": self.decoder.move_uci(idx, is_black),
+                "probability": round(prob, 4),
+            })
+        return {"moves": moves, "win_prob": round(float(self.win_prob[i]), 4)}
+
+    @classmethod
+    def concat(cls, results: list[BatchResult]) -> BatchResult:
+        return cls(
+            moves=np.concatenate([r.moves for r in results]),
+            win_prob=np.concatenate([r.win_prob for r in results]),
+            is_black=np.concatenate([r.is_black for r in results]),
+            decoder=results[0].decoder,
+            played_prob=(
+                np.concatenate([r.played_prob for r in results])
+                if all(r.played_prob is not None for r in results) else None
+            ),
+        )
@@ -1,17 +1,33 @@
 """
-Maia-2 inference engine using ONNX Runtime.
+Maia-2 inference engine.
 
-Handles board encoding, model inference, and move decoding.
+Handles board encoding, model inference (via a backend, see backends.py), and
+move decoding.
+
+numpy, python-chess and onnxruntime are imported lazily (on first use) so the
+GUI can show its window before paying ~0.5 s of imports.
 """
 
+from __future__ import annotations
+
+import functools
 import json
+import logging
 import os
-import platform
-from dataclasses import dataclass, field
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from .backends import available_provider_names, available_providers, create_backend  # noqa: F401 (re-exported)
+from .book import OpeningBook, find_book, polyglot_key
+from .decode import BatchResult, MoveDecoder, _mirror_move  # noqa: F401 (re-exported)
+from .lazy import chess, import_runtime, np, ort  # noqa: F401 (re-exported)
+from .metrics import REGISTRY as metrics
+from .walker import walk_game
 
-import chess
-import numpy as np
-import onnxruntime as ort
+logger = logging.getLogger("maia-engine")
 
 
 # 11 ELO categories used by Maia-2
@@ -30,33 +46,17 @@ ELO_CATEGORIES = [
 ]
 
 
+# predict() results kept per (position, ELO categories, top_n) — live play
+# re-requests the same position on every re-render / reconnect.
+RESULT_CACHE_SIZE = 4096
+
+
 @dataclass
 class EngineConfig:
-    provider: str = "auto"  # "auto" | "cpu" | "coreml" | "directml"
+    provider: str = "auto"  # "auto" | "cpu" | "coreml" | "directml" | "native"
     threads: int = 0         # 0 = auto (cpu_count // 2)
-
-
-def _resolve_provider(provider: str) -> tuple[list, str]:
-    """Returns (providers_list, resolved_name) — falls back to CPU if unavailable."""
-    available = ort.get_available_providers()
-
-    if provider == "auto":
-        if platform.system() == "Darwin" and "CoreMLExecutionProvider" in available:
-            return ["CoreMLExecutionProvider", "CPUExecutionProvider"], "coreml"
-        if platform.system() == "Windows" and "DmlExecutionProvider" in available:
-            return ["DmlExecutionProvider", "CPUExecutionProvider"], "directml"
-        return ["CPUExecutionProvider"], "cpu"
-
-    provider_map = {
-        "coreml": "CoreMLExecutionProvider",
-        "directml": "DmlExecutionProvider",
-        "cpu": "CPUExecutionProvider",
-    }
-    ep = provider_map.get(provider, "CPUExecutionProvider")
-    if ep in available:
-        providers = [ep, "CPUExecutionProvider"] if ep != "CPUExecutionProvider" else ["CPUExecutionProvider"]
-        return providers, provider
-    return ["CPUExecutionProvider"], "cpu"
+    model_cache: bool = True  # reuse the ORT-optimized model from ~/.chessr/ort_cache
+    result_cache_size: int = RESULT_CACHE_SIZE  # predict() results kept; 0 = no cache
 
 
 def _elo_to_category(elo: int) -> int:
@@ -74,6 +74,18 @@ def _load_move_vocab() -> list[str]:
         return json.load(f)
 
 
+@functools.lru_cache(maxsize=None)
+def _shared_vocab() -> tuple[list[str], dict, dict, MoveDecoder]:
+    """(moves, move → index, index → move, decoder), built once per process.
+
+    Every Maia-2 variant uses the same vocabulary, so engines loaded side by
+    side (see registry.py) share these read-only tables.
+    """
+    all_moves = _load_move_vocab()
+    return (all_moves, {m: i for i, m in enumerate(all_moves)},
+            dict(enumerate(all_moves)), MoveDecoder(all_moves))
+
+
 def _board_to_tensor(board: chess.Board) -> np.ndarray:
     """Convert a chess.Board to an [18, 8, 8] float32 tensor.
 
@@ -117,61 +129,170 @@ def _board_to_tensor(board: chess.Board) -> np.ndarray:
     return tensor
 
 
-def _mirror_move(move_uci: str) -> str:
-    """Mirror a UCI move vertically (for black positions)."""
-    def mirror_sq(sq_name):
-        file = sq_name[0]
-        rank = str(9 - int(sq_name[1]))
-        return file + rank
+def encode_position(board: chess.Board) -> np.ndarray:
+    """Encode a position as the model sees it (mirrored when black is to move)."""
+    if board.turn == chess.BLACK:
+        board = board.mirror()
+    return _board_to_tensor(board)
+
 
-    from_sq = move_uci[:2]
-    to_sq = move_uci[2:4]
-    promo = move_uci[4:] if len(move_uci) > 4 else ""
-    return mirror_sq(from_sq) + mirror_sq(to_sq) + promo
+def _position_key(fen: str) -> str:
+    """FEN without the move counters (the model does not see them)."""
+    return " ".join(fen.split(" ")[:4])
 
 
-def _softmax(x: np.ndarray) -> np.ndarray:
-    e = np.exp(x - np.max(x))
-    return e / e.sum()
+def _as_in_fen(board: chess.Board) -> chess.Board:
+    """`board` with the en passant square its FEN shows.
+
+    python-chess keeps the square after every double push, but FENs (and
+    so cache keys, and boards parsed from them) only carry it when a capture
+    is legal; encode from this so a result matches the key it is cached under.
+    """
+    if board.ep_square is None or board.has_legal_en_passant():
+        return board
+    board = board.copy(stack=False)
+    board.ep_square = None
+    return board
+
+
+# Plies checked against the opening book before giving up (no book is deeper).
+MAX_BOOK_PLIES = 40
+
+# Start position used to warm the session up (first run allocates buffers).
+_WARMUP_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
 
 class MaiaEngine:
-    def __init__(self, model_path: str, config: EngineConfig = None):
+    def __init__(self, model_path: str, config: EngineConfig = None,
+                 progress: Callable[[str], None] = None):
         """Initialize the Maia-2 ONNX engine.
 
         Args:
             model_path: Path to the .onnx model file.
             config: Engine configuration (provider + threads).
+            progress: Optional callback, called with the name of each startup
+                phase as it begins: "runtime", "hash", "optimize" or "load",
+                then "warmup".
         """
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found: {model_path}")
 
         self._model_path = model_path
+        self._progress = progress or (lambda phase: None)
+        self.startup_timings: dict[str, float] = {}
+
+        t0 = time.perf_counter()
+        self._progress("runtime")
+        import_runtime()
+        self.startup_timings["runtime_ms"] = (time.perf_counter() - t0) * 1000
+
         config = config or EngineConfig()
         self._apply_config(config)
-        self.all_moves = _load_move_vocab()
-        self.move_to_idx = {m: i for i, m in enumerate(self.all_moves)}
-        self.idx_to_move = {i: m for i, m in enumerate(self.all_moves)}
+        self.all_moves, self.move_to_idx, self.idx_to_move, self.decoder = _shared_vocab()
+        self._result_cache: OrderedDict = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self.book = self._open_book(model_path)
+
+        t0 = time.perf_counter()
+        self._progress("warmup")
+        self.predict(_WARMUP_FEN, 1500, 1500, top_n=1)
+        self.startup_timings["first_inference_ms"] = (time.perf_counter() - t0) * 1000
+        self._progress = lambda phase: None  # reconfigure() runs silently
+
+    @staticmethod
+    def _open_book(model_path: str) -> OpeningBook | None:
+        path = find_book(model_path)
+        if path is None:
+            return None
+        try:
+            book = OpeningBook(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Opening book not loaded ({e})")
+            return None
+        logger.info(f"Opening book: {path} ({len(book):,} entries)")
+        return book
+
+    def _book_prefix(self, positions: list[dict]) -> int:
+        """Number of leading positions whose played move is a book move.
+
+        Sets position["book"] to the book moves [(uci, weight), ...] of each.
+        Keys for the first MAX_BOOK_PLIES positions are looked up in one
+        batched search; moves are only decoded along the in-book run.
+        """
+        head = [p for p in positions[:MAX_BOOK_PLIES] if p["played"]]
+        if not head:
+            return 0
+        boards = [chess.Board(p["fen"]) for p in head]
+        keys = np.array([polyglot_key(b) for b in boards], dtype=np.uint64)
+        in_book = self.book.contains(keys)
+        n = 0
+        while n < len(head) and in_book[n]:
+            moves = self.book.moves(boards[n], int(keys[n]))
+            if all(uci != head[n]["played"] for uci, _ in moves):
+                break
+            head[n]["book"] = moves
+            n += 1
+        return n
 
     def _apply_config(self, config: EngineConfig):
-        """Create (or recreate) the ONNX session with the given config."""
-        providers, self.active_provider = _resolve_provider(config.provider)
+        """Create (or recreate) the inference backend with the given config."""
         threads = config.threads if config.threads > 0 else max(1, (os.cpu_count() or 2) // 2)
-        self.active_threads = threads
-
-        opts = ort.SessionOptions()
-        opts.intra_op_num_threads = threads
-        opts.inter_op_num_threads = 1
-
-        self.session = ort.InferenceSession(
-            self._model_path,
-            sess_options=opts,
-            providers=providers,
+        self.backend = create_backend(
+            self._model_path, config.provider, threads,
+            use_cache=config.model_cache, progress=self._progress,
         )
+        self.active_provider = self.backend.name
+        self.active_threads = self.backend.threads
+        self.model_cache_hit = self.backend.model_cache_hit
+        self.startup_timings.update(self.backend.timings)
+        self._result_cache_size = config.result_cache_size
 
     def reconfigure(self, config: EngineConfig):
-        """Hot-swap the ONNX session with new provider/thread config."""
+        """Hot-swap the inference backend with new provider/thread config."""
         self._apply_config(config)
+        with self._result_cache_lock:
+            self._result_cache.clear()
+
+    @property
+    def supports_profiling(self) -> bool:
+        """Whether profile() works on the active backend (ORT providers only)."""
+        return self.backend.supports_profiling
+
+    def profile(self, runs: int = 50, batch_size: int = 1, max_seconds: float = 10.0) -> dict:
+        """Per-operator time report for the active session (see profiling.py).
+
+        Profiles a separate copy of the session for at most `max_seconds`;
+        live inference is unaffected. ORT providers only (supports_profiling);
+        raises RuntimeError on the others.
+        """
+        from .profiling import profile_engine  # profiling imports this module
+        return profile_engine(self, runs=runs, batch_size=batch_size, max_seconds=max_seconds)
+
+    def likely_lines(self, fen: str, elo_self: int, elo_oppo: int, **options) -> dict:
+        """Most human-likely continuations of a position (see lines.py)."""
+        from .lines import likely_lines
+        return likely_lines(self, fen, elo_self, elo_oppo, **options)
+
+    def estimate_elo(self, games: list[dict], **options) -> dict:
+        """Posterior over Elo from a player's games (see rating.py)."""
+        from .rating import estimate_elo
+        return estimate_elo(self, games, **options)
+
+    def infer(self, boards: np.ndarray, elos_self: np.ndarray, elos_oppo: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Raw batched forward pass.
+
+        Args:
+            boards: [N, 18, 8, 8] float32, already mirrored to white's view.
+            elos_self / elos_oppo: [N] int64 Elo category indices.
+
+        Returns:
+            (logits [N, 1880], value [N]) — raw heads; value is in [-1, 1].
+        """
+        t0 = time.perf_counter()
+        outputs = self.backend.run(boards, elos_self, elos_oppo)
+        metrics.run_ms.observe((time.perf_counter() - t0) * 1000)
+        metrics.batch_size.observe(len(boards))
+        return outputs
 
     def predict(self, fen: str, elo_self: int, elo_oppo: int, top_n: int = 5) -> dict:
         """Run Maia-2 inference on a position.
@@ -188,70 +309,174 @@ class MaiaEngine:
                 - win_prob: win probability for the player to move
                 - fen: the input FEN
         """
+        key = (_position_key(fen), _elo_to_category(elo_self), _elo_to_category(elo_oppo), top_n)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {**cached, "fen": fen}
+
+        t0 = time.perf_counter()
         board = chess.Board(fen)
         is_black = board.turn == chess.BLACK
 
-        # Mirror board if black to move (model always sees white's perspective)
-        if is_black:
-            board = board.mirror()
+        boards = encode_position(board)[np.newaxis, ...]  # [1, 18, 8, 8]
+        elo_self_cat = np.array([key[1]], dtype=np.int64)
+        elo_oppo_cat = np.array([key[2]], dtype=np.int64)
+        metrics.encode_ms.observe((time.perf_counter() - t0) * 1000)
+
+        logits, values = self.infer(boards, elo_self_cat, elo_oppo_cat)
+
+        t0 = time.perf_counter()
+        legal = self.decoder.legal_indices([m.uci() for m in board.legal_moves], is_black)
+        result = self.decoder.decode(logits, values, [legal], np.array([is_black]), top_n).to_json(0)
+        metrics.decode_ms.observe((time.perf_counter() - t0) * 1000)
+
+        self._cache_put(key, result)
+        return {**result, "fen": fen}
+
+    def _cache_get(self, key: tuple) -> dict | None:
+        with self._result_cache_lock:
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                self._result_cache.move_to_end(key)
+        (metrics.cache_hits if cached is not None else metrics.cache_misses).inc()
+        return cached
+
+    def _cache_put(self, key: tuple, result: dict):
+        with self._result_cache_lock:
+            self._result_cache[key] = result
+            while len(self._result_cache) > self._result_cache_size:
+                self._result_cache.popitem(last=False)
+
+    def predict_boards(self, boards: list[chess.Board], elo_self: int, elo_oppo: int,
+                       top_n: int = 5, batch_size: int = 64) -> list[dict]:
+        """`predict` for many boards, through the result cache.
+
+        Cached positions are answered directly; the rest are inferred
+        together in batched passes and cached. Returns `predict`-shaped
+        dicts (without "fen") in `boards` order.
+        """
+        cats = (_elo_to_category(elo_self), _elo_to_category(elo_oppo))
+        keys = [(_position_key(b.fen()), *cats, top_n) for b in boards]
+        results = [self._cache_get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if not missing:
+            return results
+
+        t0 = time.perf_counter()
+        is_black = np.array([boards[i].turn == chess.BLACK for i in missing], dtype=bool)
+        encoded = np.stack([encode_position(_as_in_fen(boards[i])) for i in missing])
+        legal = [self.decoder.legal_indices([m.uci() for m in boards[i].legal_moves], black)
+                 for i, black in zip(missing, is_black)]
+        metrics.encode_ms.observe((time.perf_counter() - t0) * 1000)
+
+        for start in range(0, len(missing), batch_size):
+            end = start + batch_size
+            n = len(missing[start:end])
+            logits, values = self.infer(encoded[start:end], np.full(n, cats[0], dtype=np.int64),
+                                        np.full(n, cats[1], dtype=np.int64))
+            t0 = time.perf_counter()
+            decoded = self.decoder.decode(logits, values, legal[start:end], is_black[start:end], top_n)
+            metrics.decode_ms.observe((time.perf_counter() - t0) * 1000)
+            for j, i in enumerate(missing[start:end]):
+                results[i] = decoded.to_json(j)
+                self._cache_put(keys[i], results[i])
+        return results
+
+    def predict_batch(self, fens: list[str], elos_self: list[int], elos_oppo: list[int],
+                      top_n: int = 5, batch_size: int = 64) -> BatchResult:
+        """Run Maia-2 on many independent positions in batched passes.
 
-        tensor = _board_to_tensor(board)
-        elo_self_cat = np.array([_elo_to_category(elo_self)], dtype=np.int64)
-        elo_oppo_cat = np.array([_elo_to_category(elo_oppo)], dtype=np.int64)
+        Args:
+            fens: FEN strings.
+            elos_self / elos_oppo: per-position ELO of the player to move and
+                of the opponent.
+            top_n: Number of top moves to return per position.
+            batch_size: Positions per inference call.
 
-        # Add batch dimension
-        boards = tensor[np.newaxis, ...]  # [1, 18, 8, 8]
+        Returns:
+            Decoded arrays in `fens` order (`result.to_json(i)` gives the
+            `predict` shape minus "fen").
+        """
+        t0 = time.perf_counter()
+        boards = [chess.Board(fen) for fen in fens]
+        is_black = np.array([b.turn == chess.BLACK for b in boards], dtype=bool)
+        encoded = np.stack([encode_position(b) for b in boards])
+        elo_self_cat = np.array([_elo_to_category(e) for e in elos_self], dtype=np.int64)
+        elo_oppo_cat = np.array([_elo_to_category(e) for e in elos_oppo], dtype=np.int64)
+        legal = [self.decoder.legal_indices([m.uci() for m in b.legal_moves], black)
+                 for b, black in zip(boards, is_black)]
+        metrics.encode_ms.observe((time.perf_counter() - t0) * 1000)
+
+        chunks = []
+        for start in range(0, len(boards), batch_size):
+            end = start + batch_size
+            logits, values = self.infer(encoded[start:end], elo_self_cat[start:end], elo_oppo_cat[start:end])
+            t0 = time.perf_counter()
+            chunks.append(self.decoder.decode(logits, values, legal[start:end], is_black[start:end], top_n))
+            metrics.decode_ms.observe((time.perf_counter() - t0) * 1000)
+        return BatchResult.concat(chunks)
+
+    def iter_game(self, moves: list, elo_white: int, elo_black: int,
+                  start_fen: str = None, top_n: int = 5, batch_size: int = 64,
+                  skip_book: bool = False) -> Iterator[tuple[int, BatchResult | None, list[dict]]]:
+        """Run Maia-2 on every position of a game, one batch at a time.
+
+        Positions are encoded incrementally along the move list (see
+        walker.py) instead of parsing a FEN per ply; the whole game is
+        encoded up front, then each chunk of `batch_size` plies is inferred
+        and yielded as soon as it is decoded.
 
-        outputs = self.session.run(
-            None,
-            {
-                "boards": boards,
-                "elos_self": elo_self_cat,
-                "elos_oppo": elo_oppo_cat,
-            },
+        Args:
+            moves: UCI moves (or chess.Move) played from the start position.
+            elo_white / elo_black: ELO of each player.
+            start_fen: Start position (standard start if None).
+            top_n: Number of top moves to return per position.
+            batch_size: Positions per inference call.
+            skip_book: With an opening book loaded, the leading plies whose
+                played move is in the book are not inferred; they come first
+                as one chunk with `result` None and position["book"] set to
+                the book moves [(uci, weight), ...].
+
+        Yields:
+            (first ply, result, positions) per chunk, covering every position
+            (before each move, plus the final one). `result.to_json(i)` gives
+            the `predict` shape and `result.played_prob` the probability of
+            the move actually played; positions are {"fen", "is_black",
+            "legal", "played"}, "played" being the UCI move made from it.
+        """
+        t0 = time.perf_counter()
+        boards, positions = walk_game(moves, start_fen)
+        white_cat, black_cat = _elo_to_category(elo_white), _elo_to_category(elo_black)
+        is_black = np.array([p["is_black"] for p in positions])
+        elos_self = np.where(is_black, black_cat, white_cat).astype(np.int64)
+        elos_oppo = np.where(is_black, white_cat, black_cat).astype(np.int64)
+        legal = [self.decoder.legal_indices(p["legal"], p["is_black"]) for p in positions]
+        played = np.array([
+            self.decoder.move_index(p["played"], p["is_black"]) if p["played"] else -1
+            for p in positions
+        ], dtype=np.int64)
+        metrics.encode_ms.observe((time.perf_counter() - t0) * 1000)
+
+        n_book = self._book_prefix(positions) if skip_book and self.book is not None else 0
+        if n_book:
+            metrics.book_plies.inc(n_book)
+            yield 0, None, positions[:n_book]
+
+        for start in range(n_book, len(positions), batch_size):
+            end = start + batch_size
+            logits, values = self.infer(boards[start:end], elos_self[start:end], elos_oppo[start:end])
+            t0 = time.perf_counter()
+            result = self.decoder.decode(logits, values, legal[start:end], is_black[start:end], top_n,
+                                         played=played[start:end])
+            metrics.decode_ms.observe((time.perf_counter() - t0) * 1000)
+            yield start, result, positions[start:end]
+
+    def predict_game(self, moves: list, elo_white: int, elo_black: int,
+                     start_fen: str = None, top_n: int = 5,
+                     batch_size: int = 64) -> tuple[BatchResult, list[dict]]:
+        """Like `iter_game`, but returns (result, positions) for the whole game."""
+        chunks = list(self.iter_game(moves, elo_white, elo_black, start_fen, top_n, batch_size))
+        return (
+            BatchResult.concat([result for _, result, _ in chunks]),
+            [p for _, _, positions in chunks for p in positions],
         )
-
-        logits_maia = outputs[0][0]    # [1880]
-        logits_value = outputs[2][0]   # scalar
-
-        # Get legal moves and build mask
-        original_board = chess.Board(fen)
-        legal_moves_uci = [m.uci() for m in original_board.legal_moves]
-
-        if is_black:
-            # Mirror legal moves to match model's white perspective
-            legal_mirrored = [_mirror_move(m) for m in legal_moves_uci]
-        else:
-            legal_mirrored = legal_moves_uci
-
-        legal_mask = np.zeros(len(self.all_moves), dtype=np.float32)
-        for m in legal_mirrored:
-            if m in self.move_to_idx:
-                legal_mask[self.move_to_idx[m]] = 1.0
-
-        # Mask illegal moves and compute probabilities
-        masked = np.where(legal_mask > 0, logits_maia, -1e9)
-        probs = _softmax(masked)
-
-        # Build move list, un-mirror if needed
-        move_probs = []
-        for m_mirrored in legal_mirrored:
-            if m_mirrored not in self.move_to_idx:
-                continue
-            idx = self.move_to_idx[m_mirrored]
-            prob = float(probs[idx])
-            # Un-mirror move back to original orientation
-            original_move = _mirror_move(m_mirrored) if is_black else m_mirrored
-            move_probs.append({"move": original_move, "probability": round(prob, 4)})
-
-        move_probs.sort(key=lambda x: x["probability"], reverse=True)
-
-        # Win probability (model outputs white's perspective)
-        win_prob_white = float(np.clip(logits_value / 2 + 0.5, 0, 1))
-        win_prob = (1 - win_prob_white) if is_black else win_prob_white
-
-        return {
-            "moves": move_probs[:top_n],
-            "win_prob": round(win_prob, 4),
-            "fen": fen,
-        }
@@ -0,0 +1,38 @@
+"""
+Deferred imports of the heavy runtime modules.
+
+numpy, python-chess and onnxruntime take ~0.5 s to import together. Modules
+use these proxies instead of plain imports so the GUI can show its window
+before paying that cost; the first attribute access does the real import.
+"""
+
+import importlib
+
+
+class _LazyModule:
+    """Stand-in for a module that is only imported on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        setattr(self, attr, value)  # cache: later lookups skip __getattr__
+        return value
+
+
+chess = _LazyModule("chess")
+np = _LazyModule("numpy")
+ort = _LazyModule("onnxruntime")
+
+
+def import_runtime():
+    """Force the deferred imports (lets callers time and report this phase)."""
+    for module in (np, chess, ort):
+        module._load()
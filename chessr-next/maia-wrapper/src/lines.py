@@ -0,0 +1,140 @@
+"""
+Most-likely continuations: how a player of a given rating would go on.
+
+A beam search over Maia-2's move distribution. Each depth evaluates its
+whole frontier in one `predict_boards` call (cached positions are free).
+Children whose cumulative probability falls under `min_prob` are pruned; a
+line left with no child ends where it is. Positions reached by several
+move orders are merged on their Zobrist key: the most likely move order is
+kept as the line and the others add to the position's probability mass.
+The best `beam` positions go on to the next depth, within a node and time
+budget.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, field
+
+from .book import polyglot_key
+from .lazy import chess
+
+DEPTH = 6
+LINES = 5
+BEAM = 16
+BRANCHING = 4
+MIN_PROB = 1e-4
+MAX_NODES = 1024
+
+
+@dataclass
+class _Node:
+    board: chess.Board
+    logp: float
+    moves: list[str] = field(default_factory=list)
+    mass: float = 0.0  # probability of the position over every move order reaching it
+
+    @property
+    def prob(self) -> float:
+        return math.exp(self.logp)
+
+
+def likely_lines(engine, fen: str, elo_self: int, elo_oppo: int, depth: int = DEPTH,
+                 lines: int = LINES, beam: int = BEAM, branching: int = BRANCHING,
+                 min_prob: float = MIN_PROB, max_nodes: int = MAX_NODES,
+                 max_seconds: float = None) -> dict:
+    """Top `lines` continuations of `fen`, most human-likely first.
+
+    Args:
+        elo_self / elo_oppo: ratings of the player to move and the opponent
+            (they alternate along the line).
+        depth: plies per line.
+        beam: positions kept per depth.
+        branching: candidate moves expanded per position.
+        min_prob: cumulative probability under which a line is dropped.
+        max_nodes / max_seconds: evaluation budget; when hit, the lines found
+            so far are returned with "truncated": true.
+    """
+    t0 = time.perf_counter()
+    root = chess.Board(fen)
+    frontier = [_Node(root, 0.0, mass=1.0)]
+    done: list[_Node] = []
+    nodes = transpositions = 0
+    truncated = False
+
+    for ply in range(depth):
+        expandable = []
+        for node in frontier:
+            (done if node.board.is_game_over() else expandable).append(node)
+        if not expandable:
+            frontier = []
+            break
+        budget = max_nodes - nodes
+        if budget <= 0 or (max_seconds is not None and time.perf_counter() - t0 > max_seconds):
+            truncated = True
+            break
+        if len(expandable) > budget:
+            done.extend(expandable[budget:])
+            expandable, truncated = expandable[:budget], True
+
+        mover, other = (elo_self, elo_oppo) if ply % 2 == 0 else (elo_oppo, elo_self)
+        results = engine.predict_boards([n.board for n in expandable], mover, other, top_n=branching)
+        nodes += len(expandable)
+
+        children: dict[int, _Node] = {}
+        for node, result in zip(expandable, results):
+            extended = False
+            for candidate in result["moves"]:
+                p = candidate["probability"]
+                if p <= 0:
+                    continue
+                logp = node.logp + math.log(p)
+                if logp < math.log(min_prob):
+                    continue
+                extended = True
+                board = node.board.copy(stack=False)
+                board.push_uci(candidate["move"])
+                key = polyglot_key(board)
+                child = children.get(key)
+                mass = node.mass * p
+                if child is None:
+                    children[key] = _Node(board, logp, node.moves + [candidate["move"]], mass)
+                    continue
+                transpositions += 1
+                child.mass += mass
+                if logp > child.logp:
+                    child.board, child.logp, child.moves = board, logp, node.moves + [candidate["move"]]
+            if not extended:
+                done.append(node)  # every continuation is below min_prob: the line ends here
+
+        frontier = sorted(children.values(), key=lambda n: -n.logp)[:beam]
+        if truncated:
+            break
+
+    # Deepest lines first: a shorter line is only more probable for being shorter.
+    leaves = sorted(frontier + [n for n in done if n.moves], key=lambda n: (-len(n.moves), -n.logp))[:lines]
+    return {
+        "fen": fen,
+        "lines": [_line_json(root, n) for n in leaves],
+        "nodes": nodes,
+        "transpositions": transpositions,
+        "truncated": truncated,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def _line_json(root: chess.Board, node: _Node) -> dict:
+    board = root.copy(stack=False)
+    san = []
+    for uci in node.moves:
+        move = chess.Move.from_uci(uci)
+        san.append(board.san(move))
+        board.push(move)
+    return {
+        "moves": node.moves,
+        "san": san,
+        "probability": round(node.prob, 6),
+        "position_probability": round(node.mass, 6),
+        "fen": node.board.fen(),
+    }
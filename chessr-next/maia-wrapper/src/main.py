@@ -10,7 +10,8 @@ import sys
 from pathlib import Path
 
 from .server import DEFAULT_PORT
-from .tray import MaiaTray, load_config
+from .config import load_config
+from .tray import MaiaTray
 from .automove_state import AutoMoveState
 
 LOG_FORMAT = "%(asctime)s [%(name)s] %(levelname)s: %(message)s"
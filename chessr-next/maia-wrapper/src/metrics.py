@@ -0,0 +1,189 @@
+"""
+Runtime metrics for the inference server.
+
+A process-wide registry of fixed-bucket histograms, counters and gauges.
+Recording is a lock plus a bisect, so it is cheap enough to stay on in the
+hot path. Snapshots are served by the `stats` WebSocket message and, when
+enabled, as Prometheus text on a local HTTP port.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# Latency buckets (ms) — upper bounds, +Inf implied.
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Bucket upper bound holding the q-quantile (None if empty)."""
+        with self._lock:
+            counts, total = list(self._counts), self._count
+        if not total:
+            return None
+        target, seen = q * total, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, s = list(self._counts), self._count, self._sum
+        return {
+            "count": total,
+            "mean": round(s / total, 3) if total else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): c for b, c in zip(self.buckets + ("+Inf",), counts)},
+        }
+
+    def prometheus(self) -> list[str]:
+        with self._lock:
+            counts, total, s = list(self._counts), self._count, self._sum
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{self.name}_sum {s}", f"{self.name}_count {total}"]
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+    def prometheus(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+
+class Gauge(Counter):
+    def dec(self, n: int = 1):
+        self.inc(-n)
+
+    def prometheus(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.encode_ms = Histogram("maia_encode_ms", "Board encoding time per call (ms)", LATENCY_BUCKETS_MS)
+        self.run_ms = Histogram("maia_run_ms", "Backend forward pass time per call (ms)", LATENCY_BUCKETS_MS)
+        self.decode_ms = Histogram("maia_decode_ms", "Move decoding time per call (ms)", LATENCY_BUCKETS_MS)
+        self.request_ms = Histogram("maia_request_ms", "WebSocket request handling time (ms)", LATENCY_BUCKETS_MS)
+        self.batch_size = Histogram("maia_batch_size", "Positions per forward pass", BATCH_BUCKETS)
+        self.queue_depth = Gauge("maia_queue_depth", "Requests received and not yet answered")
+        self.requests = Counter("maia_requests_total", "WebSocket requests handled")
+        self.cache_hits = Counter("maia_cache_hits_total", "Position results served from the cache")
+        self.cache_misses = Counter("maia_cache_misses_total", "Position results computed")
+        self.book_plies = Counter("maia_book_plies_total", "Game plies answered from the opening book")
+
+    def _histograms(self) -> list[Histogram]:
+        return [self.encode_ms, self.run_ms, self.decode_ms, self.request_ms, self.batch_size]
+
+    def cache_hit_rate(self) -> float | None:
+        total = self.cache_hits.value + self.cache_misses.value
+        return round(self.cache_hits.value / total, 4) if total else None
+
+    def snapshot(self, engine=None) -> dict:
+        stats = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests.value,
+            "queue_depth": self.queue_depth.value,
+            "cache": {
+                "hits": self.cache_hits.value,
+                "misses": self.cache_misses.value,
+                "hit_rate": self.cache_hit_rate(),
+            },
+            "book_plies": self.book_plies.value,
+            "rss_mb": process_rss_mb(),
+            **{h.name.removeprefix("maia_"): h.snapshot() for h in self._histograms()},
+        }
+        if engine is not None:
+            stats["provider"] = engine.active_provider
+            stats["threads"] = engine.active_threads
+        return stats
+
+    def prometheus(self, engine=None) -> str:
+        lines = []
+        for h in self._histograms():
+            lines += h.prometheus()
+        for c in (self.queue_depth, self.requests, self.cache_hits, self.cache_misses, self.book_plies):
+            lines += c.prometheus()
+        rss = process_rss_mb()
+        if rss is not None:
+            lines += ["# HELP maia_rss_bytes Resident set size", "# TYPE maia_rss_bytes gauge",
+                      f"maia_rss_bytes {int(rss * 1024 * 1024)}"]
+        if engine is not None:
+            lines += ["# HELP maia_engine_info Active inference provider and thread count",
+                      "# TYPE maia_engine_info gauge",
+                      f'maia_engine_info{{provider="{engine.active_provider}",'
+                      f'threads="{engine.active_threads}"}} 1']
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_mb() -> float | None:
+    try:
+        import psutil
+        return round(psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+class LogSampler:
+    """Lets at most one log line through per `interval` seconds.
+
+    Per-request INFO lines cost a format + handler call each; under load
+    the sampler drops them before any formatting happens and reports how
+    many were skipped on the next line that gets through.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._next = 0.0
+        self._skipped = 0
+
+    def sample(self) -> int | None:
+        """Number of lines skipped since the last one, or None to skip this one."""
+        now = time.monotonic()
+        if now < self._next:
+            self._skipped += 1
+            return None
+        self._next = now + self.interval
+        skipped, self._skipped = self._skipped, 0
+        return skipped
+
+
+REGISTRY = Metrics()
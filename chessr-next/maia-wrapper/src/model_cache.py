@@ -0,0 +1,114 @@
+"""
+On-disk cache of ONNX Runtime optimized models.
+
+Building a session from the raw `model.onnx` re-runs every graph optimization
+pass on each launch and copies all ~90 MB of embedded weights into the
+process. The first launch saves the optimized graph here, with its weights in
+a separate external-data file, so later launches skip the optimizer and ONNX
+Runtime memory-maps the weights instead of copying them.
+
+Entries are keyed by model hash, target provider and ORT version:
+    ~/.chessr/ort_cache/<sha256[:16]>-<provider>-ort<version>/model.onnx
+"""
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get("MAIA_ORT_CACHE", Path.home() / ".chessr" / "ort_cache"))
+# One entry per model variant the registry can load (2 time controls ×
+# 3 precisions, see registry.py), plus headroom for a model update.
+MAX_ENTRIES = 8
+
+_DIGESTS_FILE = "digests.json"
+_MODEL_NAME = "model.onnx"
+
+
+def model_digest(model_path: str, cache_dir: Path = CACHE_DIR) -> str:
+    """SHA-256 of the model file, memoized by (path, size, mtime).
+
+    Hashing the model takes a few hundred ms, so the digest is only
+    recomputed when the file actually changes.
+    """
+    st = os.stat(model_path)
+    stamp = f"{os.path.abspath(model_path)}|{st.st_size}|{st.st_mtime_ns}"
+    memo_path = cache_dir / _DIGESTS_FILE
+    try:
+        memo = json.loads(memo_path.read_text())
+    except Exception:
+        memo = {}
+    if stamp in memo:
+        return memo[stamp]
+
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    memo[stamp] = digest
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        memo_path.write_text(json.dumps(memo))
+    except OSError:
+        pass
+    return digest
+
+
+def cache_key(digest: str, provider: str, ort_version: str) -> str:
+    # CPU entries get ORT_ENABLE_ALL (hardware-specific layouts), so the
+    # machine architecture is part of the key as well.
+    arch = platform.machine().lower() or "unknown"
+    return f"{digest[:16]}-{provider}-{arch}-ort{ort_version}"
+
+
+def entry_path(key: str, cache_dir: Path = CACHE_DIR) -> Path:
+    """Path of the cached optimized model for `key` (may not exist yet)."""
+    return cache_dir / key / _MODEL_NAME
+
+
+def staging_path(key: str, cache_dir: Path = CACHE_DIR) -> Path:
+    """Private directory the optimizer writes into before `commit`."""
+    staging = cache_dir / f".{key}.{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    return staging / _MODEL_NAME
+
+
+def commit(staged_model: Path, key: str, cache_dir: Path = CACHE_DIR) -> Path:
+    """Atomically publish a staged entry and prune the oldest extra entries."""
+    final_dir = cache_dir / key
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(staged_model.parent, final_dir)
+    prune(cache_dir, keep=MAX_ENTRIES)
+    return final_dir / _MODEL_NAME
+
+
+def external_data_name() -> str:
+    return _MODEL_NAME + ".data"
+
+
+def prune(cache_dir: Path = CACHE_DIR, keep: int = MAX_ENTRIES):
+    """Delete all but the `keep` most recently used entries (~90 MB each).
+
+    Hidden `.{key}.{pid}` staging directories belong to loads still in
+    progress and are never counted or removed.
+    """
+    try:
+        entries = [p for p in cache_dir.iterdir() if p.is_dir() and not p.name.startswith(".")]
+    except OSError:
+        return
+    entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in entries[keep:]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def touch(key: str, cache_dir: Path = CACHE_DIR):
+    """Mark an entry as recently used (pruning is by directory mtime)."""
+    try:
+        os.utime(cache_dir / key)
+    except OSError:
+        pass
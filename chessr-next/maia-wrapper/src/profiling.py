@@ -0,0 +1,138 @@
+"""
+Per-operator profiling of the ONNX Runtime session.
+
+Replays the bench corpus on a profiling copy of the live session for a
+bounded window, then folds ORT's Chrome-trace output into a hot-node report:
+time per op type (Conv, MatMul, ...), per model module (chess_cnn/layers.0,
+transformer/elo_layers.1, fc_1, ...) and per individual node.
+
+Usage:
+    python -m scripts.profile_ops [--model model.onnx] [--provider cpu]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+from .corpus import BENCH_FENS
+from .engine import MaiaEngine, chess, np, encode_position, _elo_to_category
+
+RUNS = 50
+MAX_SECONDS = 10.0
+TOP_NODES = 15
+
+
+def _module_of(node_name: str) -> str:
+    """'/transformer/elo_layers.0/0/to_qkv/MatMul' -> 'transformer/elo_layers.0'."""
+    parts = [p for p in node_name.split("/") if p][:-1]
+    return "/".join(parts[:2]) if parts else "(graph)"
+
+
+def summarize_trace(events: list[dict], top: int = TOP_NODES) -> dict:
+    """Aggregate ORT trace events into per-op, per-module and per-node times.
+
+    The first model_run is dropped (it pays for buffer allocation).
+    """
+    runs = sorted((e for e in events if e.get("cat") == "Session" and e.get("name") == "model_run"),
+                  key=lambda e: e["ts"])
+    cutoff = runs[0]["ts"] + runs[0]["dur"] if len(runs) > 1 else -1
+    measured_runs = runs[1:] if len(runs) > 1 else runs
+
+    by_op = defaultdict(lambda: [0, 0])
+    by_module = defaultdict(lambda: [0, 0])
+    by_node = {}
+    total_us = 0
+    for e in events:
+        if e.get("cat") != "Node" or not e.get("name", "").endswith("_kernel_time") or e["ts"] < cutoff:
+            continue
+        args = e.get("args", {})
+        node = e["name"].removesuffix("_kernel_time")
+        op = args.get("op_name", "?")
+        dur = e["dur"]
+        total_us += dur
+        for bucket, key in ((by_op, op), (by_module, _module_of(node))):
+            bucket[key][0] += dur
+            bucket[key][1] += 1
+        entry = by_node.setdefault(node, {"node": node, "op": op, "provider": args.get("provider", "?"),
+                                          "us": 0, "calls": 0})
+        entry["us"] += dur
+        entry["calls"] += 1
+
+    n_runs = max(1, len(measured_runs))
+
+    def table(bucket: dict, key: str) -> list[dict]:
+        rows = [{key: k, "us_per_run": round(us / n_runs, 1), "pct": round(100 * us / total_us, 1) if total_us else 0.0,
+                 "calls": calls} for k, (us, calls) in bucket.items()]
+        return sorted(rows, key=lambda r: r["us_per_run"], reverse=True)
+
+    nodes = sorted(by_node.values(), key=lambda r: r["us"], reverse=True)[:top]
+    return {
+        "runs": len(measured_runs),
+        "run_ms": round(sum(r["dur"] for r in measured_runs) / n_runs / 1000, 3) if measured_runs else None,
+        "kernel_ms": round(total_us / n_runs / 1000, 3),
+        "by_op": table(by_op, "op"),
+        "by_module": table(by_module, "module"),
+        "top_nodes": [{
+            "node": r["node"], "op": r["op"], "provider": r["provider"],
+            "us_per_run": round(r["us"] / n_runs, 1),
+            "pct": round(100 * r["us"] / total_us, 1) if total_us else 0.0,
+        } for r in nodes],
+    }
+
+
+def profile_engine(engine: MaiaEngine, runs: int = RUNS, batch_size: int = 1,
+                   max_seconds: float = MAX_SECONDS, top: int = TOP_NODES,
+                   keep_trace: str = None) -> dict:
+    """Profile `engine`'s backend on the bench corpus and return the report.
+
+    Args:
+        runs: Forward passes to record (plus one warm-up).
+        batch_size: Positions per pass.
+        max_seconds: Hard bound on the profiling window.
+        top: Number of individual nodes to list.
+        keep_trace: Optional path to copy the raw ORT trace to.
+
+    Raises:
+        RuntimeError: the backend has no per-operator profiling (native).
+    """
+    if not engine.supports_profiling:
+        raise RuntimeError(f"Per-operator profiling needs an ONNX Runtime provider "
+                           f"(active: {engine.active_provider})")
+    boards = np.stack([encode_position(chess.Board(fen)) for fen in BENCH_FENS])
+    elos = np.full(len(BENCH_FENS), _elo_to_category(1500), dtype=np.int64)
+    feeds = []
+    for i in range(runs + 1):
+        idx = (np.arange(batch_size) + i * batch_size) % len(boards)
+        feeds.append((np.ascontiguousarray(boards[idx]), elos[idx], elos[idx]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trace_path = engine.backend.profile(feeds, os.path.join(tmp, "maia_profile"), max_seconds)
+        with open(trace_path) as f:
+            events = json.load(f)
+        if keep_trace:
+            with open(keep_trace, "w") as f:
+                json.dump(events, f)
+
+    report = summarize_trace(events, top=top)
+    report.update({
+        "provider": engine.active_provider,
+        "threads": engine.active_threads,
+        "batch_size": batch_size,
+    })
+    return report
+
+
+def format_report(report: dict, rows: int = 10) -> str:
+    """Plain-text tables for logs and the CLI."""
+    lines = [f"{report['provider']} · {report['threads']} threads · batch {report['batch_size']} · "
+             f"{report['runs']} runs · {report['run_ms']} ms/run ({report['kernel_ms']} ms in kernels)"]
+    for title, key, table in (("op type", "op", report["by_op"]),
+                              ("module", "module", report["by_module"]),
+                              ("node", "node", report["top_nodes"])):
+        lines.append(f"\n  by {title}:")
+        for r in table[:rows]:
+            lines.append(f"    {r['pct']:5.1f}%  {r['us_per_run']:9.1f} us  {r[key]}")
+    return "\n".join(lines)
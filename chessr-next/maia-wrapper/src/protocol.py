@@ -0,0 +1,65 @@
+"""
+Binary WebSocket frames for bulk results.
+
+An `analyze_batch` reply for a whole game is hundreds of per-move dicts as
+JSON. The binary form ships the decoder's arrays as-is:
+
+    offset  size        field
+    0       4           magic b"MAB1"
+    4       4           uint32 header length H
+    8       H           header JSON {"type", "requestId", "count": N, "top_n": K}
+            0-3         zero padding to a 4-byte boundary
+            4*N         win_prob   float32[N]  (side to move)
+            4*N*K       moves      N×K records {idx uint16, prob float16};
+                                   idx 0xFFFF marks padding past the legal moves
+            N           is_black   uint8[N]
+
+All little-endian. `idx` indexes the model's move vocabulary (the `vocab`
+message returns it); for black-to-move positions the vocab move is mirrored
+(ranks 1↔8, 2↔7, ...), exactly as `MoveDecoder.move_uci` does.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+
+from .decode import BatchResult, move_dtype
+from .lazy import np
+
+BATCH_MAGIC = b"MAB1"
+
+
+def pack_batch(request_id, result: BatchResult) -> bytes:
+    n, k = result.moves.shape
+    header = json.dumps({
+        "type": "analysis_batch_result",
+        "requestId": request_id,
+        "count": n,
+        "top_n": k,
+    }).encode()
+    header += b" " * (-(8 + len(header)) % 4)  # JSON tolerates trailing spaces
+    return b"".join((
+        BATCH_MAGIC,
+        struct.pack("<I", len(header)),
+        header,
+        result.win_prob.astype("<f4").tobytes(),
+        result.moves.astype(move_dtype()).tobytes(),
+        result.is_black.astype(np.uint8).tobytes(),
+    ))
+
+
+def unpack_batch(data: bytes) -> dict:
+    """Inverse of `pack_batch` (for Python clients and tools)."""
+    if data[:4] != BATCH_MAGIC:
+        raise ValueError("not an analyze_batch frame")
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + header_len])
+    n, k = header["count"], header["top_n"]
+    offset = 8 + header_len
+    win_prob = np.frombuffer(data, dtype="<f4", count=n, offset=offset)
+    offset += 4 * n
+    moves = np.frombuffer(data, dtype=move_dtype(), count=n * k, offset=offset).reshape(n, k)
+    offset += 4 * n * k
+    is_black = np.frombuffer(data, dtype=np.uint8, count=n, offset=offset).astype(bool)
+    return {**header, "win_prob": win_prob, "moves": moves, "is_black": is_black}
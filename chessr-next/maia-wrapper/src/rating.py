@@ -0,0 +1,118 @@
+"""
+Elo estimation from played moves.
+
+Maia-2 is conditioned on the mover's Elo bucket, so the likelihood of a
+player's actual moves under each of the 11 buckets is a direct read on
+their strength. Every ply the player moved is evaluated once per bucket;
+the log-probabilities of the played moves are summed per bucket into a
+posterior (uniform prior) over Elo.
+
+Work is batched across a whole archive: every game is walked once (see
+walker.py), the player's positions are gathered, and each board encoding
+and legal-move mask is computed once and shared by its 11 bucket rows.
+"""
+
+from __future__ import annotations
+
+import time
+
+from .engine import ELO_CATEGORIES, MaiaEngine, _elo_to_category, metrics, np
+from .walker import walk_game
+
+NUM_BUCKETS = len(ELO_CATEGORIES)
+# Representative Elo of each bucket (open-ended ends: 100 past the bound).
+BUCKET_ELO = np.array([1000] + [lo + 50 for lo, _ in ELO_CATEGORIES[1:-1]] + [2100], dtype=np.float64)
+ROWS_PER_PASS = 704  # 64 positions × 11 buckets
+
+
+def estimate_elo(engine: MaiaEngine, games: list[dict], min_ply: int = 0,
+                 rows_per_pass: int = ROWS_PER_PASS) -> dict:
+    """Posterior over Elo buckets from a player's games.
+
+    Args:
+        games: [{"moves": [uci, ...], "start_fen": None, "color": "white" |
+            "black" (the player's side), "opponent_elo": 1500}, ...]
+        min_ply: skip plies before this one (e.g. book moves).
+        rows_per_pass: (position × bucket) rows per forward pass.
+
+    Returns:
+        {"elo": posterior mean, "elo_range": [lo, hi] of the MAP bucket,
+         "posterior": [11], "log_likelihood": [11], "plies": n,
+         "games": [{"plies", "log_likelihood", "elo"}, ...]}
+    """
+    t0 = time.perf_counter()
+    boards, oppo_cats, legal, played, game_of = [], [], [], [], []
+    for g, game in enumerate(games):
+        is_black_player = game.get("color", "white") == "black"
+        encoded, positions = walk_game(game["moves"], game.get("start_fen"))
+        oppo = _elo_to_category(int(game.get("opponent_elo") or 1500))
+        for ply, position in enumerate(positions):
+            if ply < min_ply or not position["played"] or position["is_black"] != is_black_player:
+                continue
+            idx = engine.decoder.move_index(position["played"], position["is_black"])
+            if idx < 0:
+                continue
+            boards.append(encoded[ply])
+            oppo_cats.append(oppo)
+            legal.append(engine.decoder.legal_indices(position["legal"], position["is_black"]))
+            played.append(idx)
+            game_of.append(g)
+    metrics.encode_ms.observe((time.perf_counter() - t0) * 1000)
+
+    n = len(boards)
+    loglik = np.zeros((n, NUM_BUCKETS), dtype=np.float64)
+    if n:
+        boards = np.stack(boards)
+        oppo_cats = np.array(oppo_cats, dtype=np.int64)
+        played = np.array(played, dtype=np.int64)
+        buckets = np.arange(NUM_BUCKETS, dtype=np.int64)
+        per_pass = max(1, rows_per_pass // NUM_BUCKETS)
+        for start in range(0, n, per_pass):
+            end = min(start + per_pass, n)
+            m = end - start
+            # Row r = position start + r // 11 under bucket r % 11.
+            logits, _ = engine.infer(
+                np.repeat(boards[start:end], NUM_BUCKETS, axis=0),
+                np.tile(buckets, m),
+                np.repeat(oppo_cats[start:end], NUM_BUCKETS),
+            )
+            t1 = time.perf_counter()
+            logits = logits.reshape(m, NUM_BUCKETS, -1)
+            mask = np.zeros((m, logits.shape[-1]), dtype=bool)
+            counts = [len(l) for l in legal[start:end]]
+            mask[np.repeat(np.arange(m), counts), np.concatenate(legal[start:end])] = True
+            masked = np.where(mask[:, None, :], logits, -np.inf)
+            peak = masked.max(axis=2, keepdims=True)
+            log_norm = np.log(np.exp(masked - peak).sum(axis=2)) + peak[:, :, 0]
+            chosen = np.take_along_axis(logits, played[start:end, None, None].repeat(NUM_BUCKETS, 1), axis=2)
+            loglik[start:end] = chosen[:, :, 0] - log_norm
+            metrics.decode_ms.observe((time.perf_counter() - t1) * 1000)
+
+    game_of = np.array(game_of, dtype=np.int64)
+    per_game = []
+    for g in range(len(games)):
+        rows = loglik[game_of == g]
+        ll = rows.sum(axis=0)
+        per_game.append({
+            "plies": len(rows),
+            "log_likelihood": np.round(ll, 3).tolist(),
+            "elo": round(float(_posterior(ll) @ BUCKET_ELO)) if len(rows) else None,
+        })
+
+    total = loglik.sum(axis=0)
+    posterior = _posterior(total)
+    best = int(posterior.argmax())
+    return {
+        "elo": round(float(posterior @ BUCKET_ELO)) if n else None,
+        "elo_range": list(ELO_CATEGORIES[best]) if n else None,
+        "posterior": np.round(posterior, 4).tolist(),
+        "log_likelihood": np.round(total, 3).tolist(),
+        "plies": n,
+        "games": per_game,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def _posterior(log_likelihood: np.ndarray) -> np.ndarray:
+    p = np.exp(log_likelihood - log_likelihood.max())
+    return p / p.sum()
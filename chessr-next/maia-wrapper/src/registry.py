@@ -0,0 +1,247 @@
+"""
+Maia-2 model variants, loaded on first use.
+
+maia2-wasm/python exports both checkpoints (`{kind}_model.onnx`, kind =
+blitz | rapid) and their fp16 / int8 conversions (`{kind}_model.fp16.onnx`,
+`{kind}_model.int8.onnx`). Every such file next to the main model is a
+variant; the bundled `model.onnx` (scripts/export_onnx.py) counts as rapid
+fp32 unless a `rapid_model.onnx` is present.
+
+Requests name a time control and optionally a precision; the registry
+routes them to the matching variant, building its MaiaEngine on first use.
+Loaded engines are kept most-recently-used first: when their combined size
+goes over the memory budget, idle ones are dropped, oldest first. The main
+model (the one the app started with) is never evicted. All engines share
+one copy of the move vocabulary and decoder (engine._shared_vocab).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from .engine import EngineConfig, MaiaEngine
+
+logger = logging.getLogger("maia-engine")
+
+KINDS = ("blitz", "rapid")
+PRECISIONS = ("fp32", "fp16", "int8")
+_SUFFIXES = {"fp32": ".onnx", "fp16": ".fp16.onnx", "int8": ".int8.onnx"}
+LEGACY_MODEL = "model.onnx"
+
+DEFAULT_BUDGET_MB = 512
+
+# Estimated duration (base + 40 × increment, in seconds) under which a time
+# control is blitz — the Lichess split; bullet games use the blitz model too.
+BLITZ_MAX_SECONDS = 480
+_KIND_NAMES = {
+    "ultrabullet": "blitz", "bullet": "blitz", "blitz": "blitz",
+    "rapid": "rapid", "classical": "rapid", "correspondence": "rapid", "daily": "rapid",
+}
+
+
+@dataclass(frozen=True)
+class Variant:
+    kind: str
+    precision: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}-{self.precision}"
+
+
+def discover(models_dir) -> dict[Variant, Path]:
+    """Every variant file in `models_dir`."""
+    models_dir = Path(models_dir)
+    found = {}
+    for kind in KINDS:
+        for precision, suffix in _SUFFIXES.items():
+            path = models_dir / f"{kind}_model{suffix}"
+            if path.exists():
+                found[Variant(kind, precision)] = path
+    legacy = models_dir / LEGACY_MODEL
+    if legacy.exists():
+        found.setdefault(Variant("rapid", "fp32"), legacy)
+    return found
+
+
+def kind_for_time_control(time_control) -> str | None:
+    """blitz / rapid for a time control, None when it says nothing.
+
+    Accepts a category name ("blitz", "rapid", "bullet", ...), a PGN
+    TimeControl tag ("300+2", "180"), or the base time in seconds.
+    """
+    if time_control is None:
+        return None
+    if isinstance(time_control, (int, float)):
+        seconds = float(time_control)
+    else:
+        text = str(time_control).strip().lower()
+        if text in _KIND_NAMES:
+            return _KIND_NAMES[text]
+        base, _, increment = text.partition("+")
+        try:
+            seconds = float(base) + 40 * float(increment or 0)
+        except ValueError:
+            return None  # "-", "1/86400", ...
+    return "blitz" if seconds < BLITZ_MAX_SECONDS else "rapid"
+
+
+def model_size_mb(path: Path) -> float:
+    """On-disk size of a model and its external data: the session's weights."""
+    size = path.stat().st_size
+    data = path.with_name(path.name + ".data")
+    if data.exists():
+        size += data.stat().st_size
+    return size / (1024 * 1024)
+
+
+class ModelRegistry:
+    def __init__(self, model_path: str, config: EngineConfig = None, primary: MaiaEngine = None,
+                 budget_mb: float = DEFAULT_BUDGET_MB):
+        """Variants found next to `model_path`.
+
+        Args:
+            model_path: The main model; its variant is the default route.
+            config: Provider / threads every engine is built with.
+            primary: Already-loaded engine for `model_path` (built here if None).
+            budget_mb: Combined model size above which idle variants are
+                evicted (the main model is always kept).
+        """
+        model_path = Path(model_path)
+        self.config = config or EngineConfig()
+        self.budget_mb = budget_mb
+        self.paths = discover(model_path.parent)
+        self.primary = next((v for v, p in self.paths.items() if p == model_path), None)
+        if self.primary is None:
+            self.primary = Variant("rapid", "fp32")
+            self.paths[self.primary] = model_path
+
+        self._lock = threading.Lock()
+        self._load_locks: dict[Variant, threading.Lock] = {}
+        self._engines: OrderedDict[Variant, MaiaEngine] = OrderedDict()
+        self._sizes: dict[Variant, float] = {}
+        self._in_use: Counter = Counter()
+        self._add(self.primary, primary or MaiaEngine(str(model_path), self.config))
+
+    @property
+    def default(self) -> MaiaEngine:
+        return self._engines[self.primary]
+
+    def resolve(self, time_control=None, precision: str = None) -> Variant:
+        """The variant a request runs on.
+
+        A kind with no file falls back to the main model; a missing precision
+        to the closest one available for the kind (fp32, then fp16, int8).
+        """
+        kind = kind_for_time_control(time_control) or self.primary.kind
+        precision = precision if precision in PRECISIONS else None
+        if kind == self.primary.kind and precision in (None, self.primary.precision):
+            return self.primary
+        order = [precision or self.primary.precision, *PRECISIONS]
+        for p in order:
+            if Variant(kind, p) in self.paths:
+                return Variant(kind, p)
+        return self.primary
+
+    @contextmanager
+    def engine(self, time_control=None, precision: str = None) -> Iterator[MaiaEngine]:
+        """Borrow the engine for a request; it is not evicted while borrowed."""
+        variant = self.resolve(time_control, precision)
+        engine = self._acquire(variant)
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                self._in_use[variant] -= 1
+                self._evict()
+
+    def loaded(self, time_control=None, precision: str = None) -> bool:
+        """Whether the request's variant can be served without a load."""
+        variant = self.resolve(time_control, precision)
+        with self._lock:
+            return variant in self._engines
+
+    def preload(self, time_control=None, precision: str = None):
+        """Load the request's variant now (blocking), e.g. from a worker
+        thread before the request itself runs on the event loop."""
+        with self.engine(time_control, precision):
+            pass
+
+    def _acquire(self, variant: Variant) -> MaiaEngine:
+        with self._lock:
+            engine = self._engines.get(variant)
+            if engine is not None:
+                self._engines.move_to_end(variant)
+                self._in_use[variant] += 1
+                return engine
+            load_lock = self._load_locks.setdefault(variant, threading.Lock())
+        with load_lock:  # one build per variant; other variants keep serving
+            with self._lock:
+                engine = self._engines.get(variant)
+            if engine is None:
+                path = self.paths[variant]
+                logger.info(f"Loading {variant.name} model from {path}")
+                engine = MaiaEngine(str(path), self.config)
+            with self._lock:
+                self._add(variant, engine)
+                self._in_use[variant] += 1
+                self._evict()
+            return engine
+
+    def _add(self, variant: Variant, engine: MaiaEngine):
+        """Register `engine` as the most recently used (caller holds the lock)."""
+        self._engines[variant] = engine
+        self._engines.move_to_end(variant)
+        self._sizes.setdefault(variant, model_size_mb(self.paths[variant]))
+
+    def _evict(self):
+        """Drop idle variants, least recently used first, down to the budget."""
+        total = sum(self._sizes[v] for v in self._engines)
+        for variant in list(self._engines):
+            if total <= self.budget_mb:
+                break
+            if variant == self.primary or self._in_use[variant]:
+                continue
+            del self._engines[variant]
+            total -= self._sizes[variant]
+            logger.info(f"Evicted {variant.name} model ({self._sizes[variant]:.0f} MB) — "
+                        f"{total:.0f}/{self.budget_mb:.0f} MB loaded")
+
+    def reconfigure(self, config: EngineConfig):
+        """Apply a provider / thread change: the main engine is rebuilt now,
+        the other variants on their next use."""
+        self.config = config
+        self.default.reconfigure(config)
+        with self._lock:
+            for variant in list(self._engines):
+                if variant != self.primary:
+                    del self._engines[variant]  # borrowers finish on the old engine
+
+    def status(self) -> dict:
+        with self._lock:
+            loaded = list(self._engines)
+            variants = [{
+                "name": v.name,
+                "path": str(p),
+                "size_mb": round(self._sizes.get(v) or model_size_mb(p), 1),
+                "loaded": v in self._engines,
+                "in_use": self._in_use[v],
+                "default": v == self.primary,
+            } for v, p in sorted(self.paths.items(), key=lambda item: item[0].name)]
+        return {
+            "budget_mb": self.budget_mb,
+            "loaded_mb": round(sum(self._sizes[v] for v in loaded), 1),
+            "variants": variants,
+        }
+
+
+def configured_budget_mb(config: dict = None) -> float:
+    """MAIA_MODEL_BUDGET_MB, else "model_budget_mb" in maia_config.json."""
+    return float(os.environ.get("MAIA_MODEL_BUDGET_MB", (config or {}).get("model_budget_mb", DEFAULT_BUDGET_MB)))
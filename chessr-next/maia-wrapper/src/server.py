@@ -1,21 +1,38 @@
 """
 WebSocket server for Maia-2 inference.
 
-Listens on localhost for requests from the Chessr extension.
+Listens on localhost for requests from the Chessr extension. Any request
+may carry "time_control" (e.g. "180+2", "blitz") and "precision" ("fp32",
+"fp16", "int8") to pick a model variant; see registry.py. With a trace
+recorder, inference requests are also logged for offline replay (trace.py).
 """
 
 import asyncio
+import contextlib
+import io
 import json
 import logging
+import math
 import time
 import websockets
 
 from .engine import MaiaEngine
+from .metrics import REGISTRY as metrics, LogSampler
+from .protocol import pack_batch
+from .registry import ModelRegistry
+from .trace import TraceRecorder
 
 logger = logging.getLogger("maia-server")
 logging.getLogger("websockets.server").setLevel(logging.WARNING)
 
 DEFAULT_PORT = 8765
+MAX_BATCH_POSITIONS = 1024
+GAME_CHUNK_PLIES = 16
+MAX_LINE_NODES = 4096
+MAX_LINE_DEPTH = 20
+MAX_LINE_BEAM = 64  # also caps "lines"
+MAX_LINE_BRANCHING = 16
+MAX_ELO_GAMES = 500
 
 
 class MaiaServer:
@@ -24,10 +41,18 @@ class MaiaServer:
         engine: MaiaEngine,
         port: int = DEFAULT_PORT,
         automove_state=None,
+        metrics_port: int = None,
+        registry: ModelRegistry = None,
+        trace: TraceRecorder = None,
     ):
         self.engine = engine
+        self.registry = registry
+        self.trace = trace
         self.port = port
+        self.metrics_port = metrics_port
         self._server = None
+        self._metrics_server = None
+        self._log_sampler = LogSampler(interval=1.0)
         self._clients: set = set()
         self._loop = None
         self._automove_state = automove_state
@@ -38,30 +63,67 @@ class MaiaServer:
         self._clients.add(websocket)
         remote = websocket.remote_address
         logger.info(f"Client connected: {remote}")
+        streams: set[asyncio.Task] = set()
 
         try:
             async for raw in websocket:
+                t0 = time.perf_counter()
+                metrics.requests.inc()
+                metrics.queue_depth.inc()
                 try:
-                    msg = json.loads(raw)
-                    response = self._process(msg)
-                    await websocket.send(json.dumps(response))
-                except json.JSONDecodeError:
-                    await websocket.send(json.dumps({
-                        "type": "error",
-                        "message": "Invalid JSON",
-                    }))
-                except Exception as e:
-                    logger.exception("Error processing request")
-                    await websocket.send(json.dumps({
-                        "type": "error",
-                        "message": str(e),
-                        "requestId": msg.get("requestId"),
-                    }))
+                    await self._respond(websocket, raw, streams)
+                finally:
+                    metrics.queue_depth.dec()
+                    metrics.request_ms.observe((time.perf_counter() - t0) * 1000)
         finally:
+            for task in streams:
+                task.cancel()
             self._clients.discard(websocket)
             logger.info(f"Client disconnected: {remote}")
 
-    def _process(self, msg: dict) -> dict:
+    async def _respond(self, websocket, raw, streams: set):
+        try:
+            msg = json.loads(raw)
+            if self.trace is not None:
+                self.trace.record(msg)
+            if msg.get("type") in ("analyze_game", "estimate_elo", "analyze_batch", "likely_lines"):
+                # Runs in the background: this client can keep sending
+                # live `analyze` requests meanwhile.
+                if msg["type"] == "analyze_game":
+                    task = asyncio.create_task(self._stream_game(websocket, msg))
+                else:
+                    handler = {
+                        "estimate_elo": self._handle_estimate_elo,
+                        "analyze_batch": self._handle_analyze_batch,
+                        "likely_lines": self._handle_likely_lines,
+                    }[msg["type"]]
+                    task = asyncio.create_task(self._respond_in_thread(websocket, msg, handler))
+                streams.add(task)
+                task.add_done_callback(streams.discard)
+                return
+            if self.registry is not None and msg.get("type") == "analyze" and \
+                    not self.registry.loaded(msg.get("time_control"), msg.get("precision")):
+                # A variant's first use builds its session: do that off the loop.
+                await asyncio.to_thread(self.registry.preload, msg.get("time_control"), msg.get("precision"))
+            response = self._process(msg)
+            if isinstance(response, bytes):
+                await websocket.send(response)  # binary frame
+            else:
+                await websocket.send(json.dumps(response))
+        except json.JSONDecodeError:
+            await websocket.send(json.dumps({
+                "type": "error",
+                "message": "Invalid JSON",
+            }))
+        except Exception as e:
+            logger.exception("Error processing request")
+            await websocket.send(json.dumps({
+                "type": "error",
+                "message": str(e),
+                "requestId": msg.get("requestId"),
+            }))
+
+    def _process(self, msg: dict) -> dict | bytes:
         msg_type = msg.get("type")
 
         if msg_type == "ping":
@@ -70,6 +132,15 @@ class MaiaServer:
         if msg_type == "analyze":
             return self._handle_analyze(msg)
 
+        if msg_type == "vocab":
+            return {"type": "vocab", "moves": self.engine.all_moves}
+
+        if msg_type == "stats":
+            stats = {"type": "stats", **metrics.snapshot(self.engine)}
+            if self.registry is not None:
+                stats["models"] = self.registry.status()
+            return stats
+
         if msg_type == "board_state":
             return self._handle_board_state(msg)
 
@@ -78,6 +149,13 @@ class MaiaServer:
             "message": f"Unknown message type: {msg_type}",
         }
 
+    def _engine(self, msg: dict, time_control=None):
+        """The engine for a request's "time_control" / "precision" (see
+        registry.py), as a context manager; the main model without a registry."""
+        if self.registry is None:
+            return contextlib.nullcontext(self.engine)
+        return self.registry.engine(msg.get("time_control", time_control), msg.get("precision"))
+
     def _handle_analyze(self, msg: dict) -> dict:
         request_id = msg.get("requestId", "?")
         fen = msg.get("fen")
@@ -89,22 +167,25 @@ class MaiaServer:
         elo_oppo = msg.get("elo_oppo", 1500)
         top_n = msg.get("top_n", 5)
 
-        # Short FEN for logging (just pieces + turn)
-        short_fen = fen.split(" ")[0][:20] + "..."
-        logger.info(f"[{request_id}] Analyze: elo={elo_self}v{elo_oppo} fen={short_fen}")
-
         t0 = time.perf_counter()
-        result = self.engine.predict(
-            fen=fen,
-            elo_self=elo_self,
-            elo_oppo=elo_oppo,
-            top_n=top_n,
-        )
+        with self._engine(msg) as engine:
+            result = engine.predict(
+                fen=fen,
+                elo_self=elo_self,
+                elo_oppo=elo_oppo,
+                top_n=top_n,
+            )
         elapsed_ms = (time.perf_counter() - t0) * 1000
 
-        top_move = result["moves"][0] if result["moves"] else None
-        top_str = f"{top_move['move']} ({top_move['probability']*100:.1f}%)" if top_move else "none"
-        logger.info(f"[{request_id}] Result: top={top_str} winProb={result['win_prob']:.2f} ({elapsed_ms:.1f}ms)")
+        # Sampled: at most one line per second, nothing formatted otherwise.
+        skipped = self._log_sampler.sample()
+        if skipped is not None:
+            short_fen = fen.split(" ")[0][:20] + "..."
+            top_move = result["moves"][0] if result["moves"] else None
+            top_str = f"{top_move['move']} ({top_move['probability']*100:.1f}%)" if top_move else "none"
+            more = f" [+{skipped} not logged]" if skipped else ""
+            logger.info(f"[{request_id}] Analyze: elo={elo_self}v{elo_oppo} fen={short_fen} "
+                        f"top={top_str} winProb={result['win_prob']:.2f} ({elapsed_ms:.1f}ms){more}")
 
         return {
             "type": "analysis_result",
@@ -112,6 +193,218 @@ class MaiaServer:
             **result,
         }
 
+    def _handle_analyze_batch(self, msg: dict) -> dict | bytes:
+        """Many positions in one batched pass.
+
+        Request: {"positions": [{"fen", "elo_self", "elo_oppo"}, ...],
+                  "top_n": 5, "format": "binary" | "json"}
+        The binary reply is a single frame (see protocol.py); "json" returns
+        {"type": "analysis_batch_result", "results": [...]} instead.
+        """
+        request_id = msg.get("requestId", "?")
+        positions = msg.get("positions")
+        if not positions or not isinstance(positions, list):
+            logger.warning(f"[{request_id}] Missing 'positions' field")
+            return {"type": "error", "message": "Missing 'positions' field", "requestId": request_id}
+        if len(positions) > MAX_BATCH_POSITIONS:
+            return {
+                "type": "error",
+                "message": f"Too many positions ({len(positions)} > {MAX_BATCH_POSITIONS})",
+                "requestId": request_id,
+            }
+        if any(not p.get("fen") for p in positions):
+            return {"type": "error", "message": "Missing 'fen' in positions", "requestId": request_id}
+
+        top_n = msg.get("top_n", 5)
+        t0 = time.perf_counter()
+        with self._engine(msg) as engine:
+            result = engine.predict_batch(
+                fens=[p["fen"] for p in positions],
+                elos_self=[p.get("elo_self", 1500) for p in positions],
+                elos_oppo=[p.get("elo_oppo", 1500) for p in positions],
+                top_n=top_n,
+            )
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        logger.info(f"[{request_id}] Batch: {len(positions)} positions ({elapsed_ms:.1f}ms)")
+
+        if msg.get("format", "binary") == "json":
+            return {
+                "type": "analysis_batch_result",
+                "requestId": request_id,
+                "results": [
+                    {**result.to_json(i), "fen": p["fen"]}
+                    for i, p in enumerate(positions)
+                ],
+            }
+        return pack_batch(request_id, result)
+
+    async def _stream_game(self, websocket, msg: dict):
+        """Analyze a whole game, streaming per-ply results chunk by chunk.
+
+        Request: {"pgn": "..."} or {"fen": start FEN (optional), "moves": [uci, ...]},
+                 plus "elo_white" / "elo_black" (default: PGN headers, else
+                 1500), "top_n", "chunk_size", "book" (default true),
+                 "time_control" (default: the PGN TimeControl header).
+        Replies: {"type": "game_analysis_chunk", "plies": [...]} per chunk of
+                 batched inference, then {"type": "game_analysis_done", ...}
+                 with per-player summaries. With an opening book loaded, the
+                 leading in-book plies come first, uninferred, as
+                 {"ply", "fen", "played", "classification": "book",
+                 "book_moves": [{"move", "weight"}, ...]}.
+
+        Inference runs in a worker thread so the event loop, and with it
+        every other client, keeps being served between chunks.
+        """
+        request_id = msg.get("requestId", "?")
+        metrics.queue_depth.inc()
+        lease = contextlib.ExitStack()  # the engine, held for the whole stream
+        try:
+            t0 = time.perf_counter()
+            start_fen, moves, elo_white, elo_black, time_control = await asyncio.to_thread(
+                _parse_game_request, msg)
+            top_n = msg.get("top_n", 5)
+            chunk_size = max(1, min(int(msg.get("chunk_size", GAME_CHUNK_PLIES)), MAX_BATCH_POSITIONS))
+            logger.info(f"[{request_id}] Game: {len(moves)} plies, elo={elo_white}v{elo_black}")
+
+            # Off the loop: a variant's first use loads it.
+            engine = await asyncio.to_thread(lease.enter_context, self._engine(msg, time_control))
+            chunks = engine.iter_game(moves, elo_white, elo_black, start_fen=start_fen,
+                                      top_n=top_n, batch_size=chunk_size,
+                                      skip_book=bool(msg.get("book", True)))
+            summary = _GameSummary()
+            book_plies = 0
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                first_ply, result, positions = chunk
+                if result is None:
+                    book_plies = len(positions)
+                    plies = [{
+                        "ply": first_ply + i, "fen": position["fen"], "played": position["played"],
+                        "classification": "book",
+                        "book_moves": [{"move": uci, "weight": weight} for uci, weight in position["book"]],
+                    } for i, position in enumerate(positions)]
+                else:
+                    plies = []
+                    for i, position in enumerate(positions):
+                        ply = {"ply": first_ply + i, "fen": position["fen"], **result.to_json(i),
+                               "played": position["played"]}
+                        if position["played"]:
+                            played_prob = float(result.played_prob[i])
+                            ply["played_probability"] = None if math.isnan(played_prob) else round(played_prob, 4)
+                            summary.add(position["is_black"], ply)
+                        plies.append(ply)
+                await websocket.send(json.dumps({
+                    "type": "game_analysis_chunk",
+                    "requestId": request_id,
+                    "plies": plies,
+                }))
+
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            logger.info(f"[{request_id}] Game done: {len(moves) + 1} positions, {book_plies} from book "
+                        f"({elapsed_ms:.1f}ms)")
+            await websocket.send(json.dumps({
+                "type": "game_analysis_done",
+                "requestId": request_id,
+                "positions": len(moves) + 1,
+                "book_plies": book_plies,
+                "elapsed_ms": round(elapsed_ms, 1),
+                **summary.to_json(),
+            }))
+        except asyncio.CancelledError:
+            raise
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.exception(f"[{request_id}] Game analysis failed")
+            try:
+                await websocket.send(json.dumps({
+                    "type": "error",
+                    "message": str(e),
+                    "requestId": request_id,
+                }))
+            except websockets.ConnectionClosed:
+                pass
+        finally:
+            lease.close()
+            metrics.queue_depth.dec()
+
+    def _handle_likely_lines(self, msg: dict) -> dict:
+        """Most likely continuations of a position for the given ratings.
+
+        Request: {"fen", "elo_self", "elo_oppo", "depth", "lines", "beam",
+                  "branching", "max_nodes", "max_ms"} (all but fen optional)
+        Reply: {"type": "likely_lines_result", "lines": [{"moves", "san",
+                "probability", "position_probability", "fen"}, ...], ...}
+        """
+        request_id = msg.get("requestId", "?")
+        fen = msg.get("fen")
+        if not fen:
+            return {"type": "error", "message": "Missing 'fen' field", "requestId": request_id}
+        limits = {"depth": MAX_LINE_DEPTH, "lines": MAX_LINE_BEAM, "beam": MAX_LINE_BEAM,
+                  "branching": MAX_LINE_BRANCHING}
+        options = {k: max(1, min(int(msg[k]), limit)) for k, limit in limits.items() if k in msg}
+        options["max_nodes"] = min(int(msg.get("max_nodes", MAX_LINE_NODES)), MAX_LINE_NODES)
+        if "max_ms" in msg:
+            options["max_seconds"] = float(msg["max_ms"]) / 1000
+        with self._engine(msg) as engine:
+            result = engine.likely_lines(fen, msg.get("elo_self", 1500), msg.get("elo_oppo", 1500), **options)
+        logger.info(f"[{request_id}] Lines: {len(result['lines'])} lines, {result['nodes']} nodes "
+                    f"({result['elapsed_ms']:.1f}ms)")
+        return {"type": "likely_lines_result", "requestId": request_id, **result}
+
+    async def _respond_in_thread(self, websocket, msg: dict, handler):
+        """Run a long synchronous handler off the event loop and send its reply
+        (a bytes reply goes out as a binary frame)."""
+        request_id = msg.get("requestId", "?")
+        metrics.queue_depth.inc()
+        try:
+            response = await asyncio.to_thread(handler, msg)
+            await websocket.send(response if isinstance(response, bytes) else json.dumps(response))
+        except (asyncio.CancelledError, websockets.ConnectionClosed):
+            raise
+        except Exception as e:
+            logger.exception(f"[{request_id}] {msg.get('type')} failed")
+            await websocket.send(json.dumps({"type": "error", "message": str(e), "requestId": request_id}))
+        finally:
+            metrics.queue_depth.dec()
+
+    def _handle_estimate_elo(self, msg: dict) -> dict:
+        """Estimate a player's Elo from their games in one batched pass.
+
+        Request: {"games": [{"pgn" | "fen" + "moves", "color": "white" | "black",
+                  "opponent_elo" (default: PGN header, else 1500)}, ...],
+                  "min_ply": 0}
+        Reply: {"type": "elo_estimate", "elo", "elo_range", "posterior": [11],
+                "log_likelihood": [11], "plies", "games": [...]}
+        """
+        request_id = msg.get("requestId", "?")
+        games = msg.get("games")
+        if not games or not isinstance(games, list):
+            return {"type": "error", "message": "Missing 'games' field", "requestId": request_id}
+        if len(games) > MAX_ELO_GAMES:
+            return {"type": "error", "message": f"Too many games ({len(games)} > {MAX_ELO_GAMES})",
+                    "requestId": request_id}
+        parsed = []
+        for game in games:
+            color = game.get("color")
+            if color not in ("white", "black"):
+                return {"type": "error", "message": "Each game needs 'color': 'white' or 'black'",
+                        "requestId": request_id}
+            start_fen, moves, elo_white, elo_black, _ = _parse_game_request(game)
+            parsed.append({
+                "start_fen": start_fen,
+                "moves": moves,
+                "color": color,
+                "opponent_elo": game.get("opponent_elo") or (elo_black if color == "white" else elo_white),
+            })
+        with self._engine(msg) as engine:
+            result = engine.estimate_elo(parsed, min_ply=int(msg.get("min_ply", 0)))
+        logger.info(f"[{request_id}] Elo estimate: {result['elo']} from {len(games)} games, "
+                    f"{result['plies']} plies ({result['elapsed_ms']:.1f}ms)")
+        return {"type": "elo_estimate", "requestId": request_id, **result}
+
     def _handle_board_state(self, msg: dict) -> dict:
         if self._automove_state:
             self._automove_state.update_board_state(msg)
@@ -134,8 +427,41 @@ class MaiaServer:
             self.port,
         )
         logger.info(f"Maia server listening on ws://127.0.0.1:{self.port}")
+        if self.metrics_port:
+            self._metrics_server = await asyncio.start_server(
+                self._handle_metrics_http, "127.0.0.1", self.metrics_port,
+            )
+            logger.info(f"Prometheus metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+
+    async def _handle_metrics_http(self, reader, writer):
+        """Minimal HTTP/1.0 responder: GET /metrics → Prometheus text format."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass  # skip headers
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                status, body = "200 OK", metrics.prometheus(self.engine).encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
 
     async def stop(self):
+        if self.trace is not None:
+            self.trace.close()
+        if self._metrics_server:
+            self._metrics_server.close()
+            await self._metrics_server.wait_closed()
+            self._metrics_server = None
         if self._server:
             self._server.close()
             await self._server.wait_closed()
@@ -148,3 +474,65 @@ class MaiaServer:
     @property
     def is_running(self) -> bool:
         return self._server is not None and self._server.is_serving()
+
+
+def _parse_game_request(msg: dict) -> tuple[str | None, list[str], int, int, str | None]:
+    """(start FEN, UCI moves, white ELO, black ELO, PGN TimeControl) from an
+    analyze_game request."""
+    elo_white = msg.get("elo_white")
+    elo_black = msg.get("elo_black")
+    time_control = None
+    pgn = msg.get("pgn")
+    if pgn:
+        import chess.pgn
+
+        game = chess.pgn.read_game(io.StringIO(pgn))
+        if game is None:
+            raise ValueError("Could not parse 'pgn'")
+        if game.errors:
+            raise ValueError(f"Invalid PGN: {game.errors[0]}")
+        start_fen = game.board().fen()
+        moves = [m.uci() for m in game.mainline_moves()]
+        headers = game.headers
+        elo_white = elo_white or _header_elo(headers.get("WhiteElo"))
+        elo_black = elo_black or _header_elo(headers.get("BlackElo"))
+        time_control = headers.get("TimeControl")
+    else:
+        start_fen = msg.get("fen")
+        moves = msg.get("moves")
+        if not isinstance(moves, list):
+            raise ValueError("Missing 'pgn' or 'moves' field")
+    if len(moves) + 1 > MAX_BATCH_POSITIONS:
+        raise ValueError(f"Game too long ({len(moves)} plies)")
+    return start_fen, moves, elo_white or 1500, elo_black or 1500, time_control
+
+
+def _header_elo(value: str | None) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _GameSummary:
+    """Per-player match rate and mean probability of the moves actually played."""
+
+    def __init__(self):
+        self._players = {"white": [0, 0, 0.0], "black": [0, 0, 0.0]}  # moves, top-1 hits, prob sum
+
+    def add(self, is_black: bool, ply: dict):
+        stats = self._players["black" if is_black else "white"]
+        stats[0] += 1
+        if ply["moves"] and ply["moves"][0]["move"] == ply["played"]:
+            stats[1] += 1
+        stats[2] += ply.get("played_probability") or 0.0
+
+    def to_json(self) -> dict:
+        return {
+            color: {
+                "moves": moves,
+                "top1_rate": round(hits / moves, 4) if moves else None,
+                "avg_played_probability": round(prob / moves, 4) if moves else None,
+            }
+            for color, (moves, hits, prob) in self._players.items()
+        }
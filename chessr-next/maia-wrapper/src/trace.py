@@ -0,0 +1,169 @@
+"""
+Request traces: the server's inference requests as they arrived.
+
+Off by default; MAIA_TRACE=<path> (or "trace_path" in maia_config.json)
+makes the server append every `analyze` / `analyze_batch` request to a
+trace file, gzip-compressed when the path ends in ".gz". scripts/replay_trace.py
+plays a trace back against any engine configuration.
+
+One JSON array per line, after a {"trace": 1, "started": ...} header:
+
+    [t_ms, fen, elo_self, elo_oppo, top_n]                  analyze
+    [t_ms, [[fen, elo_self, elo_oppo], ...], top_n]         analyze_batch
+
+t_ms is the arrival time since recording started. A trailing
+{"time_control": ..., "precision": ...} object is appended when the
+request routed to a model variant (see registry.py).
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+logger = logging.getLogger("maia-server")
+
+TRACE_VERSION = 1
+TRACED_TYPES = ("analyze", "analyze_batch")
+_ROUTE_KEYS = ("time_control", "precision")
+
+# Seconds between flushes: a crash loses at most this much of the trace.
+FLUSH_INTERVAL = 2.0
+
+
+def _open(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+@dataclass
+class TraceEvent:
+    t_ms: float
+    positions: list[tuple[str, int, int]]  # (fen, elo_self, elo_oppo)
+    top_n: int
+    batch: bool  # analyze_batch (one request, many positions)
+    time_control: str | None = None
+    precision: str | None = None
+
+    @property
+    def route(self) -> tuple:
+        return self.time_control, self.precision
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        """Append requests to `path` (created, with its directory, if needed)."""
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._flushed = self._t0
+        self._file = _open(self.path, "a")
+        self._write({"trace": TRACE_VERSION, "started": datetime.now(timezone.utc).isoformat()})
+        logger.info(f"Recording requests to {self.path}")
+
+    def record(self, msg: dict):
+        """Log one request; other message types are ignored. Never raises:
+        a failing trace file stops the recording, not the request."""
+        msg_type = msg.get("type")
+        if msg_type not in TRACED_TYPES or self._file is None:
+            return
+        now = time.perf_counter()
+        t_ms = round((now - self._t0) * 1000, 1)
+        top_n = msg.get("top_n", 5)
+        if msg_type == "analyze":
+            row = [t_ms, msg.get("fen"), msg.get("elo_self", 1500), msg.get("elo_oppo", 1500), top_n]
+        else:
+            positions = msg.get("positions") or []
+            row = [t_ms, [[p.get("fen"), p.get("elo_self", 1500), p.get("elo_oppo", 1500)]
+                          for p in positions if isinstance(p, dict)], top_n]
+        route = {k: msg[k] for k in _ROUTE_KEYS if msg.get(k) is not None}
+        if route:
+            row.append(route)
+        try:
+            with self._lock:
+                self._write(row)
+                self.count += 1
+                if now - self._flushed >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    self._flushed = now
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Request trace stopped ({e})")
+            self.close()
+
+    def _write(self, row):
+        self._file.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        logger.info(f"Request trace closed: {self.count} requests in {self.path}")
+
+
+def read_trace(path) -> Iterator[TraceEvent]:
+    """Events of a trace file, in arrival order.
+
+    Recording sessions appended to the same file are chained end to end.
+    Requests without a FEN (answered with an error) are skipped. A trace
+    whose recorder was killed mid-write ends at its last complete request.
+    """
+    offset = last = 0.0
+    with _open(Path(path), "r") as f:
+        for line in _complete_lines(f):
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(row, list) and len(row) < 3:
+                continue
+            if isinstance(row, dict):  # header of a new session
+                offset = last
+                continue
+            route = row.pop() if isinstance(row[-1], dict) else {}
+            if isinstance(row[1], list):
+                t_ms, positions, top_n = row
+                positions = [tuple(p) for p in positions if p[0]]
+                batch = True
+            else:
+                t_ms, fen, elo_self, elo_oppo, top_n = row
+                positions = [(fen, elo_self, elo_oppo)] if fen else []
+                batch = False
+            last = offset + t_ms
+            if positions:
+                yield TraceEvent(last, positions, top_n, batch,
+                                 route.get("time_control"), route.get("precision"))
+
+
+def _complete_lines(f) -> Iterator[str]:
+    """Lines of `f` up to the first incomplete one. A .gz trace whose
+    recorder never reached close() has no end-of-stream marker; reading
+    past its last flush raises instead of hitting EOF."""
+    try:
+        for line in f:
+            if not line.endswith("\n"):
+                return  # cut mid-write
+            yield line
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return
+
+
+def configured_trace_path(config: dict = None) -> str | None:
+    """MAIA_TRACE, else "trace_path" in maia_config.json; None = off."""
+    return os.environ.get("MAIA_TRACE") or (config or {}).get("trace_path") or None
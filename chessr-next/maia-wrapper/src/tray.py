@@ -16,11 +16,14 @@ from pathlib import Path
 
 import psutil
 import webview
-import onnxruntime as ort
 
 from . import __version__
-from .engine import MaiaEngine, EngineConfig, _resolve_provider
+from .profiling import format_report
+from .config import save_config
+from .engine import MaiaEngine, EngineConfig, available_provider_names
 from .server import MaiaServer, DEFAULT_PORT
+from .registry import ModelRegistry, configured_budget_mb
+from .trace import TraceRecorder, configured_trace_path
 from .updater import check_for_update, download_and_open
 from .automove_state import AutoMoveState
 from .overlay import OVERLAY_HTML, OverlayApi
@@ -30,19 +33,6 @@ from .automove import UserMouseMonitor
 logger = logging.getLogger("maia-gui")
 
 MAX_LOG_LINES = 200
-CONFIG_PATH = Path.home() / ".chessr" / "maia_config.json"
-
-
-def load_config() -> dict:
-    try:
-        return json.loads(CONFIG_PATH.read_text())
-    except Exception:
-        return {"provider": "auto", "threads": 0}
-
-
-def save_config(config: dict):
-    CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CONFIG_PATH.write_text(json.dumps(config))
 
 
 class _BufferHandler(logging.Handler):
@@ -251,6 +241,13 @@ HTML_TEMPLATE = """
   .settings-apply:hover { opacity: 0.9; }
   .settings-apply:disabled { opacity: 0.5; cursor: wait; }
   .settings-status { font-size: 10px; color: #64748b; min-height: 14px; margin-top: 4px; }
+  .calib-row {
+    display: flex; align-items: center; justify-content: space-between; gap: 8px;
+    margin-top: 10px; padding-top: 8px; border-top: 1px solid #1e293b;
+  }
+  .calib-results { margin-top: 6px; font-size: 10px; color: #64748b; }
+  .calib-line { display: flex; justify-content: space-between; padding: 1px 0; }
+  .calib-line.best { color: #22c55e; }
 
   /* CTA Button */
   .cta-btn {
@@ -387,6 +384,15 @@ HTML_TEMPLATE = """
           <span class="settings-status" id="settings-status"></span>
           <button class="settings-apply" id="settings-apply" onclick="applySettings()">Apply</button>
         </div>
+        <div class="calib-row">
+          <span class="settings-label" id="calib-label">Not calibrated</span>
+          <div style="display:flex; gap:6px;">
+            <button class="btn-sm" id="profile-btn" onclick="runProfile()">Profile</button>
+            <button class="btn-sm" id="calib-btn" onclick="runCalibration()">Calibrate</button>
+          </div>
+        </div>
+        <div class="calib-results" id="calib-results"></div>
+        <div class="calib-results" id="profile-results"></div>
       </div>
     </div>
 
@@ -460,12 +466,13 @@ HTML_TEMPLATE = """
 
         if (d.engine_info && d.engine_info.provider) {
           var i=d.engine_info;
-          var pLabel={coreml:'CoreML',directml:'DirectML',cpu:'CPU'}[i.provider]||i.provider;
+          var pLabel={coreml:'CoreML',directml:'DirectML',native:'Native',cpu:'CPU'}[i.provider]||i.provider;
           document.getElementById('engine-detail').textContent=pLabel+' · '+i.threads+' thread'+(i.threads>1?'s':'');
           document.getElementById('settings-status').textContent='Active: '+pLabel+' · '+i.threads+' thread'+(i.threads>1?'s':'');
           document.getElementById('engine-badge').textContent='Active';
           document.getElementById('engine-badge').className='engine-badge active';
         }
+        if (d.calibrating) document.getElementById('calib-label').textContent=d.calibrating;
 
         var logsEl=document.getElementById('logs');
         var lines=d.logs||[];
@@ -521,13 +528,60 @@ HTML_TEMPLATE = """
         sel.innerHTML='<option value="auto">Auto</option><option value="cpu">CPU</option>';
         if(c.available.includes('coreml')) sel.innerHTML+='<option value="coreml">CoreML</option>';
         if(c.available.includes('directml')) sel.innerHTML+='<option value="directml">DirectML</option>';
+        if(c.available.includes('native')) sel.innerHTML+='<option value="native">Native</option>';
         sel.value=c.provider;
         var sl=document.getElementById('threads-slider');
         sl.max=c.cpu_count; sl.value=c.threads||Math.max(1,Math.floor(c.cpu_count/2));
         document.getElementById('threads-val').textContent=sl.value;
+        renderCalibration(c.calibration);
       } catch(e) {}
     }
 
+    var PROVIDER_LABELS={coreml:'CoreML',directml:'DirectML',native:'Native',cpu:'CPU'};
+    function renderCalibration(c) {
+      var label=document.getElementById('calib-label');
+      var box=document.getElementById('calib-results');
+      if(!c){ label.textContent='Not calibrated'; box.innerHTML=''; return; }
+      label.textContent='Calibrated '+new Date(c.timestamp*1000).toLocaleDateString();
+      var sizes=Object.keys(c.results[0].throughput);
+      var big=sizes[sizes.length-1];
+      box.innerHTML=c.results.map(function(r){
+        var best=r.provider===c.winner.provider&&r.threads===c.winner.threads;
+        return '<div class="calib-line'+(best?' best':'')+'"><span>'+(PROVIDER_LABELS[r.provider]||r.provider)+' · '+r.threads+'t</span>'+
+          '<span>'+r.latency_ms.toFixed(1)+' ms · '+Math.round(r.throughput[big])+' pos/s @'+big+'</span></div>';
+      }).join('');
+    }
+
+    async function runCalibration() {
+      var btn=document.getElementById('calib-btn');
+      var label=document.getElementById('calib-label');
+      btn.disabled=true; btn.textContent='Calibrating...';
+      try {
+        var c=JSON.parse(await pywebview.api.calibrate_engine());
+        renderCalibration(c);
+        initSettings();
+      } catch(e) { label.textContent='Calibration failed'; }
+      btn.disabled=false; btn.textContent='Calibrate';
+    }
+
+    async function runProfile() {
+      var btn=document.getElementById('profile-btn');
+      var box=document.getElementById('profile-results');
+      btn.disabled=true; btn.textContent='Profiling...';
+      try {
+        var r=JSON.parse(await pywebview.api.profile_engine());
+        if(!r){ box.textContent='Profiling unavailable'; }
+        else if(r.error){ box.textContent=r.error; }
+        else {
+          box.innerHTML='<div class="calib-line"><span>'+r.run_ms.toFixed(2)+' ms/run</span><span>'+r.runs+' runs</span></div>'+
+            r.by_op.slice(0,5).map(function(o){
+              return '<div class="calib-line"><span>'+o.op+'</span><span>'+o.pct.toFixed(1)+'% · '+(o.us_per_run/1000).toFixed(2)+' ms</span></div>';
+            }).join('');
+        }
+      } catch(e) { box.textContent='Profiling failed'; }
+      btn.disabled=false; btn.textContent='Profile';
+    }
+
     async function applySettings() {
       var btn=document.getElementById('settings-apply');
       var st=document.getElementById('settings-status');
@@ -536,7 +590,7 @@ HTML_TEMPLATE = """
       btn.disabled=true; btn.textContent='Applying...'; st.textContent='';
       try {
         var r=JSON.parse(await pywebview.api.apply_engine_config(prov,threads));
-        var pl={coreml:'CoreML',directml:'DirectML',cpu:'CPU'}[r.provider]||r.provider;
+        var pl={coreml:'CoreML',directml:'DirectML',native:'Native',cpu:'CPU'}[r.provider]||r.provider;
         st.textContent='Active: '+pl+' · '+r.threads+' thread'+(r.threads>1?'s':'');
       } catch(e) { st.textContent='Failed'; }
       btn.disabled=false; btn.textContent='Apply';
@@ -595,6 +649,7 @@ class Api:
             "logs": _log_buffer.get_lines(),
             "metrics": metrics,
             "engine_info": engine_info,
+            "calibrating": self._app._calibration_step,
         })
 
     def check_update(self):
@@ -619,26 +674,21 @@ class Api:
 
     def get_engine_config(self):
         cfg = self._app._engine_config
-        available = ort.get_available_providers()
-        available_simple = []
-        if "CoreMLExecutionProvider" in available:
-            available_simple.append("coreml")
-        if "DmlExecutionProvider" in available:
-            available_simple.append("directml")
         return json.dumps({
             "provider": cfg.get("provider", "auto"),
             "threads": cfg.get("threads", 0),
             "cpu_count": os.cpu_count() or 2,
-            "available": available_simple,
+            "available": available_provider_names(self._app._model_path),
+            "calibration": cfg.get("calibration"),
         })
 
     def apply_engine_config(self, provider: str, threads: int):
         config = EngineConfig(provider=provider, threads=threads)
         if self._app.engine:
             logger.info(f"Reconfiguring engine: provider={provider}, threads={threads}")
-            self._app.engine.reconfigure(config)
+            self._app.reconfigure_engines(config)
             logger.info(f"Engine reconfigured: active_provider={self._app.engine.active_provider}, threads={self._app.engine.active_threads}")
-        new_cfg = {"provider": provider, "threads": threads}
+        new_cfg = {**self._app._engine_config, "provider": provider, "threads": threads}
         self._app._engine_config = new_cfg
         save_config(new_cfg)
         return json.dumps({
@@ -647,10 +697,50 @@ class Api:
         })
 
 
+    def calibrate_engine(self):
+        from .calibrate import calibrate, apply_calibration  # numpy: keep it off the startup path
+
+        model_path = self._app._model_path
+        if not model_path:
+            return json.dumps(None)
+        logger.info("Calibrating engine (providers × threads × batch sizes)...")
+        try:
+            result = calibrate(model_path, progress=self._app._set_calibration_step)
+        finally:
+            self._app._calibration_step = None
+        self._app._engine_config = apply_calibration(self._app._engine_config, result)
+        winner = result["winner"]
+        logger.info(f"Calibration done: {winner['provider']} · {winner['threads']} threads")
+        if self._app.engine:
+            self._app.reconfigure_engines(EngineConfig(provider=winner["provider"], threads=winner["threads"]))
+        return json.dumps(result)
+
+    def profile_engine(self):
+        engine = self._app.engine
+        if not engine:
+            return json.dumps(None)
+        if not engine.supports_profiling:
+            return json.dumps({"error": f"Profiling needs an ONNX Runtime provider "
+                                        f"(active: {engine.active_provider})"})
+        logger.info(f"Profiling engine ({engine.active_provider} · {engine.active_threads} threads)...")
+        report = engine.profile()
+        logger.info("Profile:\n" + format_report(report, rows=5))
+        return json.dumps(report)
+
+
 # ---------------------------------------------------------------------------
 # Application
 # ---------------------------------------------------------------------------
 
+# Engine startup phase -> (progress %, loading-screen label)
+_STARTUP_PHASES = {
+    "runtime": (10, "Loading ONNX Runtime..."),
+    "hash": (20, "Checking model cache..."),
+    "optimize": (30, "Optimizing model (first launch)..."),
+    "load": (50, "Loading model..."),
+    "warmup": (70, "Warming up..."),
+}
+
 class MaiaApp:
     """Windowed desktop application for Chessr.io."""
 
@@ -658,12 +748,14 @@ class MaiaApp:
         self.port = port
         self._model_path = model_path
         self.engine = engine
+        self.registry: ModelRegistry | None = None
         self._loop: asyncio.AbstractEventLoop | None = None
         self._is_running = False
         self._engine_ready = engine is not None
         self._loading_percent = 0
         self._loading_step = "Initializing..."
         self._engine_config = engine_config or {"provider": "auto", "threads": 0}
+        self._calibration_step: str | None = None
         self.server = None
         self.automove_state = automove_state or AutoMoveState()
         self._keybind_listener = None
@@ -727,6 +819,13 @@ class MaiaApp:
         self._loading_percent = percent
         self._loading_step = step
 
+    def _set_calibration_step(self, step: str):
+        self._calibration_step = f"Calibrating: {step}"
+
+    def _on_engine_phase(self, phase: str):
+        percent, step = _STARTUP_PHASES.get(phase, (self._loading_percent, self._loading_step))
+        self._set_progress(percent, step)
+
     def _load_and_start(self):
         if not self.engine and self._model_path:
             self._set_progress(5, "Detecting hardware...")
@@ -736,10 +835,12 @@ class MaiaApp:
                     provider=self._engine_config.get("provider", "auto"),
                     threads=self._engine_config.get("threads", 0),
                 )
-                self._set_progress(15, "Loading ONNX model...")
-                self.engine = MaiaEngine(self._model_path, config)
-                self._set_progress(80, "Model loaded")
+                self.engine = MaiaEngine(self._model_path, config, progress=self._on_engine_phase)
+                self._set_progress(85, "Model loaded")
                 logger.info(f"Model loaded — provider: {self.engine.active_provider}, threads: {self.engine.active_threads}")
+                timings = ", ".join(f"{k.removesuffix('_ms')}={v:.0f}ms" for k, v in self.engine.startup_timings.items())
+                cache = "hit" if self.engine.model_cache_hit else "miss"
+                logger.info(f"Startup: {timings} (model cache {cache})")
             except FileNotFoundError:
                 self._set_progress(0, "Model file not found")
                 logger.error(f"Model not found at {self._model_path}")
@@ -749,8 +850,25 @@ class MaiaApp:
                 logger.error(f"Failed to load model: {e}")
                 return
 
+        if self._model_path:
+            # Blitz / fp16 / int8 variants next to the model load on first request.
+            config = EngineConfig(
+                provider=self._engine_config.get("provider", "auto"),
+                threads=self._engine_config.get("threads", 0),
+            )
+            self.registry = ModelRegistry(self._model_path, config, primary=self.engine,
+                                          budget_mb=configured_budget_mb(self._engine_config))
+            logger.info("Model variants: " + ", ".join(
+                v["name"] for v in self.registry.status()["variants"]))
+
         self._set_progress(90, "Starting server...")
-        self.server = MaiaServer(self.engine, self.port, automove_state=self.automove_state)
+        # Off unless MAIA_METRICS_PORT or "metrics_port" in maia_config.json is set.
+        metrics_port = int(os.environ.get("MAIA_METRICS_PORT", self._engine_config.get("metrics_port", 0)))
+        # Off unless MAIA_TRACE or "trace_path" in maia_config.json is set.
+        trace_path = configured_trace_path(self._engine_config)
+        self.server = MaiaServer(self.engine, self.port, automove_state=self.automove_state,
+                                 metrics_port=metrics_port or None, registry=self.registry,
+                                 trace=TraceRecorder(trace_path) if trace_path else None)
 
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
@@ -761,6 +879,12 @@ class MaiaApp:
         logger.info(f"Server listening on port {self.port}")
         self._loop.run_forever()
 
+    def reconfigure_engines(self, config: EngineConfig):
+        if self.registry:
+            self.registry.reconfigure(config)
+        else:
+            self.engine.reconfigure(config)
+
     def toggle_server(self):
         if not self.server or not self._loop:
             return
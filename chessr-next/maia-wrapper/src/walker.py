@@ -0,0 +1,133 @@
+"""
+Incremental position encoding along a game.
+
+`MaiaEngine.predict` parses a FEN, mirrors a full board copy and re-encodes
+all 18 planes for every position. When stepping through a game that work is
+redundant: GameWalker keeps one board plus its 12 piece planes (in white's
+orientation), and each move only rewrites the squares it touched. The model
+input for the side to move is then a plane swap + rank flip of those planes.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from .lazy import chess, np
+
+# Plane index of each piece type (white 0-5, black +6), same as _board_to_tensor.
+_PIECE_PLANE = {1: 0, 2: 1, 3: 2, 4: 3, 5: 4, 6: 5}  # chess.PAWN .. chess.KING
+
+
+class GameWalker:
+    """One board walked move by move, with its encoding kept up to date.
+
+    Usage:
+        walker = GameWalker(start_fen)
+        for uci in moves:
+            x = walker.encode()     # [18, 8, 8] model input for this position
+            walker.push(uci)
+
+    `encode()` matches `encode_position(chess.Board(walker.board.fen()))`:
+    like a FEN, it only sets the en-passant plane when an en-passant capture
+    is actually legal.
+    """
+
+    def __init__(self, start_fen: str = None):
+        self.board = chess.Board(start_fen) if start_fen else chess.Board()
+        self._pieces = np.zeros((12, 8, 8), dtype=np.float32)
+        for sq, piece in self.board.piece_map().items():
+            self._set_square(sq, piece)
+
+    def _set_square(self, sq: int, piece):
+        rank, file = sq >> 3, sq & 7
+        self._pieces[:, rank, file] = 0.0
+        if piece is not None:
+            plane = _PIECE_PLANE[piece.piece_type] + (0 if piece.color == chess.WHITE else 6)
+            self._pieces[plane, rank, file] = 1.0
+
+    def push(self, move) -> chess.Move:
+        """Play `move` (UCI string or chess.Move) and update the piece planes.
+
+        Raises ValueError for an illegal move.
+        """
+        board = self.board
+        if isinstance(move, str):
+            move = board.parse_uci(move)
+        elif not board.is_legal(move):
+            raise ValueError(f"illegal move in {board.fen()}: {move}")
+
+        touched = [move.from_square, move.to_square]
+        if board.is_castling(move):
+            # The rook moves too; refresh the whole back rank (also covers 960).
+            rank = chess.square_rank(move.from_square)
+            touched = [chess.square(f, rank) for f in range(8)]
+        elif board.is_en_passant(move):
+            touched.append(chess.square(chess.square_file(move.to_square),
+                                        chess.square_rank(move.from_square)))
+
+        board.push(move)
+        for sq in touched:
+            self._set_square(sq, board.piece_at(sq))
+        return move
+
+    def encode(self) -> np.ndarray:
+        """[18, 8, 8] model input for the current position (side to move's view)."""
+        board = self.board
+        x = np.zeros((18, 8, 8), dtype=np.float32)
+        if board.turn == chess.WHITE:
+            x[:12] = self._pieces
+            castling = (
+                board.has_kingside_castling_rights(chess.WHITE),
+                board.has_queenside_castling_rights(chess.WHITE),
+                board.has_kingside_castling_rights(chess.BLACK),
+                board.has_queenside_castling_rights(chess.BLACK),
+            )
+        else:
+            # Mirrored: black's pieces become "white" and ranks flip.
+            x[0:6] = self._pieces[6:12, ::-1]
+            x[6:12] = self._pieces[0:6, ::-1]
+            castling = (
+                board.has_kingside_castling_rights(chess.BLACK),
+                board.has_queenside_castling_rights(chess.BLACK),
+                board.has_kingside_castling_rights(chess.WHITE),
+                board.has_queenside_castling_rights(chess.WHITE),
+            )
+        x[12] = 1.0  # the mover is always "white" after mirroring
+        for plane, allowed in enumerate(castling, start=13):
+            if allowed:
+                x[plane] = 1.0
+        if board.ep_square is not None and board.has_legal_en_passant():
+            rank, file = board.ep_square >> 3, board.ep_square & 7
+            if board.turn == chess.BLACK:
+                rank = 7 - rank
+            x[17, rank, file] = 1.0
+        return x
+
+    def legal_moves(self) -> list[str]:
+        """Legal moves of the current position, as UCI in real orientation."""
+        return [m.uci() for m in self.board.legal_moves]
+
+
+def walk_game(moves: Iterable, start_fen: str = None) -> tuple[np.ndarray, list[dict]]:
+    """Encode every position of a game: before each move, plus the final one.
+
+    Returns:
+        (boards [N+1, 18, 8, 8] float32, positions) where each position is
+        {"fen", "is_black", "legal", "played"}; "played" is the UCI move
+        made from that position (None for the last one).
+    """
+    walker = GameWalker(start_fen)
+    encoded, positions = [], []
+    for move in list(moves) + [None]:
+        board = walker.board
+        encoded.append(walker.encode())
+        position = {
+            "fen": board.fen(),
+            "is_black": board.turn == chess.BLACK,
+            "legal": walker.legal_moves(),
+            "played": None,
+        }
+        if move is not None:
+            position["played"] = walker.push(move).uci()
+        positions.append(position)
+    return np.stack(encoded), positions
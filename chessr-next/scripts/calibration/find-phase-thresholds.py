@@ -1,95 +1,266 @@
 """
-Find material ratios at Chess.com phase transition plies to calibrate our thresholds.
+Calibrate the material-based game-phase thresholds.
+
+Phase detection (analysisHandler.ts, run-all.mjs) classifies a position by
+its material ratio (non-king material / 78): opening above 0.85, middlegame
+above 0.35, endgame otherwise. This fits both cutoffs against labeled
+Chess.com phase transitions, reports per-ply accuracy for the baseline and
+the fit, and — given a packed position corpus — how each pair of
+thresholds splits real games.
+
+Features come straight from piece bitboards with vectorized popcounts, so a
+corpus of millions of positions takes seconds.
+
+Labels are JSON lists of games (phase-labels.json, chesscom-data.json):
+    {"pgn": "1. e4 ...", "phases": [26, 98], "endPhase": 2}
+`phases` are transition plies (opening→middlegame, middlegame→endgame): the
+position after ply `phases[0]` is the first middlegame position. `endPhase`
+is the last phase reached (default: len(phases)); when it is higher than the
+listed transitions, plies past the last one are left out of the accuracy.
+chesscom-data.json records use `gamePhases`, with the end phase taken from
+which per-phase CAPS are present.
+
+The corpus is a dataset directory from maia2-wasm/python (dataset.py or
+ingest.py).
+
+Usage:
+    python find-phase-thresholds.py
+    python find-phase-thresholds.py --corpus ../../../maia2-wasm/python/data/positions
 """
-import chess
+
+import argparse
+import io
 import json
+import time
+from pathlib import Path
+
+import chess
+import chess.pgn
+import numpy as np
+
+HERE = Path(__file__).parent.resolve()
+DEFAULT_LABELS = [HERE / "phase-labels.json", HERE / "chesscom-data.json"]
+
+BASELINE = (0.85, 0.35)
+TOTAL_MATERIAL = 78
+# Bitboard planes: white P N B R Q K, black P N B R Q K (dataset.py order).
+PLANE_VALUES = np.array([1, 3, 3, 5, 9, 0] * 2, dtype=np.int32)
+PHASES = ("opening", "middlegame", "endgame")
+BLOCK_ROWS = 1 << 20
+
+
+# ─── Features ─────────────────────────────────────────────────────────────
+
+def popcount(bb: np.ndarray) -> np.ndarray:
+    """Per-element popcount of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bb).astype(np.int32)
+    bb = bb - ((bb >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    bb = (bb & np.uint64(0x3333333333333333)) + ((bb >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    bb = (bb + (bb >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((bb * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int32)
+
+
+def features(pieces: np.ndarray) -> dict:
+    """Phase features of [N, 12] bitboards."""
+    counts = popcount(np.asarray(pieces, dtype=np.uint64))
+    material = counts @ PLANE_VALUES
+    return {
+        "material": material,
+        "ratio": material / TOTAL_MATERIAL,
+        "non_pawn": material - counts[:, 0] - counts[:, 6],
+        "queens": counts[:, 4] + counts[:, 10],
+        "pieces": counts[:, [1, 2, 3, 4, 7, 8, 9, 10]].sum(axis=1),
+    }
+
+
+def classify(ratio: np.ndarray, t_open: float, t_end: float) -> np.ndarray:
+    """0 opening, 1 middlegame, 2 endgame — same rule as detectPhase()."""
+    return np.where(ratio > t_open, 0, np.where(ratio > t_end, 1, 2)).astype(np.int8)
+
+
+def board_pieces(board: chess.Board) -> list[int]:
+    return [board.pieces_mask(pt, color) for color in (chess.WHITE, chess.BLACK) for pt in chess.PIECE_TYPES]
+
+
+# ─── Labels ───────────────────────────────────────────────────────────────
+
+def _label_record(rec: dict) -> tuple[list[int], int]:
+    if "gamePhases" in rec:
+        caps = rec.get("chesscomCAPS", {})
+        reached = [any(caps.get(side, {}).get(f"gp{p}") is not None for side in ("white", "black"))
+                   for p in range(3)]
+        end_phase = max((p for p in range(3) if reached[p]), default=len(rec["gamePhases"]))
+        return list(rec["gamePhases"])[:end_phase], end_phase
+    phases = list(rec["phases"])
+    return phases, rec.get("endPhase", len(phases))
+
+
+def load_labels(paths) -> list[dict]:
+    """Labeled games: bitboards after every ply and the per-ply phase label (-1 = unknown)."""
+    games = []
+    for path in paths:
+        data = json.loads(Path(path).read_text())
+        for i, rec in enumerate(data if isinstance(data, list) else [data]):
+            transitions, end_phase = _label_record(rec)
+            game = chess.pgn.read_game(io.StringIO(rec["pgn"]))
+            board = game.board()
+            pieces = []
+            for move in game.mainline_moves():
+                board.push(move)
+                pieces.append(board_pieces(board))
+            plies = np.arange(1, len(pieces) + 1)
+            labels = (plies[:, None] >= np.array(transitions, dtype=np.int64)[None, :]).sum(axis=1)
+            labels = labels.astype(np.int8)
+            if end_phase > len(transitions):
+                start = transitions[-1] if transitions else 1
+                labels[plies >= start] = -1
+            games.append({
+                "name": rec.get("name") or rec.get("game") or f"{Path(path).name}[{i}]",
+                "pieces": np.array(pieces, dtype=np.uint64).reshape(-1, 12),
+                "labels": labels,
+                "transitions": transitions,
+                "end_phase": end_phase,
+            })
+    return games
+
+
+# ─── Fitting ──────────────────────────────────────────────────────────────
+
+def evaluate(games: list[dict], t_open: float, t_end: float) -> dict:
+    """Per-ply accuracy, transition-ply error and end-phase accuracy."""
+    correct = total = end_ok = 0
+    errors = {0: [], 1: []}
+    for g in games:
+        pred = classify(g["ratio"], t_open, t_end)
+        known = g["labels"] >= 0
+        correct += int((pred[known] == g["labels"][known]).sum())
+        total += int(known.sum())
+        end_ok += int(pred[-1] == g["end_phase"]) if len(pred) else 0
+        for j, ply in enumerate(g["transitions"]):
+            hit = np.nonzero(pred > j)[0]
+            predicted = hit[0] + 1 if len(hit) else len(pred) + 1
+            errors[j].append(abs(predicted - ply))
+    return {
+        "thresholds": [round(t_open, 3), round(t_end, 3)],
+        "ply_accuracy": round(correct / total, 4) if total else None,
+        "end_phase_accuracy": round(end_ok / len(games), 4) if games else None,
+        "opening_end_mae": round(float(np.mean(errors[0])), 2) if errors[0] else None,
+        "middlegame_end_mae": round(float(np.mean(errors[1])), 2) if errors[1] else None,
+    }
+
+
+def fit(games: list[dict], step: float = 0.005) -> tuple[float, float]:
+    """Grid search maximizing per-ply accuracy; ties go to the pair closest to the baseline."""
+    ratio = np.concatenate([g["ratio"] for g in games])
+    labels = np.concatenate([g["labels"] for g in games])
+    known = labels >= 0
+    ratio, labels = ratio[known], labels[known]
+
+    grid = np.round(np.arange(step, 1.0 + step / 2, step), 6)
+    best_score, best = None, BASELINE
+    for t_open in grid:
+        t_end = grid[grid <= t_open]
+        # [T, P]: phase of every labeled ply under each t_end.
+        pred = np.where(ratio[None, :] > t_open, 0, np.where(ratio[None, :] > t_end[:, None], 1, 2))
+        acc = (pred == labels[None, :]).mean(axis=1)
+        dist = np.abs(t_open - BASELINE[0]) + np.abs(t_end - BASELINE[1])
+        i = np.lexsort((dist, -acc))[0]
+        score = (acc[i], -dist[i])
+        if best_score is None or score > best_score:
+            best_score, best = score, (float(t_open), float(t_end[i]))
+    return best
+
+
+# ─── Corpus ───────────────────────────────────────────────────────────────
+
+def corpus_report(path, thresholds: list[tuple[float, float]]) -> dict:
+    """How each threshold pair splits a packed position corpus."""
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    n, n_games = meta["rows"], meta["games"]
+    pieces = np.memmap(path / "pieces.bin", dtype="<u8", mode="r", shape=(n, 12))
+    ply = np.memmap(path / "ply.bin", dtype="<u2", mode="r", shape=(n,))
+    offsets = np.fromfile(path / "game_offsets.bin", dtype="<u8").astype(np.int64)
+
+    t0 = time.perf_counter()
+    ratio = np.empty(n, dtype=np.float32)
+    for start in range(0, n, BLOCK_ROWS):
+        ratio[start:start + BLOCK_ROWS] = features(pieces[start:start + BLOCK_ROWS])["ratio"]
+    feature_s = time.perf_counter() - t0
+
+    ply = np.asarray(ply, dtype=np.int32)
+    lengths = np.diff(offsets)
+    report = {"positions": n, "games": n_games, "feature_seconds": round(feature_s, 2), "thresholds": []}
+    never = np.iinfo(np.int32).max
+    for t_open, t_end in thresholds:
+        phase = classify(ratio, t_open, t_end)
+        entry = {
+            "thresholds": [round(t_open, 3), round(t_end, 3)],
+            "share": {name: round(float((phase == p).mean()), 4) for p, name in enumerate(PHASES)},
+        }
+        for p, name in ((1, "middlegame"), (2, "endgame")):
+            first = np.minimum.reduceat(np.where(phase >= p, ply, never), offsets[:-1]) if n_games else np.array([])
+            reached = first < never
+            entry[f"{name}_reached"] = round(float(reached.mean()), 4) if n_games else None
+            entry[f"{name}_start_ply_median"] = float(np.median(first[reached])) if reached.any() else None
+        entry["game_plies_median"] = float(np.median(lengths)) if n_games else None
+        report["thresholds"].append(entry)
+    return report
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--labels", nargs="*", default=[str(p) for p in DEFAULT_LABELS])
+    ap.add_argument("--corpus", help="packed position dataset directory")
+    ap.add_argument("--step", type=float, default=0.005, help="threshold grid step")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    games = load_labels([p for p in args.labels if Path(p).exists()])
+    for g in games:
+        g.update(features(g["pieces"]))
+    fitted = fit(games, args.step)
+    result = {
+        "labeled_games": len(games),
+        "labeled_plies": int(sum((g["labels"] >= 0).sum() for g in games)),
+        "baseline": evaluate(games, *BASELINE),
+        "fitted": evaluate(games, *fitted),
+    }
+    if args.corpus:
+        result["corpus"] = corpus_report(args.corpus, [BASELINE, fitted])
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print("=== Labeled transitions ===\n")
+    for g in games:
+        at = ", ".join(f"ply {p}: ratio {g['ratio'][p - 1]:.3f}, non-pawn {g['non_pawn'][p - 1]}, "
+                       f"queens {g['queens'][p - 1]}" for p in g["transitions"] if p <= len(g["ratio"]))
+        print(f"  {g['name']} — end phase {PHASES[g['end_phase']]}")
+        if at:
+            print(f"    {at}")
+
+    print(f"\n=== Fit ({result['labeled_games']} games, {result['labeled_plies']} labeled plies) ===\n")
+    for name in ("baseline", "fitted"):
+        r = result[name]
+        print(f"  {name:8s}  opening > {r['thresholds'][0]:.3f}, middlegame > {r['thresholds'][1]:.3f}  "
+              f"ply acc {r['ply_accuracy']:.1%}  end-phase acc {r['end_phase_accuracy']:.1%}  "
+              f"transition MAE {r['opening_end_mae']} / {r['middlegame_end_mae']} plies")
+
+    if args.corpus:
+        c = result["corpus"]
+        print(f"\n=== Corpus ({c['games']:,} games, {c['positions']:,} positions, "
+              f"features in {c['feature_seconds']}s) ===\n")
+        for name, e in zip(("baseline", "fitted"), c["thresholds"]):
+            share = " / ".join(f"{e['share'][p]:.1%}" for p in PHASES)
+            print(f"  {name:8s}  positions o/m/e {share}  middlegame in {e['middlegame_reached']:.1%} of games "
+                  f"(median ply {e['middlegame_start_ply_median']}), endgame in {e['endgame_reached']:.1%} "
+                  f"(median ply {e['endgame_start_ply_median']})")
+
 
-games = [
-    {
-        "name": "Game 1 (chessr-io, 1780)",
-        "pgn": "1. c3 d5 2. d3 Nf6 3. g3 e5 4. Bg2 Bd6 5. Qb3 c6 6. Bg5 Nbd7 7. Nd2 a5 8. c4 d4 9. Ne4 Bb4+ 10. Kf1 Nxe4 11. Bxd8 Nd2+ 12. Ke1 Nxb3+ 13. Kf1 Nxa1 14. Bg5 Nc2 15. Nf3 h6 16. Bc1 a4 17. a3 Be7 18. e4 dxe3 19. fxe3 Nc5 20. Ke2 e4 21. Kd2 exf3 22. Bxf3 Na1 23. d4 Ncb3+ 24. Kc3 Bf5 25. e4 Bh7 26. d5 Bf6+ 27. Kb4 Nc2#",
-        "phases": [27],  # opening ends at ply 27
-    },
-    {
-        "name": "Game 2 (jaxceq, 361)",
-        "pgn": "1. e4 Nf6 2. e5 Ne4 3. d3 Ng5 4. h4 Ne6 5. b4 Nc6 6. b5 Nb4 7. c3 Nd5 8. c4 Nb4 9. a3 Nxd3+ 10. Qxd3 c6 11. bxc6 bxc6 12. a4 Ba6 13. Nf3 Nc5 14. Qd4 d6 15. exd6 exd6 16. Qe3+ Kd7 17. h5 Rb8 18. Nc3 Rb3 19. h6 gxh6 20. g3 Bg7 21. Bh3+ Kc7 22. Nd4 Bxc4 23. Nxb3 Re8 24. Ne4 Nxb3 25. Rb1 Bd4 26. Qf3 d5 27. Qxf7+ Kb6 28. Bd7 Rxe4+ 29. Kd1 Be2+ 30. Kc2 Re7 31. Rxb3+ Ka6 32. Qf5 Rxd7 33. Rxh6 Re7 34. Rxc6+ Bb6 35. Rcxb6+ Ka5 36. Bd2+ Kxa4 37. Ra6+ Bxa6 38. Qf4+ d4 39. Be3 Rc7+ 40. Kb2 Qc8 41. Qxd4+ Bc4 42. Ra3+ Kb4 43. Qc3+ Kb5 44. Qa5+ Kc6 45. Qa4+ Bb5 46. Rc3+ Kb7 47. Rxc7+ Qxc7 48. Qxb5+ Kc8 49. Qe8+ Kb7 50. f4 a6 51. f5 a5 52. f6 a4 53. f7 Qb6+ 54. Bxb6 Kxb6 55. f8=Q a3+ 56. Kxa3 h6 57. Qxh6+ Kc5 58. Qe5+ Kc4 59. Qh4+ Kd3 60. Qd5+ Kc2 61. Qhc4+ Kb1 62. Qd1#",
-        "phases": [26, 98],  # opening→middle at 26, middle→endgame at 98
-    },
-    {
-        "name": "Game 3 (thoriq, 1600)",
-        "pgn": "1. d4 d5 2. Bf4 e6 3. Nf3 Nc6 4. e3 Bd7 5. c3 Be7 6. Bd3 Nf6 7. Nbd2 O-O 8. Qc2 g6 9. h3 Nh5 10. Bh2 Ng7 11. a3 Bd6 12. Bxd6 cxd6 13. e4 dxe4 14. Bxe4 d5 15. Bd3 Ne7 16. Ne5 Be8 17. Ndf3 Nef5 18. O-O f6 19. Ng4 Nd6 20. Qd2 Ndf5 21. Rfe1 Qc8 22. Rac1 a6 23. c4 Bc6 24. b3 Qe8 25. a4 h5 26. Ne3 Nxe3 27. Qxe3 Bd7 28. Qh6 Nf5 29. Bxf5 gxf5 30. Nh4 Qf7 31. Ng6 Qh7 32. Qxh7+ Kxh7 33. Ne7 Rf7 34. cxd5 Rxe7 35. dxe6 Rxe6 36. Rxe6 Bxe6 37. Rc7+ Kg6 38. Rxb7 Bd5 39. Rb6 f4 40. f3 Kg5 41. Kf2 f5 42. a5 Rd8 43. Rxa6 Bxb3 44. Rb6 Bc4 45. a6 Rxd4 46. a7 Rd2+ 47. Kg1 Ra2 48. Rb7 Bd5 49. Rg7+ Kf6 50. Rh7 Kg6 51. Rd7 Ba8 52. Rc7 Kf6 53. Rh7 Kg6 54. Rd7 Kf6 55. Rd6+ Ke5 56. Rd7 Ke6 57. Rh7 Ke5 58. Re7+ Kf6 59. Rh7 Ra1+ 60. Kf2 Ra5 61. Ke2 Ke5 62. Re7+ Kf6 63. Rh7 Ra6 64. Rh6+ Ke5 65. Rxa6",
-        "phases": [14],  # gameEndPhase: 2 (reaches endgame)
-        "endPhase": 2,
-    },
-    {
-        "name": "Game 4 (rabin, 1861)",
-        "pgn": "1. e4 d5 2. exd5 Qxd5 3. Nc3 Qa5 4. Nf3 c6 5. Be2 Bg4 6. O-O Bxf3 7. Bxf3 e6 8. d4 Qc7 9. Qe2 Nd7 10. d5 e5 11. dxc6 bxc6 12. Bf4 Bd6 13. Rad1 O-O-O 14. Be3 Kb8 15. Ne4 Be7 16. Rd3 Ngf6 17. Rb3+ Ka8 18. Ra3 Nb6 19. Qa6 Bxa3 20. Qxa3 Nfd5 21. Bc5 f5 22. Nd6 e4 23. Be2 g6 24. b4 Rxd6 25. b5 Rdd8 26. bxc6 Qxc6 27. Rb1 h5 28. c4 Nf4 29. Bf1 Rb8 30. g3 g5 31. gxf4 gxf4 32. Bh3 Rhg8+ 33. Kf1 e3 34. Bxf5 Qg2+ 35. Ke1 Qxf2+ 36. Kd1 Qd2#",
-        "phases": [14],  # gameEndPhase: 1 (middlegame only)
-        "endPhase": 1,
-    },
-    {
-        "name": "Game 5 (TorFredrik, 3008)",
-        "pgn": "1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6 6. h3 g6 7. g4 Bg7 8. Be3 Nc6 9. Qd2 O-O 10. O-O-O Nxd4 11. Bxd4 Qa5 12. Kb1 Be6 13. a3 b5 14. g5 Nh5 15. Nd5 Qd8 16. Bxg7 Nxg7 17. h4 Bxd5 18. Qxd5 Rc8 19. Be2 Rc5 20. Qd2 a5 21. h5 b4 22. a4 Qc7 23. hxg6 hxg6 24. Rh3 f6 25. gxf6 Rxf6 26. f4 e5 27. f5 gxf5 28. exf5 Kf7 29. Rh7 Kf8 30. Rg1 Rf7 31. f6 Rxf6 32. Qg5 Rf7 33. Rh8#",
-        "phases": [23],
-    },
-]
-
-piece_values = {'q': 9, 'Q': 9, 'r': 5, 'R': 5, 'b': 3, 'B': 3, 'n': 3, 'N': 3, 'p': 1, 'P': 1}
-
-def material_ratio(fen):
-    board_str = fen.split(' ')[0]
-    mat = sum(piece_values.get(c, 0) for c in board_str)
-    return mat / 78
-
-print("=== Material ratios at Chess.com phase transitions ===\n")
-
-all_opening_end = []
-all_middle_end = []
-
-for g in games:
-    pgn_moves = g["pgn"]
-    # Parse moves
-    tokens = pgn_moves.replace('.', ' ').split()
-    san_moves = [t for t in tokens if not t[0].isdigit() and t not in ['1-0', '0-1', '1/2-1/2', '*']]
-
-    board = chess.Board()
-    ratios = []
-    for i, san in enumerate(san_moves):
-        move = board.parse_san(san)
-        board.push(move)
-        ratios.append(material_ratio(board.fen()))
-
-    print(f"{g['name']}")
-    print(f"  CC phase transitions: {g['phases']}")
-
-    for j, ply in enumerate(g['phases']):
-        if ply <= len(ratios):
-            r = ratios[ply - 1]
-            phase_name = "opening→middle" if j == 0 else "middle→endgame"
-            print(f"  Ply {ply} ({phase_name}): ratio = {r:.3f}")
-            if j == 0:
-                all_opening_end.append(r)
-            else:
-                all_middle_end.append(r)
-
-    # Show ratio every 10 plies
-    samples = [(p, ratios[p-1]) for p in range(5, len(ratios)+1, 5) if p <= len(ratios)]
-    print(f"  Ratios: " + ", ".join(f"ply{p}={r:.2f}" for p, r in samples))
-    print()
-
-print("=== Summary ===\n")
-print(f"Opening→Middle transitions (ratio at transition ply):")
-for r in all_opening_end:
-    print(f"  {r:.3f}")
-print(f"  Average: {sum(all_opening_end)/len(all_opening_end):.3f}")
-print(f"  Min: {min(all_opening_end):.3f}")
-print(f"  Max: {max(all_opening_end):.3f}")
-
-if all_middle_end:
-    print(f"\nMiddle→Endgame transitions:")
-    for r in all_middle_end:
-        print(f"  {r:.3f}")
-    print(f"  Average: {sum(all_middle_end)/len(all_middle_end):.3f}")
-
-print(f"\nCurrent thresholds: opening > 0.85, middlegame > 0.35")
-print(f"Suggested opening threshold: ~{sum(all_opening_end)/len(all_opening_end):.2f}")
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,13 @@
  * Protocol (line-based stdin/stdout, defined in
  * maia2-wasm/maia-runtime/native/main.cpp):
  *   stderr: "READY\n"  ← weights loaded, ready
- *   stdin:  "predict|<fen>|<eloSelf>|<eloOppo>\n"
- *   stdout: "result <value> <logit0> <logit1> ... <logit1879>\n"
- *           OR "err <reason>\n"
+ *   stdin:  "predict#<id>|<fen>|<eloSelf>|<eloOppo>\n"
+ *   stdout: "result#<id> <value> <logit0> <logit1> ... <logit1879>\n"
+ *           OR "err#<id> <reason>\n"
  *
- * Single in-flight predict per instance. Pool sizing controls concurrency.
+ * The process runs `workers` forward passes at once (threads sharing one
+ * copy of the weights), so up to `workers` predicts are in flight per
+ * instance. Replies come back in completion order and are matched by id.
  *
  * Note: instances are spawned at init time and stay alive — startup cost
  * (~80 MB weight load) is paid once, not per request.
@@ -29,17 +31,32 @@ export interface PredictResult {
   logits: Float32Array;
 }
 
+interface Pending {
+  resolve: (r: PredictResult) => void;
+  reject: (e: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
 export class MaiaInstance extends EventEmitter {
   public readonly id: number;
+  public readonly workers: number;
   public isReady = false;
-  public isBusy = false;
+  /** Predicts handed out by the pool and not yet released. */
+  public inFlight = 0;
 
   private process: ChildProcess | null = null;
   private buffer = '';
+  private nextRequestId = 0;
+  private pending = new Map<string, Pending>();
 
-  constructor(id = 0) {
+  constructor(id = 0, workers = 1) {
     super();
     this.id = id;
+    this.workers = Math.max(1, workers);
+  }
+
+  get isBusy(): boolean {
+    return this.inFlight >= this.workers;
   }
 
   private getEnginePath(): string {
@@ -61,14 +78,16 @@ export class MaiaInstance extends EventEmitter {
       const enginePath = this.getEnginePath();
       console.log(`[Maia ${this.id}] Starting: ${enginePath}`);
 
-      this.process = spawn(enginePath, [], { stdio: ['pipe', 'pipe', 'pipe'] });
+      this.process = spawn(enginePath, ['--workers', String(this.workers)], {
+        stdio: ['pipe', 'pipe', 'pipe'],
+      });
 
       this.process.stdout?.on('data', (data: Buffer) => this.handleStdout(data.toString()));
       this.process.stderr?.on('data', (data: Buffer) => {
         const txt = data.toString().trim();
         if (txt === 'READY') {
           this.isReady = true;
-          console.log(`[Maia ${this.id}] READY`);
+          console.log(`[Maia ${this.id}] READY (${this.workers} workers)`);
           resolve();
         } else {
           console.error(`[Maia ${this.id} stderr]`, txt);
@@ -81,7 +100,7 @@ export class MaiaInstance extends EventEmitter {
       this.process.on('close', (code) => {
         console.log(`[Maia ${this.id}] exited with code ${code}`);
         this.isReady = false;
-        this.isBusy = false;
+        this.failPending(new Error(`[Maia ${this.id}] exited with code ${code}`));
       });
 
       setTimeout(() => {
@@ -96,52 +115,68 @@ export class MaiaInstance extends EventEmitter {
     while ((nl = this.buffer.indexOf('\n')) !== -1) {
       const line = this.buffer.slice(0, nl);
       this.buffer = this.buffer.slice(nl + 1);
-      if (line) this.emit('line', line);
+      if (line) this.handleLine(line);
+    }
+  }
+
+  /** Route one reply ("result#<id> ..." / "err#<id> ...") to its caller. */
+  private handleLine(line: string) {
+    const sp = line.indexOf(' ');
+    const head = sp === -1 ? line : line.slice(0, sp);
+    const hash = head.indexOf('#');
+    const pending = hash === -1 ? undefined : this.pending.get(head.slice(hash + 1));
+    if (!pending) {
+      console.error(`[Maia ${this.id}] unmatched reply: ${line.slice(0, 60)}`);
+      return;
+    }
+    this.pending.delete(head.slice(hash + 1));
+    clearTimeout(pending.timer);
+
+    const verb = head.slice(0, hash);
+    if (verb === 'err') {
+      pending.reject(new Error(`[Maia ${this.id}] ${line.slice(sp + 1)}`));
+      return;
+    }
+    if (verb !== 'result') {
+      pending.reject(new Error(`[Maia ${this.id}] unexpected reply: ${line.slice(0, 60)}`));
+      return;
     }
+    // Format: "result#<id> <value> <logit0> <logit1> ..."
+    const parts = line.split(' ');
+    if (parts.length < 2) {
+      pending.reject(new Error(`[Maia ${this.id}] truncated reply`));
+      return;
+    }
+    const value = parseFloat(parts[1]);
+    const logits = new Float32Array(parts.length - 2);
+    for (let i = 0; i < logits.length; i++) {
+      logits[i] = parseFloat(parts[i + 2]);
+    }
+    pending.resolve({ value, logits });
+  }
+
+  private failPending(err: Error) {
+    for (const p of this.pending.values()) {
+      clearTimeout(p.timer);
+      p.reject(err);
+    }
+    this.pending.clear();
   }
 
   /** One predict call. Spawns no subprocess — sends to existing one. */
   async predict(fen: string, eloSelfBucket: number, eloOppoBucket: number): Promise<PredictResult> {
     if (!this.isReady) throw new Error(`[Maia ${this.id}] not ready`);
     if (!this.process?.stdin) throw new Error(`[Maia ${this.id}] no stdin`);
-    this.isBusy = true;
 
+    const requestId = String(this.nextRequestId++);
     return new Promise<PredictResult>((resolve, reject) => {
       const timer = setTimeout(() => {
-        this.removeListener('line', onLine);
-        this.isBusy = false;
+        this.pending.delete(requestId);
         reject(new Error(`[Maia ${this.id}] predict timeout`));
       }, PREDICT_TIMEOUT_MS);
 
-      const onLine = (line: string) => {
-        clearTimeout(timer);
-        this.removeListener('line', onLine);
-        this.isBusy = false;
-
-        if (line.startsWith('err ')) {
-          reject(new Error(`[Maia ${this.id}] ${line.slice(4)}`));
-          return;
-        }
-        if (!line.startsWith('result ')) {
-          reject(new Error(`[Maia ${this.id}] unexpected reply: ${line.slice(0, 60)}`));
-          return;
-        }
-        // Format: "result <value> <logit0> <logit1> ..."
-        const parts = line.split(' ');
-        if (parts.length < 2) {
-          reject(new Error(`[Maia ${this.id}] truncated reply`));
-          return;
-        }
-        const value = parseFloat(parts[1]);
-        const logits = new Float32Array(parts.length - 2);
-        for (let i = 0; i < logits.length; i++) {
-          logits[i] = parseFloat(parts[i + 2]);
-        }
-        resolve({ value, logits });
-      };
-
-      this.on('line', onLine);
-      this.process!.stdin!.write(`predict|${fen}|${eloSelfBucket}|${eloOppoBucket}\n`);
+      this.pending.set(requestId, { resolve, reject, timer });
+      this.process!.stdin!.write(`predict#${requestId}|${fen}|${eloSelfBucket}|${eloOppoBucket}\n`);
     });
   }
 
@@ -152,6 +187,6 @@ export class MaiaInstance extends EventEmitter {
       this.process = null;
     }
     this.isReady = false;
-    this.isBusy = false;
+    this.failPending(new Error(`[Maia ${this.id}] stopped`));
   }
 }
@@ -1,6 +1,10 @@
 /**
  * MaiaPool — pool of N MaiaInstance child processes. Same acquire/release
  * pattern as EnginePool / StockfishPool, just for the maia-native binary.
+ *
+ * Each instance runs `workersPerInstance` predicts concurrently, so one
+ * acquire() hands out a slot on an instance rather than the whole process;
+ * the least-loaded instance is picked.
  */
 
 import { MaiaInstance } from './MaiaInstance.js';
@@ -9,13 +13,20 @@ export class MaiaPool {
   private instances: MaiaInstance[] = [];
   private waiters: Array<(eng: MaiaInstance) => void> = [];
 
-  constructor(private maxInstances = 1) {}
+  constructor(private maxInstances = 1, private workersPerInstance = 1) {}
+
+  /** Predicts the pool can run at once. */
+  get capacity(): number {
+    return this.maxInstances * this.workersPerInstance;
+  }
 
   async init(): Promise<void> {
-    console.log(`[MaiaPool] Initializing ${this.maxInstances} Maia instances...`);
+    console.log(
+      `[MaiaPool] Initializing ${this.maxInstances} Maia instances × ${this.workersPerInstance} workers...`,
+    );
     await Promise.all(
       Array.from({ length: this.maxInstances }, async (_, i) => {
-        const inst = new MaiaInstance(i);
+        const inst = new MaiaInstance(i, this.workersPerInstance);
         await inst.start();
         this.instances.push(inst);
       }),
@@ -24,19 +35,22 @@ export class MaiaPool {
   }
 
   acquire(): Promise<MaiaInstance> {
-    const free = this.instances.find((i) => i.isReady && !i.isBusy);
+    let free: MaiaInstance | undefined;
+    for (const inst of this.instances) {
+      if (inst.isReady && !inst.isBusy && (!free || inst.inFlight < free.inFlight)) free = inst;
+    }
     if (free) {
-      free.isBusy = true;
+      free.inFlight++;
       return Promise.resolve(free);
     }
     return new Promise<MaiaInstance>((resolve) => this.waiters.push(resolve));
   }
 
   release(inst: MaiaInstance): void {
-    inst.isBusy = false;
+    inst.inFlight = Math.max(0, inst.inFlight - 1);
     const next = this.waiters.shift();
     if (next) {
-      inst.isBusy = true;
+      inst.inFlight++;
       next(inst);
     }
   }
@@ -50,8 +64,8 @@ export class MaiaPool {
   }
 
   getStats() {
-    const total = this.instances.length;
-    const busy = this.instances.filter((i) => i.isBusy).length;
+    const total = this.instances.reduce((n, i) => n + i.workers, 0);
+    const busy = this.instances.reduce((n, i) => n + i.inFlight, 0);
     return { total, available: total - busy, busy, waiting: this.waiters.length };
   }
 }
@@ -143,6 +143,7 @@ injectWebSocket(server);
 const MAX_KOMODO = Number(process.env.MAX_KOMODO_INSTANCES) || 2;
 const MAX_STOCKFISH = Number(process.env.MAX_STOCKFISH_INSTANCES) || 1;
 const MAX_MAIA = Number(process.env.MAX_MAIA_INSTANCES) || 1;
+const MAIA_WORKERS = Number(process.env.MAIA_WORKERS) || 1;
 const MAX_MAIA3 = Number(process.env.MAX_MAIA3_INSTANCES) || 2;
 
 initSuggestionWorker(MAX_KOMODO)
@@ -151,7 +152,7 @@ initSuggestionWorker(MAX_KOMODO)
 initAnalysisWorker(MAX_STOCKFISH)
   .catch((err) => console.error('[Engines] Analysis worker failed to init:', err));
 
-initMaiaWorker(MAX_MAIA)
+initMaiaWorker(MAX_MAIA, MAIA_WORKERS)
   .catch((err) => console.error('[Engines] Maia worker failed to init:', err));
 
 initMaia3Worker(MAX_MAIA3)
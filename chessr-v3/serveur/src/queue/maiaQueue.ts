@@ -172,10 +172,11 @@ async function processMaiaJob(job: Job<MaiaJobData, MaiaJobResult>): Promise<Mai
 
 // ─── Lifecycle ─────────────────────────────────────────────────────────
 
-export async function initMaiaWorker(maxInstances: number): Promise<void> {
+export async function initMaiaWorker(maxInstances: number, workersPerInstance = 1): Promise<void> {
   if (worker) return;
-  pool = new MaiaPool(maxInstances);
+  pool = new MaiaPool(maxInstances, workersPerInstance);
   await pool.init();
+  const concurrency = pool.capacity;
 
   queueEvents = new QueueEvents(QUEUE_NAME, { connection: redis });
   await queueEvents.waitUntilReady();
@@ -185,14 +186,14 @@ export async function initMaiaWorker(maxInstances: number): Promise<void> {
     (job) => processMaiaJob(job),
     {
       connection: redis,
-      concurrency: maxInstances,
+      concurrency,
       lockDuration: LOCK_DURATION_MS,
     },
   );
   worker.on('failed', (job, err) => {
     console.error(`[MaiaQueue] job ${job?.id} failed:`, err.message);
   });
-  console.log(`[MaiaQueue] worker ready (concurrency=${maxInstances})`);
+  console.log(`[MaiaQueue] worker ready (concurrency=${concurrency})`);
 }
 
 export async function enqueueMaia(data: MaiaJobData): Promise<MaiaJobResult> {
@@ -8,6 +8,9 @@
 # Run:
 #   ./native/build.sh
 #
+# Concurrency is in-process: `maia-native --workers N` (or MAIA_WORKERS=N)
+# runs N forward passes at once on threads sharing the embedded weights.
+#
 # To install into the serveur engines dir for use by the chessr-v3 stack:
 #   cp native/maia-native ../../chessr-v3/serveur/engines/linux/
 #
@@ -21,6 +24,8 @@ set -euo pipefail
 cd "$(dirname "$0")/.."
 
 OUT="${OUT:-native/maia-native}"
+# -DMAIA_* dims of a non-default model (printed by extract_weights.py).
+MODEL_DEFINES="${MODEL_DEFINES:-}"
 
 if [[ ! -f native/weights.bin ]]; then
   echo "ERR: native/weights.bin missing. Generate it first:"
@@ -48,7 +53,7 @@ docker run --rm \
     cd native
     ld -r -b binary -o /tmp/weights.o weights.bin
     cd ..
-    g++ -O3 -std=c++20 -DNDEBUG -pipe \
+    g++ -O3 -std=c++20 -DNDEBUG -pipe -pthread '"$MODEL_DEFINES"' \
       -I src \
       native/main.cpp \
       src/ops.cpp \
@@ -0,0 +1,52 @@
+#!/usr/bin/env bash
+# Build the Maia runtime as a shared library for in-process use (ctypes).
+#
+# Unlike build.sh (a standalone Linux binary with the weights baked in), this
+# builds for the host platform and leaves the weights out — the library maps
+# a separate weights.bin at runtime. Output:
+#   native/libmaia.so     (Linux)
+#   native/libmaia.dylib  (macOS)
+#
+# Run:
+#   ./native/build_shared.sh
+#
+# To use it from the maia-wrapper desktop app, copy the library and
+# weights.bin next to model.onnx and select the "native" provider:
+#   cp native/libmaia.* native/weights.bin ../../chessr-next/maia-wrapper/
+#
+# weights.bin comes from extract_weights.py with a `.bin` output:
+#   .venv/bin/python ../maia-runtime/scripts/extract_weights.py \
+#       --checkpoint models/blitz_model.pt --out ../maia-runtime/native/weights.bin
+# Add `--layout panel8` for the pre-packed GEMM layout (several times faster
+# on the conv / linear layers; the library detects it from the blob header).
+#
+# A distilled student (python/distill.py) needs the model dims it was
+# trained with; extract_weights.py prints them, pass them through:
+#   MODEL_DEFINES="-DMAIA_DIM_CNN=64 …" OUT=native/libmaia-student.so ./native/build_shared.sh
+#
+# The SIMD paths are gated on __wasm_simd128__, so this is the scalar
+# build; -march=native lets the compiler auto-vectorize for the host CPU.
+
+set -euo pipefail
+cd "$(dirname "$0")/.."
+
+case "$(uname -s)" in
+  Darwin) OUT="${OUT:-native/libmaia.dylib}" ;;
+  *)      OUT="${OUT:-native/libmaia.so}" ;;
+esac
+CXX="${CXX:-c++}"
+MARCH="${MARCH:--march=native}"
+MODEL_DEFINES="${MODEL_DEFINES:-}"
+
+echo "Building Maia shared runtime → $OUT"
+
+"$CXX" -O3 -std=c++20 -DNDEBUG -pipe $MARCH $MODEL_DEFINES \
+  -fPIC -shared -fvisibility=hidden -pthread \
+  -I src \
+  native/maia_capi.cpp \
+  src/ops.cpp \
+  src/model.cpp \
+  src/encoding.cpp \
+  -o "$OUT"
+
+ls -lh "$OUT"
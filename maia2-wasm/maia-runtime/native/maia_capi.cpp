@@ -0,0 +1,126 @@
+// C ABI over the Maia 2 forward pass, for loading the runtime in-process as
+// a shared library (used by the maia-wrapper desktop app through ctypes —
+// see chessr-next/maia-wrapper/src/backends.py).
+//
+// Unlike native/main.cpp, boards arrive already encoded: the caller does the
+// FEN → [18, 8, 8] encoding (mirrored to white's POV when black is to move)
+// and the legal-move masking / decoding itself. Weights are not embedded —
+// the caller passes a pointer to the raw weights.bin blob (typically
+// memory-mapped) that must stay valid until maia_destroy().
+//
+// Exported API ──────────────────────────────────────────────────────────
+//   maia_create(weights, nbytes)   → handle, or NULL on size mismatch
+//   maia_destroy(handle)
+//   maia_forward_batch(handle, boards, elos_self, elos_oppo, n,
+//                      logits_out, values_out)  → 1 on success, 0 on error
+//     boards:     [n, 18, 8, 8] fp32
+//     elos_*:     [n] int64 bucket indices (0..10)
+//     logits_out: [n, 1880] fp32
+//     values_out: [n] fp32, in [-1, 1] (caller does v/2 + 0.5)
+//   maia_num_moves()               → 1880
+//   maia_context_bytes()           → activation memory per concurrent call
+//
+// Thread-safe: a handle keeps a free list of activation contexts, and each
+// maia_forward_batch call borrows one for its duration, so concurrent calls
+// on one handle share the weights and run in parallel. The list grows to
+// the peak number of concurrent callers.
+
+#include "../src/model.h"
+
+#include <cstddef>
+#include <cstdint>
+#include <mutex>
+#include <new>
+#include <vector>
+
+#if defined(_WIN32)
+#define MAIA_API extern "C" __declspec(dllexport)
+#else
+#define MAIA_API extern "C" __attribute__((visibility("default")))
+#endif
+
+namespace {
+
+constexpr size_t BOARD_FLOATS = maia::INPUT_CHANNELS * 64;
+
+struct Handle {
+  maia::ModelWeights weights{};
+  std::mutex mutex;
+  std::vector<maia::Context*> idle;
+
+  ~Handle() {
+    for (auto* ctx : idle) maia::destroy_context(ctx);
+  }
+
+  maia::Context* acquire() {
+    {
+      std::lock_guard<std::mutex> lock(mutex);
+      if (!idle.empty()) {
+        auto* ctx = idle.back();
+        idle.pop_back();
+        return ctx;
+      }
+    }
+    return maia::create_context();
+  }
+
+  void release(maia::Context* ctx) {
+    std::lock_guard<std::mutex> lock(mutex);
+    idle.push_back(ctx);
+  }
+};
+
+} // namespace
+
+MAIA_API void* maia_create(const void* weights, size_t nbytes) {
+  if (weights == nullptr || nbytes % sizeof(float) != 0) return nullptr;
+  auto* h = new (std::nothrow) Handle();
+  if (h == nullptr) return nullptr;
+  const size_t blob_floats = nbytes / sizeof(float);
+  const size_t consumed = maia::load_weights(
+      static_cast<const float*>(weights), blob_floats, h->weights);
+  // A shorter or longer blob means a weights.bin from another model layout.
+  if (consumed == 0 || consumed != blob_floats) {
+    delete h;
+    return nullptr;
+  }
+  return h;
+}
+
+MAIA_API void maia_destroy(void* handle) {
+  delete static_cast<Handle*>(handle);
+}
+
+MAIA_API int maia_forward_batch(void* handle,
+                                const float* boards,
+                                const int64_t* elos_self,
+                                const int64_t* elos_oppo,
+                                size_t n,
+                                float* logits_out,
+                                float* values_out) {
+  auto* h = static_cast<Handle*>(handle);
+  if (h == nullptr) return 0;
+  maia::Context* ctx = h->acquire();
+  if (ctx == nullptr) return 0;
+  int ok = 1;
+  for (size_t i = 0; i < n; ++i) {
+    if (elos_self[i] < 0 || elos_self[i] >= (int64_t)maia::NUM_ELO_BUCKETS ||
+        elos_oppo[i] < 0 || elos_oppo[i] >= (int64_t)maia::NUM_ELO_BUCKETS ||
+        !maia::forward(h->weights, *ctx, boards + i * BOARD_FLOATS,
+                       elos_self[i], elos_oppo[i],
+                       logits_out + i * maia::NUM_MOVES, values_out + i)) {
+      ok = 0;
+      break;
+    }
+  }
+  h->release(ctx);
+  return ok;
+}
+
+MAIA_API int maia_num_moves() {
+  return (int)maia::NUM_MOVES;
+}
+
+MAIA_API size_t maia_context_bytes() {
+  return maia::context_bytes();
+}
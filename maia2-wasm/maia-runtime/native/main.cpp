@@ -6,18 +6,32 @@
 // Designed to be spawned as a child_process by the Node serveur and driven
 // over stdin/stdout. Long-running, no startup cost per request.
 //
+// One process serves several requests at once: `--workers N` (or
+// MAIA_WORKERS) threads each own an activation context and share the single
+// read-only weights image, so N-way concurrency costs N × ~700 KB instead
+// of N × 80 MB processes.
+//
 // Protocol (line-based UTF-8) ───────────────────────────────────────────
 //   stderr (banner once at boot)
 //     READY                          ← weights loaded, ready for input
 //
 //   stdin commands (one per line, '|'-separated)
+//     predict#<id>|<fen>|<eloSelfBucket>|<eloOppoBucket>
 //     predict|<fen>|<eloSelfBucket>|<eloOppoBucket>
 //     quit
 //
 //   stdout responses (one line per request)
+//     result#<id> <value> <logit0> <logit1> ... <logit1879>
+//     err#<id> <reason>
 //     result <value> <logit0> <logit1> ... <logit1879>
 //     err <reason>                  ← bad request / encode fail / mirror fail
 //
+//   Tagged requests (`#<id>`, any token without ' ' or '|') are queued to
+//   the workers and answered as they finish — possibly out of order, so the
+//   caller matches replies by id and may pipeline up to N of them. Untagged
+//   requests keep the original one-at-a-time behaviour: they run on the
+//   reader thread and are answered before the next line is read.
+//
 //   ELO buckets are 0..10 (see eloBucketIndex in the extension client).
 //
 // Keep stdout uncluttered — each line is a complete response, no extra
@@ -26,11 +40,18 @@
 #include "../src/model.h"
 #include "../src/encoding.h"
 
+#include <condition_variable>
 #include <cstdint>
 #include <cstdio>
+#include <cstdlib>
 #include <cstring>
+#include <deque>
 #include <iostream>
+#include <memory>
+#include <mutex>
 #include <string>
+#include <thread>
+#include <vector>
 
 // Weights are linked in via `ld -r -b binary -o weights.o weights.bin`,
 // which auto-generates these three symbols (start, end, size). Bypasses
@@ -46,74 +67,226 @@ const size_t g_maia_weights_size = static_cast<size_t>(
 
 namespace {
 
+constexpr int MAX_WORKERS = 64;
+
 maia::ModelWeights g_weights{};
-bool   g_loaded   = false;
-float  g_board_buf[18 * 64];
-float  g_logits_buf[maia::NUM_MOVES];
-float  g_value_buf = 0.f;
+std::mutex g_out_mutex;
+
+struct Request {
+  std::string id;        // empty for untagged requests
+  std::string fen;
+  int64_t elo_self = 0;
+  int64_t elo_oppo = 0;
+};
+
+// Buffers of one in-flight request. Every worker (and the reader thread, for
+// untagged requests) owns one, so nothing is shared but the weights.
+struct Slot {
+  maia::Context* ctx = nullptr;
+  float board[18 * 64];
+  float logits[maia::NUM_MOVES];
+  float value = 0.f;
+  std::string line;
+};
 
-bool ensure_loaded() {
-  if (g_loaded) return true;
+bool load() {
   const float* blob = reinterpret_cast<const float*>(g_maia_weights);
   const size_t blob_floats = g_maia_weights_size / sizeof(float);
-  const size_t consumed = maia::load_weights(blob, blob_floats, g_weights);
-  if (consumed == 0) return false;
-  g_loaded = true;
-  return true;
+  return maia::load_weights(blob, blob_floats, g_weights) != 0;
+}
+
+// Responses are assembled off-lock and written whole, so lines from
+// different workers never interleave.
+void emit(const std::string& line) {
+  std::lock_guard<std::mutex> lock(g_out_mutex);
+  std::fwrite(line.data(), 1, line.size(), stdout);
+  std::fflush(stdout);
 }
 
-void emit_error(const std::string& reason) {
-  std::cout << "err " << reason << "\n";
-  std::cout.flush();
+std::string tag(const char* verb, const std::string& id) {
+  return id.empty() ? std::string(verb) : std::string(verb) + "#" + id;
 }
 
-bool run_predict(const std::string& fen, int64_t elo_self, int64_t elo_oppo) {
+void emit_error(const std::string& id, const std::string& reason) {
+  emit(tag("err", id) + " " + reason + "\n");
+}
+
+bool run_predict(const Request& req, Slot& slot) {
   // Maia is white-POV only — mirror FEN if black-to-move (caller mirrors
   // output moves back).
+  const std::string& fen = req.fen;
   const char* effective_fen = fen.c_str();
   char mirrored[128];
   const auto sp = fen.find(' ');
   if (sp != std::string::npos && sp + 1 < fen.size() && fen[sp + 1] == 'b') {
     if (!mirror_fen(fen.c_str(), mirrored, sizeof(mirrored))) {
-      emit_error("mirror_fail");
+      emit_error(req.id, "mirror_fail");
       return false;
     }
     effective_fen = mirrored;
   }
 
-  if (!board_to_tensor(effective_fen, g_board_buf)) {
-    emit_error("encode_fail");
+  if (!board_to_tensor(effective_fen, slot.board)) {
+    emit_error(req.id, "encode_fail");
+    return false;
+  }
+  if (!maia::forward(g_weights, *slot.ctx, slot.board, req.elo_self,
+                     req.elo_oppo, slot.logits, &slot.value)) {
+    emit_error(req.id, "forward_fail");
     return false;
   }
-  if (!maia::forward(g_weights, g_board_buf, elo_self, elo_oppo,
-                     g_logits_buf, &g_value_buf)) {
-    emit_error("forward_fail");
+  return true;
+}
+
+void emit_result(const Request& req, Slot& slot) {
+  // Single-line: "result[#id] <value> <logits>". %g matches the default
+  // iostream float formatting the protocol has always used.
+  char num[32];
+  std::string& out = slot.line;
+  out = tag("result", req.id);
+  std::snprintf(num, sizeof(num), " %g", slot.value);
+  out += num;
+  for (size_t i = 0; i < maia::NUM_MOVES; ++i) {
+    std::snprintf(num, sizeof(num), " %g", slot.logits[i]);
+    out += num;
+  }
+  out += '\n';
+  emit(out);
+}
+
+void serve(const Request& req, Slot& slot) {
+  if (run_predict(req, slot)) emit_result(req, slot);
+}
+
+// ─── Worker pool ─────────────────────────────────────────────────────────
+
+class Pool {
+ public:
+  explicit Pool(int workers) {
+    for (int i = 0; i < workers; ++i) {
+      auto slot = std::make_unique<Slot>();
+      slot->ctx = maia::create_context();
+      if (slot->ctx == nullptr) break;
+      threads_.emplace_back(&Pool::run, this, slot.get());
+      slots_.push_back(std::move(slot));
+    }
+  }
+
+  ~Pool() {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      closing_ = true;
+    }
+    ready_.notify_all();
+    for (auto& t : threads_) t.join();
+    for (auto& slot : slots_) maia::destroy_context(slot->ctx);
+  }
+
+  size_t size() const { return threads_.size(); }
+
+  void submit(Request req) {
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      queue_.push_back(std::move(req));
+    }
+    ready_.notify_one();
+  }
+
+ private:
+  void run(Slot* slot) {
+    for (;;) {
+      Request req;
+      {
+        std::unique_lock<std::mutex> lock(mutex_);
+        ready_.wait(lock, [this] { return closing_ || !queue_.empty(); });
+        // Drain what was accepted before quit.
+        if (queue_.empty()) return;
+        req = std::move(queue_.front());
+        queue_.pop_front();
+      }
+      serve(req, *slot);
+    }
+  }
+
+  std::mutex mutex_;
+  std::condition_variable ready_;
+  std::deque<Request> queue_;
+  bool closing_ = false;
+  std::vector<std::unique_ptr<Slot>> slots_;
+  std::vector<std::thread> threads_;
+};
+
+// ─── Request parsing ─────────────────────────────────────────────────────
+
+// predict[#id]|<fen>|<eloSelf>|<eloOppo>. Returns false (after replying)
+// on a malformed line.
+bool parse_request(const std::string& line, Request& req) {
+  const auto p1 = line.find('|');
+  std::string cmd = line.substr(0, p1);
+  const auto hash = cmd.find('#');
+  if (hash != std::string::npos) {
+    req.id = cmd.substr(hash + 1);
+    cmd.resize(hash);
+    if (req.id.empty() || req.id.find(' ') != std::string::npos) {
+      req.id.clear();
+      emit_error("", "bad_id");
+      return false;
+    }
+  }
+  if (p1 == std::string::npos) { emit_error(req.id, "bad_request"); return false; }
+  if (cmd != "predict") { emit_error(req.id, "unknown_cmd"); return false; }
+
+  const auto p2 = line.find('|', p1 + 1);
+  if (p2 == std::string::npos) { emit_error(req.id, "bad_request"); return false; }
+  req.fen = line.substr(p1 + 1, p2 - p1 - 1);
+
+  const auto p3 = line.find('|', p2 + 1);
+  if (p3 == std::string::npos) { emit_error(req.id, "bad_request"); return false; }
+
+  try {
+    req.elo_self = std::stoll(line.substr(p2 + 1, p3 - p2 - 1));
+    req.elo_oppo = std::stoll(line.substr(p3 + 1));
+  } catch (...) {
+    emit_error(req.id, "bad_elo");
     return false;
   }
   return true;
 }
 
-void emit_result() {
-  // Single-line: "result <value> <logits>".
-  std::cout << "result " << g_value_buf;
-  for (int i = 0; i < maia::NUM_MOVES; ++i) {
-    std::cout << ' ' << g_logits_buf[i];
+int parse_workers(int argc, char** argv) {
+  const char* value = std::getenv("MAIA_WORKERS");
+  for (int i = 1; i < argc; ++i) {
+    if (std::strcmp(argv[i], "--workers") == 0 && i + 1 < argc) {
+      value = argv[++i];
+    } else if (std::strncmp(argv[i], "--workers=", 10) == 0) {
+      value = argv[i] + 10;
+    }
   }
-  std::cout << '\n';
-  std::cout.flush();
+  const int n = value ? std::atoi(value) : 1;
+  if (n < 1) return 1;
+  return n > MAX_WORKERS ? MAX_WORKERS : n;
 }
 
 } // namespace
 
-int main() {
-  // Larger I/O buffers — 1880 floats per response is ~10 KB of text.
+int main(int argc, char** argv) {
   std::ios::sync_with_stdio(false);
   std::cin.tie(nullptr);
+  // Larger output buffer — 1880 floats per response is ~10 KB of text.
+  static char out_buf[1 << 16];
+  std::setvbuf(stdout, out_buf, _IOFBF, sizeof(out_buf));
 
-  if (!ensure_loaded()) {
+  if (!load()) {
     std::cerr << "ERR weights_load_fail\n";
     return 1;
   }
+  Slot inline_slot;
+  inline_slot.ctx = maia::create_context();
+  Pool pool(parse_workers(argc, argv));
+  if (inline_slot.ctx == nullptr || pool.size() == 0) {
+    std::cerr << "ERR context_alloc_fail\n";
+    return 1;
+  }
   std::cerr << "READY\n";
   std::cerr.flush();
 
@@ -122,31 +295,15 @@ int main() {
     if (line.empty()) continue;
     if (line == "quit" || line == "exit") break;
 
-    // Parse: predict|<fen>|<eloSelf>|<eloOppo>
-    const auto p1 = line.find('|');
-    if (p1 == std::string::npos) { emit_error("bad_request"); continue; }
-    const std::string cmd = line.substr(0, p1);
-    if (cmd != "predict") { emit_error("unknown_cmd"); continue; }
-
-    const auto p2 = line.find('|', p1 + 1);
-    if (p2 == std::string::npos) { emit_error("bad_request"); continue; }
-    const std::string fen = line.substr(p1 + 1, p2 - p1 - 1);
-
-    const auto p3 = line.find('|', p2 + 1);
-    if (p3 == std::string::npos) { emit_error("bad_request"); continue; }
-
-    int64_t elo_self = 0, elo_oppo = 0;
-    try {
-      elo_self = std::stoll(line.substr(p2 + 1, p3 - p2 - 1));
-      elo_oppo = std::stoll(line.substr(p3 + 1));
-    } catch (...) {
-      emit_error("bad_elo");
-      continue;
-    }
-
-    if (run_predict(fen, elo_self, elo_oppo)) {
-      emit_result();
+    Request req;
+    if (!parse_request(line, req)) continue;
+    if (req.id.empty()) {
+      serve(req, inline_slot);
+    } else {
+      pool.submit(std::move(req));
     }
   }
+  maia::destroy_context(inline_slot.ctx);
+  // ~Pool drains the queue before the process exits.
   return 0;
 }
@@ -2,35 +2,135 @@
 """
 Extract Maia 2 weights from the official PyTorch checkpoint into a flat
 fp32 binary in the EXACT order our C++ runtime (`maia-runtime/src/model.cpp::load_weights`)
-expects, then emit a C array source file for embedding in the WASM build.
+expects, then emit a C array source file for embedding in the WASM build — or,
+when `--out` ends in `.bin`, the raw blob itself (native/build.sh embeds it
+with `ld -b binary`; native/build_shared.sh's library maps it at runtime).
 
 The order MUST match `load_weights()` byte-for-byte. If you change one,
 update the other.
 
+`--layout panel8` additionally pre-packs the GEMM weights (every conv, the
+attention/FFN matrices and the policy head) into the k-major 8-column panels
+the runtime's packed micro-kernels stream (see PACK_NR / packed_size in
+src/ops.h); conv weights become [Cin*9, Cout] im2col matrices first. Such a
+blob starts with a 64-byte header naming its layout. Either way a manifest
+(`<out>.json`: layout, tile sizes, per-tensor offsets and shapes, sha256) is
+written next to the output. `--from-bin` repacks an existing plain blob
+without needing torch or the checkpoint.
+
+A checkpoint of another size (a python/distill.py student) extracts the same
+way; its dims go into the header and the `-DMAIA_*` flags the runtime must be
+built with are printed and kept in the manifest.
+
 Usage:
     cd maia2-wasm/python
     .venv/bin/python ../maia-runtime/scripts/extract_weights.py \
         --checkpoint models/blitz_model.pt \
         --out ../maia-runtime/wasm/weights_data.cpp
+    .venv/bin/python ../maia-runtime/scripts/extract_weights.py \
+        --checkpoint models/blitz_model.pt \
+        --out ../maia-runtime/native/weights.bin
+    python3 scripts/extract_weights.py --from-bin native/weights.bin \
+        --layout panel8 --out native/weights.packed.bin
 """
 
 import argparse
+import hashlib
+import json
 import struct
 import sys
 from pathlib import Path
 
-import torch
 import numpy as np
 
 ROOT = Path(__file__).parent.resolve()
 sys.path.insert(0, str(ROOT.parent.parent / "python" / "maia2_src"))
 
+# Must match src/model.h (WeightsHeader) and src/ops.h (PACK_*).
+MAGIC = b"MAIAWGT1"
+HEADER_BYTES = 64
+LAYOUTS = {"plain": 0, "panel8": 1}
+PACK_NR = 8
+PACK_MR = 8
+PACK_KC = 256
+
+# Tensors the runtime runs through its GEMM kernels. Packed under any layout
+# other than "plain"; everything else (norms, biases, embeddings, the small
+# Elo-query and value-head matrices) stays as extracted.
+GEMM_SUFFIXES = (
+    ".conv1.weight", ".conv2.weight", "conv_last.weight",
+    ".to_qkv.weight", ".to_out.0.weight", ".net.1.weight", ".net.4.weight",
+)
+GEMM_NAMES = {"fc_1.weight"}
+
+
+# Model dims carried in the header (0 there = the Maia 2 default), with the
+# src/model.h macro each one overrides.
+CONFIG_DEFINES = {
+    "dim_cnn": "MAIA_DIM_CNN",
+    "dim_vit": "MAIA_DIM_VIT",
+    "num_blocks_cnn": "MAIA_NUM_BLOCKS_CNN",
+    "num_blocks_vit": "MAIA_NUM_BLOCKS_VIT",
+    "elo_dim": "MAIA_ELO_DIM",
+}
+
+
+# Low-rank factors of a GEMM weight (python/lowrank.py): `<name>.u` [in, rank]
+# then `<name>.v` [rank, out], in the dense weight's slot.
+FACTOR_SUFFIXES = (".u", ".v")
+
+
+def is_gemm_weight(name: str) -> bool:
+    if name.endswith(FACTOR_SUFFIXES):
+        name = name[:-2]
+    return name in GEMM_NAMES or name.endswith(GEMM_SUFFIXES)
+
+
+def pack_panels(mat: np.ndarray, nr: int = PACK_NR) -> np.ndarray:
+    """[K, N] → ceil(N / nr) contiguous [K, nr] panels (last one zero-padded)."""
+    k, n = mat.shape
+    panels = -(-n // nr)
+    padded = np.zeros((k, panels * nr), dtype=np.float32)
+    padded[:, :n] = mat
+    return np.ascontiguousarray(padded.reshape(k, panels, nr).transpose(1, 0, 2))
+
+
+def gemm_matrix(name: str, arr: np.ndarray) -> np.ndarray:
+    """The [K, N] matrix a GEMM weight multiplies by: conv [Cout, Cin, 3, 3]
+    becomes [Cin*9, Cout] (row = cin*9 + ky*3 + kx); linears are already
+    [in, out]."""
+    if arr.ndim == 4:
+        return arr.reshape(arr.shape[0], -1).T
+    return arr
+
+
+class BlobSource:
+    """Tensors of an existing plain blob, read back in load_weights() order."""
+
+    def __init__(self, blob: bytes):
+        if blob[:len(MAGIC)] == MAGIC:
+            raise ValueError("--from-bin needs a plain blob (this one is already packed)")
+        self.floats = np.frombuffer(blob, dtype="<f4")
+        self.pos = 0
+
+    def take(self, shape) -> np.ndarray:
+        n = int(np.prod(shape))
+        if self.pos + n > len(self.floats):
+            raise ValueError("blob is shorter than the model layout")
+        arr = self.floats[self.pos:self.pos + n].reshape(shape)
+        self.pos += n
+        return arr
+
 
 def collect_tensors(state_dict, cfg):
     """Return a list of (name, np.ndarray) in the order our C++ load_weights() expects."""
     tensors = []
 
     def add(key, expected_shape=None, transpose_for_linear=False):
+        if isinstance(state_dict, BlobSource):
+            # Already transposed when the blob was extracted.
+            tensors.append((key, state_dict.take(expected_shape)))
+            return
         t = state_dict[key].detach().cpu()
         if transpose_for_linear:
             # PyTorch nn.Linear stores weights as [out, in]. Our linear() expects [in, out].
@@ -121,14 +221,36 @@ def collect_tensors(state_dict, cfg):
     return tensors
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--checkpoint", required=True, help="Path to blitz_model.pt")
-    ap.add_argument("--out", required=True, help="Output .cpp file (C array of weights)")
-    args = ap.parse_args()
+def default_cfg():
+    """Maia 2 shapes (src/model.h), for blobs that carry no config of their own."""
+    class Cfg: pass
+    cfg = Cfg()
+    cfg.input_channels  = 18
+    cfg.dim_cnn         = 256
+    cfg.dim_vit         = 1024
+    cfg.num_blocks_cnn  = 5
+    cfg.vit_length      = 8
+    cfg.elo_dim         = 128
+    cfg.num_blocks_vit  = 2
+    return cfg
+
+
+def config_dims(cfg) -> dict:
+    return {field: int(getattr(cfg, field)) for field in CONFIG_DEFINES}
 
-    print(f"Loading {args.checkpoint}…")
-    ckpt = torch.load(args.checkpoint, map_location="cpu", weights_only=False)
+
+def build_defines(cfg) -> list[str]:
+    """Compiler flags a runtime build needs to run a `cfg`-shaped blob."""
+    default = config_dims(default_cfg())
+    return [f"-D{macro}={getattr(cfg, field)}" for field, macro in CONFIG_DEFINES.items()
+            if int(getattr(cfg, field)) != default[field]]
+
+
+def load_checkpoint(path):
+    import torch
+
+    print(f"Loading {path}…")
+    ckpt = torch.load(path, map_location="cpu", weights_only=False)
     state_dict = ckpt.get("model_state_dict", ckpt)
     # Strip "module." prefix from DataParallel checkpoints.
     if any(k.startswith("module.") for k in state_dict):
@@ -144,25 +266,107 @@ def main():
     cfg.vit_length      = state_dict["chess_cnn.conv_last.weight"].shape[0]
     cfg.elo_dim         = state_dict["elo_embedding.weight"].shape[1]
     cfg.num_blocks_vit  = sum(1 for k in state_dict if k.startswith("transformer.elo_layers.") and k.endswith(".0.norm.weight"))
+    return state_dict, cfg
+
+
+def build_blob(tensors, layout: str, rank_ffn: int = 0, rank_head: int = 0,
+               cfg=None) -> tuple[bytes, dict]:
+    """Serialize `tensors` under `layout`; returns (blob, manifest).
+
+    Non-zero ranks declare that the FFN / policy-head weights in `tensors`
+    are `.u` / `.v` factor pairs (see FACTOR_SUFFIXES). `cfg` is the model
+    config the tensors were collected with (default: Maia 2's)."""
+    cfg = cfg or default_cfg()
+    dims, defines = config_dims(cfg), build_defines(cfg)
+    packed = layout != "plain"
+    with_header = packed or rank_ffn or rank_head or defines
+    parts, entries = [], []
+    offset = 0
+    if with_header:
+        header = MAGIC + struct.pack("<IIIII", 1, LAYOUTS[layout], PACK_NR, rank_ffn, rank_head)
+        header += struct.pack("<IIIII", *dims.values())
+        parts.append(header.ljust(HEADER_BYTES, b"\0"))
+        offset = HEADER_BYTES
+    for name, arr in tensors:
+        entry = {"name": name, "offset": offset, "shape": list(arr.shape), "layout": "plain"}
+        if packed and is_gemm_weight(name):
+            mat = gemm_matrix(name, arr)
+            arr = pack_panels(mat)
+            entry.update(layout=f"panel{PACK_NR}", gemm_shape=list(mat.shape))
+        data = np.ascontiguousarray(arr, dtype="<f4").tobytes()
+        entry["bytes"] = len(data)
+        parts.append(data)
+        entries.append(entry)
+        offset += len(data)
+    blob = b"".join(parts)
+    manifest = {
+        "format": "maia-weights",
+        "version": 1,
+        "layout": layout,
+        "tile": {"nr": PACK_NR, "mr": PACK_MR, "kc": PACK_KC} if packed else None,
+        "ranks": {"ffn": rank_ffn, "head": rank_head},
+        "config": dims,
+        "defines": defines,
+        "header_bytes": HEADER_BYTES if with_header else 0,
+        "bytes": len(blob),
+        "sha256": hashlib.sha256(blob).hexdigest(),
+        "tensors": entries,
+    }
+    return blob, manifest
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--checkpoint", help="Path to blitz_model.pt")
+    src.add_argument("--from-bin", help="Existing plain weights.bin to repack (no torch needed)")
+    ap.add_argument("--out", required=True, help="Output .cpp file (C array of weights) or raw .bin blob")
+    ap.add_argument("--layout", choices=sorted(LAYOUTS), default="plain",
+                    help="plain: row-major [in, out] (default); panel8: GEMM weights pre-packed "
+                         "for the runtime's packed kernels")
+    args = ap.parse_args()
+
+    if args.from_bin:
+        print(f"Reading {args.from_bin}…")
+        source, cfg = BlobSource(Path(args.from_bin).read_bytes()), default_cfg()
+    else:
+        source, cfg = load_checkpoint(args.checkpoint)
 
     print(f"Detected config: dim_cnn={cfg.dim_cnn}, dim_vit={cfg.dim_vit}, "
           f"num_blocks_cnn={cfg.num_blocks_cnn}, num_blocks_vit={cfg.num_blocks_vit}, "
           f"vit_length={cfg.vit_length}, elo_dim={cfg.elo_dim}")
 
-    tensors = collect_tensors(state_dict, cfg)
+    tensors = collect_tensors(source, cfg)
+    if isinstance(source, BlobSource) and source.pos != len(source.floats):
+        raise SystemExit(f"{args.from_bin}: {len(source.floats) - source.pos} trailing floats — not a Maia 2 blob")
     total_floats = sum(t.size for _, t in tensors)
     print(f"Collected {len(tensors)} tensors, {total_floats:,} floats ({total_floats * 4 / 1e6:.1f} MB)")
 
     # Concatenate to a single fp32 byte stream (little-endian).
-    blob = b"".join(arr.astype(np.float32).tobytes() for _, arr in tensors)
-    assert len(blob) == total_floats * 4
+    blob, manifest = build_blob(tensors, args.layout, cfg=cfg)
+    if not manifest["header_bytes"]:
+        assert len(blob) == total_floats * 4
+
+    print(f"Writing {args.out} ({args.layout})…")
+    write_blob(Path(args.out), blob, manifest)
+    if manifest["defines"]:
+        print(f"Non-default model dims: build the runtime with "
+              f"MODEL_DEFINES=\"{' '.join(manifest['defines'])}\"")
+
 
-    print(f"Writing {args.out}…")
-    out_path = Path(args.out)
+def write_blob(out_path: Path, blob: bytes, manifest: dict):
+    """Write `blob` as a raw .bin or a C array source, plus `<out>.json`."""
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_path.with_suffix(".json")
+    manifest_path.write_text(json.dumps(manifest, indent=1) + "\n")
+    if out_path.suffix == ".bin":
+        out_path.write_bytes(blob)
+        print(f"✓ {out_path} ({len(blob) / 1e6:.1f} MB raw), manifest {manifest_path.name}")
+        return
     with open(out_path, "w") as f:
         f.write("// Auto-generated by extract_weights.py — do not edit.\n")
-        f.write("// Total tensors: %d, total bytes: %d\n\n" % (len(tensors), len(blob)))
+        f.write("// Total tensors: %d, total bytes: %d, layout: %s\n\n"
+                % (len(manifest["tensors"]), len(blob), manifest["layout"]))
         f.write('extern "C" {\n')
         f.write(f"alignas(64) extern const unsigned char g_maia_weights[{len(blob)}] = {{\n")
         for i in range(0, len(blob), 16):
@@ -172,7 +376,7 @@ def main():
         f.write(f"extern const unsigned int g_maia_weights_size = {len(blob)};\n")
         f.write("}\n")
 
-    print(f"✓ {out_path} ({out_path.stat().st_size / 1e6:.1f} MB source)")
+    print(f"✓ {out_path} ({out_path.stat().st_size / 1e6:.1f} MB source), manifest {manifest_path.name}")
 
 
 if __name__ == "__main__":
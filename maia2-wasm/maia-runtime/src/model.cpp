@@ -1,8 +1,11 @@
 #include "model.h"
 #include "ops.h"
 
-#include <cstring>
 #include <cmath>
+#include <cstdlib>
+#include <cstring>
+#include <memory>
+#include <new>
 
 namespace maia {
 
@@ -11,6 +14,10 @@ namespace maia {
 // `extract_weights.py` produces a single fp32 blob with tensors written in a
 // fixed order. `load_weights` walks the blob and stores pointers into the
 // ModelWeights struct. Order MUST match the Python script verbatim.
+//
+// Packed layouts change the size of the GEMM weights (panels are padded to
+// a multiple of ops::PACK_NR columns), never the order. A low-rank layer
+// takes its U factor's slot, immediately followed by V.
 
 static inline const float* take(const float*& p, size_t n) {
   const float* r = p; p += n; return r;
@@ -20,8 +27,49 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
   const float* p = blob;
   const float* end = blob + blob_floats;
 
+  w.layout = LAYOUT_PLAIN;
+  w.rank_ffn = w.rank_head = 0;
+  if (blob_floats >= WEIGHTS_HEADER_FLOATS &&
+      std::memcmp(blob, WEIGHTS_MAGIC, sizeof(WEIGHTS_MAGIC)) == 0) {
+    WeightsHeader h;
+    std::memcpy(&h, blob, sizeof(h));
+    if (h.version != 1 || (h.layout != LAYOUT_PLAIN && h.layout != LAYOUT_PANEL8) ||
+        (h.layout == LAYOUT_PANEL8 && h.panel_n != ops::PACK_NR) ||
+        h.rank_ffn > DIM_VIT || h.rank_head > DIM_VIT) {
+      return 0;
+    }
+    // A blob for another model config would be read with the wrong shapes.
+    auto dim_ok = [](uint32_t got, size_t want, size_t maia2) {
+      return (got ? got : maia2) == want;
+    };
+    if (!dim_ok(h.dim_cnn, DIM_CNN, 256) || !dim_ok(h.dim_vit, DIM_VIT, 1024) ||
+        !dim_ok(h.num_blocks_cnn, NUM_BLOCKS_CNN, 5) ||
+        !dim_ok(h.num_blocks_vit, NUM_BLOCKS_VIT, 2) || !dim_ok(h.elo_dim, ELO_DIM, 128)) {
+      return 0;
+    }
+    w.layout = (WeightsLayout)h.layout;
+    w.rank_ffn = h.rank_ffn;
+    w.rank_head = h.rank_head;
+    p += WEIGHTS_HEADER_FLOATS;
+  }
+  const bool packed = w.layout == LAYOUT_PANEL8;
+  // Size of a GEMM weight with K rows (inputs) and N columns (outputs).
+  auto gemm = [packed](size_t K, size_t N) {
+    return packed ? ops::packed_size(K, N) : K * N;
+  };
+  // A [K, N] layer, dense or as U [K, rank] + V [rank, N].
+  auto factored = [&](const float*& u, const float*& v, size_t K, size_t N, size_t rank) {
+    if (rank == 0) {
+      u = take(p, gemm(K, N));
+      v = nullptr;
+    } else {
+      u = take(p, gemm(K, rank));
+      v = take(p, gemm(rank, N));
+    }
+  };
+
   // ChessResNet — input conv
-  w.cnn_conv1_w = take(p, DIM_CNN * INPUT_CHANNELS * 9);
+  w.cnn_conv1_w = take(p, gemm(INPUT_CHANNELS * 9, DIM_CNN));
   w.cnn_bn1_g   = take(p, DIM_CNN);
   w.cnn_bn1_b   = take(p, DIM_CNN);
   w.cnn_bn1_rm  = take(p, DIM_CNN);
@@ -29,12 +77,12 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
 
   // 5 ResNet blocks
   for (size_t i = 0; i < NUM_BLOCKS_CNN; i++) {
-    w.cnn_blocks[i].conv1_w = take(p, DIM_CNN * DIM_CNN * 9);
+    w.cnn_blocks[i].conv1_w = take(p, gemm(DIM_CNN * 9, DIM_CNN));
     w.cnn_blocks[i].bn1_g   = take(p, DIM_CNN);
     w.cnn_blocks[i].bn1_b   = take(p, DIM_CNN);
     w.cnn_blocks[i].bn1_rm  = take(p, DIM_CNN);
     w.cnn_blocks[i].bn1_rv  = take(p, DIM_CNN);
-    w.cnn_blocks[i].conv2_w = take(p, DIM_CNN * DIM_CNN * 9);
+    w.cnn_blocks[i].conv2_w = take(p, gemm(DIM_CNN * 9, DIM_CNN));
     w.cnn_blocks[i].bn2_g   = take(p, DIM_CNN);
     w.cnn_blocks[i].bn2_b   = take(p, DIM_CNN);
     w.cnn_blocks[i].bn2_rm  = take(p, DIM_CNN);
@@ -42,7 +90,7 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
   }
 
   // ChessResNet — output conv (DIM_CNN -> VIT_LENGTH)
-  w.cnn_conv_last_w = take(p, VIT_LENGTH * DIM_CNN * 9);
+  w.cnn_conv_last_w = take(p, gemm(DIM_CNN * 9, VIT_LENGTH));
   w.cnn_bn_last_g   = take(p, VIT_LENGTH);
   w.cnn_bn_last_b   = take(p, VIT_LENGTH);
   w.cnn_bn_last_rm  = take(p, VIT_LENGTH);
@@ -66,16 +114,16 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
     // Attention
     b.attn_norm_g       = take(p, DIM_VIT);
     b.attn_norm_b       = take(p, DIM_VIT);
-    b.attn_qkv_w        = take(p, DIM_VIT * INNER_DIM * 3);
+    b.attn_qkv_w        = take(p, gemm(DIM_VIT, INNER_DIM * 3));
     b.attn_elo_query_w  = take(p, (ELO_DIM * 2) * INNER_DIM);
-    b.attn_to_out_w     = take(p, INNER_DIM * DIM_VIT);
+    b.attn_to_out_w     = take(p, gemm(INNER_DIM, DIM_VIT));
     b.attn_to_out_b     = take(p, DIM_VIT);
     // FFN (LN inside)
     b.ffn_ln_g  = take(p, DIM_VIT);
     b.ffn_ln_b  = take(p, DIM_VIT);
-    b.ffn_fc1_w = take(p, DIM_VIT * DIM_VIT);   // mlp_dim = DIM_VIT
+    factored(b.ffn_fc1_w, b.ffn_fc1_w2, DIM_VIT, DIM_VIT, w.rank_ffn);   // mlp_dim = DIM_VIT
     b.ffn_fc1_b = take(p, DIM_VIT);
-    b.ffn_fc2_w = take(p, DIM_VIT * DIM_VIT);
+    factored(b.ffn_fc2_w, b.ffn_fc2_w2, DIM_VIT, DIM_VIT, w.rank_ffn);
     b.ffn_fc2_b = take(p, DIM_VIT);
   }
 
@@ -86,7 +134,7 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
   // Final LN + heads
   w.last_ln_g = take(p, DIM_VIT);
   w.last_ln_b = take(p, DIM_VIT);
-  w.fc_1_w    = take(p, DIM_VIT * NUM_MOVES);
+  factored(w.fc_1_w, w.fc_1_w2, DIM_VIT, NUM_MOVES, w.rank_head);
   w.fc_1_b    = take(p, NUM_MOVES);
   w.fc_3_1_w  = take(p, DIM_VIT * 128);
   w.fc_3_1_b  = take(p, 128);
@@ -97,15 +145,18 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& w) {
   return (size_t)(p - blob);
 }
 
-// ─── Activation buffers (B=1) ────────────────────────────────────────────
-// All shapes fixed at compile time. Allocated once at first call.
+// ─── Activation arena (B=1) ──────────────────────────────────────────────
+// All shapes fixed at compile time, so a context's buffers are carved out of
+// one aligned allocation up front and forward() never allocates. Each
+// context is independent: N threads can run forward() concurrently against
+// the same (read-only) ModelWeights, one context each.
 
-namespace {
-
-struct Activations {
+struct Context {
+  float* arena;
   Tensor cnn_in;          // [1, INPUT_CHANNELS, 8, 8]
   Tensor cnn_a;           // [1, DIM_CNN, 8, 8]
   Tensor cnn_b;           // [1, DIM_CNN, 8, 8] residual buffer
+  Tensor cnn_c;           // [1, DIM_CNN, 8, 8] second conv of a block
   Tensor cnn_out;         // [1, VIT_LENGTH, 8, 8]
   Tensor patch_in;        // [VIT_LENGTH, 64]
   Tensor patch_out;       // [VIT_LENGTH, DIM_VIT]
@@ -124,50 +175,133 @@ struct Activations {
   Tensor ffn_h;           // [VIT_LENGTH, DIM_VIT]
   Tensor mean_pool;       // [DIM_VIT]
   Tensor head_in;         // [1, DIM_VIT]
-  Tensor logits;          // [NUM_MOVES]
   Tensor val_h;           // [128]
   Tensor val_out;         // [1]
   Tensor elo_concat;      // [ELO_DIM*2]
+  Tensor elo_query;       // [1, INNER_DIM]
   Tensor elo_effect;      // [HEADS, 1, DIM_HEAD]
-  bool   inited;
+  Tensor conv_scratch;    // [64, DIM_CNN*9 + DIM_CNN] im2col + GEMM (packed layout)
+  Tensor lowrank;         // [VIT_LENGTH, DIM_VIT] x @ U of a factored layer
 };
 
-Activations& acts() {
-  static Activations a{};
-  if (!a.inited) {
-    a.cnn_in       = Tensor::alloc(1, INPUT_CHANNELS, 8, 8);
-    a.cnn_a        = Tensor::alloc(1, DIM_CNN, 8, 8);
-    a.cnn_b        = Tensor::alloc(1, DIM_CNN, 8, 8);
-    a.cnn_out      = Tensor::alloc(1, VIT_LENGTH, 8, 8);
-    a.patch_in     = Tensor::alloc(VIT_LENGTH, 64);
-    a.patch_out    = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.x            = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.x_skip       = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.norm_x       = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.qkv          = Tensor::alloc(VIT_LENGTH, INNER_DIM * 3);
-    a.q            = Tensor::alloc(1, HEADS, VIT_LENGTH, DIM_HEAD);
-    a.k            = Tensor::alloc(1, HEADS, VIT_LENGTH, DIM_HEAD);
-    a.v            = Tensor::alloc(1, HEADS, VIT_LENGTH, DIM_HEAD);
-    a.k_t          = Tensor::alloc(1, HEADS, DIM_HEAD, VIT_LENGTH);
-    a.dots         = Tensor::alloc(1, HEADS, VIT_LENGTH, VIT_LENGTH);
-    a.attn_out     = Tensor::alloc(1, HEADS, VIT_LENGTH, DIM_HEAD);
-    a.attn_concat  = Tensor::alloc(VIT_LENGTH, INNER_DIM);
-    a.attn_proj    = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.ffn_h        = Tensor::alloc(VIT_LENGTH, DIM_VIT);
-    a.mean_pool    = Tensor::alloc(DIM_VIT);
-    a.head_in      = Tensor::alloc(1, DIM_VIT);
-    a.logits       = Tensor::alloc(NUM_MOVES);
-    a.val_h        = Tensor::alloc(1, 128);
-    a.val_out      = Tensor::alloc(1, 1);
-    a.elo_concat   = Tensor::alloc(ELO_DIM * 2);
-    a.elo_effect   = Tensor::alloc(1, HEADS, 1, DIM_HEAD);
-    a.inited = true;
+namespace {
+
+// Hands out 64-byte-aligned slices of the arena. Run once with base ==
+// nullptr to size it, then again over the real allocation.
+struct Carver {
+  float* base;
+  size_t used = 0;  // floats
+
+  Tensor take(size_t s0, size_t s1 = 1, size_t s2 = 1, size_t s3 = 1) {
+    Tensor t = Tensor::borrow(base ? base + used : nullptr, s0, s1, s2, s3);
+    used += (t.size + 15) & ~size_t(15);
+    return t;
+  }
+};
+
+void carve(Context& a, Carver& c) {
+  a.cnn_in       = c.take(1, INPUT_CHANNELS, 8, 8);
+  a.cnn_a        = c.take(1, DIM_CNN, 8, 8);
+  a.cnn_b        = c.take(1, DIM_CNN, 8, 8);
+  a.cnn_c        = c.take(1, DIM_CNN, 8, 8);
+  a.cnn_out      = c.take(1, VIT_LENGTH, 8, 8);
+  a.patch_in     = c.take(VIT_LENGTH, 64);
+  a.patch_out    = c.take(VIT_LENGTH, DIM_VIT);
+  a.x            = c.take(VIT_LENGTH, DIM_VIT);
+  a.x_skip       = c.take(VIT_LENGTH, DIM_VIT);
+  a.norm_x       = c.take(VIT_LENGTH, DIM_VIT);
+  a.qkv          = c.take(VIT_LENGTH, INNER_DIM * 3);
+  a.q            = c.take(1, HEADS, VIT_LENGTH, DIM_HEAD);
+  a.k            = c.take(1, HEADS, VIT_LENGTH, DIM_HEAD);
+  a.v            = c.take(1, HEADS, VIT_LENGTH, DIM_HEAD);
+  a.k_t          = c.take(1, HEADS, DIM_HEAD, VIT_LENGTH);
+  a.dots         = c.take(1, HEADS, VIT_LENGTH, VIT_LENGTH);
+  a.attn_out     = c.take(1, HEADS, VIT_LENGTH, DIM_HEAD);
+  a.attn_concat  = c.take(VIT_LENGTH, INNER_DIM);
+  a.attn_proj    = c.take(VIT_LENGTH, DIM_VIT);
+  a.ffn_h        = c.take(VIT_LENGTH, DIM_VIT);
+  a.mean_pool    = c.take(DIM_VIT);
+  a.head_in      = c.take(1, DIM_VIT);
+  a.val_h        = c.take(1, 128);
+  a.val_out      = c.take(1, 1);
+  a.elo_concat   = c.take(ELO_DIM * 2);
+  a.elo_query    = c.take(1, INNER_DIM);
+  a.elo_effect   = c.take(1, HEADS, 1, DIM_HEAD);
+  a.conv_scratch = c.take(64, DIM_CNN * 9 + DIM_CNN);
+  a.lowrank      = c.take(VIT_LENGTH, DIM_VIT);
+}
+
+// GEMM-shaped layers dispatch on the blob's layout: the packed kernels
+// stream pre-tiled panels, the plain ones the row-major [in, out] matrix.
+void dense(const ModelWeights& w, const Tensor& in, const float* weight,
+           size_t out_dim, const float* bias, Tensor& out) {
+  Tensor b = Tensor::borrow((float*)bias, out_dim);
+  if (w.layout == LAYOUT_PANEL8) {
+    ops::linear_packed(in, weight, out_dim, bias ? &b : nullptr, out);
+    return;
+  }
+  Tensor wt = Tensor::borrow((float*)weight, in.shape[1], out_dim);
+  ops::linear(in, wt, bias ? &b : nullptr, out);
+}
+
+// Possibly factored layer: v == nullptr means `u` is the dense weight.
+void dense_lr(const ModelWeights& w, Context& A, const Tensor& in,
+              const float* u, const float* v, size_t rank,
+              size_t out_dim, const float* bias, Tensor& out) {
+  if (v == nullptr) {
+    dense(w, in, u, out_dim, bias, out);
+    return;
   }
-  return a;
+  Tensor mid = Tensor::borrow(A.lowrank.data, in.shape[0], rank);
+  mid.rank = 2;
+  dense(w, in, u, rank, nullptr, mid);
+  dense(w, mid, v, out_dim, bias, out);
 }
 
+void conv3x3(const ModelWeights& w, Context& A, const Tensor& in,
+             const float* weight, size_t cout, Tensor& out) {
+  if (w.layout == LAYOUT_PANEL8) {
+    ops::conv2d_3x3_packed(in, weight, cout, A.conv_scratch.data, out);
+    return;
+  }
+  Tensor wt = Tensor::borrow((float*)weight, cout, in.shape[1], 3, 3);
+  ops::conv2d_3x3_s1_p1(in, wt, out);
+}
+
+struct ContextDeleter {
+  void operator()(Context* ctx) const { destroy_context(ctx); }
+};
+
 } // namespace
 
+size_t context_bytes() {
+  Context probe{};
+  Carver sizer{nullptr};
+  carve(probe, sizer);
+  return sizer.used * sizeof(float);
+}
+
+Context* create_context() {
+  const size_t bytes = context_bytes();
+  auto* ctx = new (std::nothrow) Context{};
+  if (ctx == nullptr) return nullptr;
+  ctx->arena = (float*)aligned_alloc(64, bytes);
+  if (ctx->arena == nullptr) {
+    delete ctx;
+    return nullptr;
+  }
+  std::memset(ctx->arena, 0, bytes);
+  Carver carver{ctx->arena};
+  carve(*ctx, carver);
+  return ctx;
+}
+
+void destroy_context(Context* ctx) {
+  if (ctx == nullptr) return;
+  free(ctx->arena);
+  delete ctx;
+}
+
 // ─── Forward pass ────────────────────────────────────────────────────────
 
 bool forward(const ModelWeights& w,
@@ -175,14 +309,25 @@ bool forward(const ModelWeights& w,
              int64_t elo_self, int64_t elo_oppo,
              float* logits_out,
              float* value_out) {
-  Activations& A = acts();
+  // One lazily-created context per calling thread (the WASM build has just
+  // the one).
+  thread_local std::unique_ptr<Context, ContextDeleter> ctx(create_context());
+  if (!ctx) return false;
+  return forward(w, *ctx, board, elo_self, elo_oppo, logits_out, value_out);
+}
+
+bool forward(const ModelWeights& w,
+             Context& A,
+             const float* board,
+             int64_t elo_self, int64_t elo_oppo,
+             float* logits_out,
+             float* value_out) {
 
   // 1. Copy board input
   std::memcpy(A.cnn_in.data, board, INPUT_CHANNELS * 64 * sizeof(float));
 
   // 2. ChessResNet: conv1 → BN → ReLU → 5 BasicBlocks → conv_last → BN
-  Tensor conv1_w = Tensor::borrow((float*)w.cnn_conv1_w, DIM_CNN, INPUT_CHANNELS, 3, 3);
-  ops::conv2d_3x3_s1_p1(A.cnn_in, conv1_w, A.cnn_a);
+  conv3x3(w, A, A.cnn_in, w.cnn_conv1_w, DIM_CNN, A.cnn_a);
   ops::batchnorm2d(A.cnn_a, w.cnn_bn1_g, w.cnn_bn1_b,
                    w.cnn_bn1_rm, w.cnn_bn1_rv, BATCHNORM_EPS, A.cnn_a);
   ops::relu_(A.cnn_a);
@@ -191,29 +336,23 @@ bool forward(const ModelWeights& w,
     const auto& blk = w.cnn_blocks[i];
     // Save residual: cnn_a → cnn_b temporarily not needed since we add at end.
     // Strategy: compute into cnn_b, then add cnn_a, then swap.
-    Tensor c1_w = Tensor::borrow((float*)blk.conv1_w, DIM_CNN, DIM_CNN, 3, 3);
-    Tensor c2_w = Tensor::borrow((float*)blk.conv2_w, DIM_CNN, DIM_CNN, 3, 3);
-
-    ops::conv2d_3x3_s1_p1(A.cnn_a, c1_w, A.cnn_b);
+    conv3x3(w, A, A.cnn_a, blk.conv1_w, DIM_CNN, A.cnn_b);
     ops::batchnorm2d(A.cnn_b, blk.bn1_g, blk.bn1_b, blk.bn1_rm, blk.bn1_rv,
                      BATCHNORM_EPS, A.cnn_b);
     ops::relu_(A.cnn_b);
 
     // Conv2 → BN
-    Tensor cnn_b2 = Tensor::alloc(1, DIM_CNN, 8, 8);  // tmp; could reuse A.cnn_b's buffer
-    ops::conv2d_3x3_s1_p1(A.cnn_b, c2_w, cnn_b2);
-    ops::batchnorm2d(cnn_b2, blk.bn2_g, blk.bn2_b, blk.bn2_rm, blk.bn2_rv,
-                     BATCHNORM_EPS, cnn_b2);
+    conv3x3(w, A, A.cnn_b, blk.conv2_w, DIM_CNN, A.cnn_c);
+    ops::batchnorm2d(A.cnn_c, blk.bn2_g, blk.bn2_b, blk.bn2_rm, blk.bn2_rv,
+                     BATCHNORM_EPS, A.cnn_c);
     // Residual + ReLU
-    ops::add_(cnn_b2, A.cnn_a);
-    ops::relu_(cnn_b2);
-    std::memcpy(A.cnn_a.data, cnn_b2.data, A.cnn_a.size * sizeof(float));
-    cnn_b2.release();
+    ops::add_(A.cnn_c, A.cnn_a);
+    ops::relu_(A.cnn_c);
+    std::memcpy(A.cnn_a.data, A.cnn_c.data, A.cnn_a.size * sizeof(float));
   }
 
   // conv_last + bn_last
-  Tensor conv_last_w = Tensor::borrow((float*)w.cnn_conv_last_w, VIT_LENGTH, DIM_CNN, 3, 3);
-  ops::conv2d_3x3_s1_p1(A.cnn_a, conv_last_w, A.cnn_out);
+  conv3x3(w, A, A.cnn_a, w.cnn_conv_last_w, VIT_LENGTH, A.cnn_out);
   ops::batchnorm2d(A.cnn_out, w.cnn_bn_last_g, w.cnn_bn_last_b,
                    w.cnn_bn_last_rm, w.cnn_bn_last_rv, BATCHNORM_EPS, A.cnn_out);
 
@@ -258,8 +397,7 @@ bool forward(const ModelWeights& w,
     ops::layernorm(A.x, an_g, an_b, LAYERNORM_EPS, A.norm_x);
 
     // qkv = norm_x @ to_qkv  ([VIT_LENGTH, INNER_DIM*3])
-    Tensor qkv_w = Tensor::borrow((float*)blk.attn_qkv_w, DIM_VIT, INNER_DIM * 3);
-    ops::linear(A.norm_x, qkv_w, nullptr, A.qkv);
+    dense(w, A.norm_x, blk.attn_qkv_w, INNER_DIM * 3, nullptr, A.qkv);
 
     // Split + reshape: q/k/v each [HEADS, VIT_LENGTH, DIM_HEAD]
     // Source layout: A.qkv[n][h*DIM_HEAD + d_or_offset]; we extract per-head.
@@ -277,15 +415,13 @@ bool forward(const ModelWeights& w,
 
     // elo_effect = elo_concat @ elo_query_w → [INNER_DIM] → reshape [HEADS, 1, DIM_HEAD]
     Tensor elo_query_w = Tensor::borrow((float*)blk.attn_elo_query_w, ELO_DIM * 2, INNER_DIM);
-    Tensor tmp_eff = Tensor::alloc(1, INNER_DIM);
-    ops::linear(A.elo_concat, elo_query_w, nullptr, tmp_eff);
+    ops::linear(A.elo_concat, elo_query_w, nullptr, A.elo_query);
     // Expand elo_effect into [HEADS, 1, DIM_HEAD] shape mapped to A.elo_effect
     for (size_t h = 0; h < HEADS; h++) {
       std::memcpy(A.elo_effect.data + h * DIM_HEAD,
-                  tmp_eff.data + h * DIM_HEAD,
+                  A.elo_query.data + h * DIM_HEAD,
                   DIM_HEAD * sizeof(float));
     }
-    tmp_eff.release();
 
     // q += elo_effect (broadcast over n)
     for (size_t h = 0; h < HEADS; h++) {
@@ -323,9 +459,7 @@ bool forward(const ModelWeights& w,
     }
 
     // attn_proj = attn_concat @ to_out_w + to_out_b
-    Tensor to_out_w = Tensor::borrow((float*)blk.attn_to_out_w, INNER_DIM, DIM_VIT);
-    Tensor to_out_b = Tensor::borrow((float*)blk.attn_to_out_b, DIM_VIT);
-    ops::linear(A.attn_concat, to_out_w, &to_out_b, A.attn_proj);
+    dense(w, A.attn_concat, blk.attn_to_out_w, DIM_VIT, blk.attn_to_out_b, A.attn_proj);
 
     // x = attn_proj + skip
     ops::add_(A.attn_proj, A.x_skip);
@@ -337,14 +471,12 @@ bool forward(const ModelWeights& w,
     Tensor fn_b = Tensor::borrow((float*)blk.ffn_ln_b, DIM_VIT);
     ops::layernorm(A.x, fn_g, fn_b, LAYERNORM_EPS, A.norm_x);
 
-    Tensor f1_w = Tensor::borrow((float*)blk.ffn_fc1_w, DIM_VIT, DIM_VIT);
-    Tensor f1_b = Tensor::borrow((float*)blk.ffn_fc1_b, DIM_VIT);
-    ops::linear(A.norm_x, f1_w, &f1_b, A.ffn_h);
+    dense_lr(w, A, A.norm_x, blk.ffn_fc1_w, blk.ffn_fc1_w2, w.rank_ffn,
+             DIM_VIT, blk.ffn_fc1_b, A.ffn_h);
     ops::gelu_(A.ffn_h);
 
-    Tensor f2_w = Tensor::borrow((float*)blk.ffn_fc2_w, DIM_VIT, DIM_VIT);
-    Tensor f2_b = Tensor::borrow((float*)blk.ffn_fc2_b, DIM_VIT);
-    ops::linear(A.ffn_h, f2_w, &f2_b, A.norm_x);
+    dense_lr(w, A, A.ffn_h, blk.ffn_fc2_w, blk.ffn_fc2_w2, w.rank_ffn,
+             DIM_VIT, blk.ffn_fc2_b, A.norm_x);
 
     ops::add_(A.norm_x, A.x_skip);
     std::memcpy(A.x.data, A.norm_x.data, A.x.size * sizeof(float));
@@ -371,10 +503,9 @@ bool forward(const ModelWeights& w,
   ops::layernorm(mean_pool_view, last_g, last_b, LAYERNORM_EPS, A.head_in);
 
   // 11. logits_maia = head_in @ fc_1 + b
-  Tensor fc1_w = Tensor::borrow((float*)w.fc_1_w, DIM_VIT, NUM_MOVES);
-  Tensor fc1_b = Tensor::borrow((float*)w.fc_1_b, NUM_MOVES);
   Tensor logits_view = Tensor::borrow(logits_out, 1, NUM_MOVES);
-  ops::linear(A.head_in, fc1_w, &fc1_b, logits_view);
+  dense_lr(w, A, A.head_in, w.fc_1_w, w.fc_1_w2, w.rank_head,
+           NUM_MOVES, w.fc_1_b, logits_view);
 
   // 12. value head: relu(fc_3_1) → fc_3 → squeeze
   Tensor fc31_w = Tensor::borrow((float*)w.fc_3_1_w, DIM_VIT, 128);
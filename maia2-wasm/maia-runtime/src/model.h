@@ -5,16 +5,37 @@
 
 // Maia 2 model config (matches the official config.yaml shipped with each
 // pretrained .onnx). All values fixed at build time — we pre-allocate
-// activation buffers accordingly.
+// activation buffers (one arena per Context) accordingly.
+//
+// A smaller model of the same architecture (python/distill.py students) is
+// run by a build with the matching -DMAIA_DIM_CNN=… flags; extract_weights.py
+// prints them and records the dims in the blob header, which load_weights
+// checks against this build.
+#ifndef MAIA_DIM_CNN
+#define MAIA_DIM_CNN 256
+#endif
+#ifndef MAIA_DIM_VIT
+#define MAIA_DIM_VIT 1024
+#endif
+#ifndef MAIA_NUM_BLOCKS_CNN
+#define MAIA_NUM_BLOCKS_CNN 5
+#endif
+#ifndef MAIA_NUM_BLOCKS_VIT
+#define MAIA_NUM_BLOCKS_VIT 2
+#endif
+#ifndef MAIA_ELO_DIM
+#define MAIA_ELO_DIM 128
+#endif
+
 namespace maia {
 
 constexpr size_t INPUT_CHANNELS  = 18;
-constexpr size_t DIM_CNN         = 256;
-constexpr size_t DIM_VIT         = 1024;
-constexpr size_t NUM_BLOCKS_CNN  = 5;
-constexpr size_t NUM_BLOCKS_VIT  = 2;
+constexpr size_t DIM_CNN         = MAIA_DIM_CNN;
+constexpr size_t DIM_VIT         = MAIA_DIM_VIT;
+constexpr size_t NUM_BLOCKS_CNN  = MAIA_NUM_BLOCKS_CNN;
+constexpr size_t NUM_BLOCKS_VIT  = MAIA_NUM_BLOCKS_VIT;
 constexpr size_t VIT_LENGTH      = 8;
-constexpr size_t ELO_DIM         = 128;
+constexpr size_t ELO_DIM         = MAIA_ELO_DIM;
 constexpr size_t HEADS           = 16;
 constexpr size_t DIM_HEAD        = 64;
 constexpr size_t INNER_DIM       = HEADS * DIM_HEAD; // 1024
@@ -27,10 +48,46 @@ constexpr float BATCHNORM_EPS = 1e-5f;
 // Side info head dims: NUM_MOVES + 6 + 6 + 1 + 64 + 64 = 2021 (we don't use it
 // but it's part of the graph; we skip computing it entirely).
 
+// Weight layouts (extract_weights.py --layout). A plain blob is the bare
+// tensors; packed, low-rank or non-default-config blobs start with a
+// WeightsHeader.
+enum WeightsLayout : uint32_t {
+  LAYOUT_PLAIN  = 0,   // every linear weight [in, out] row-major
+  LAYOUT_PANEL8 = 1,   // GEMM weights pre-packed in ops::PACK_NR-wide panels
+};
+
+constexpr char   WEIGHTS_MAGIC[8]      = {'M', 'A', 'I', 'A', 'W', 'G', 'T', '1'};
+constexpr size_t WEIGHTS_HEADER_FLOATS = 16;
+
+struct WeightsHeader {            // 64 bytes, little-endian
+  char     magic[8];              // WEIGHTS_MAGIC
+  uint32_t version;               // 1
+  uint32_t layout;                // WeightsLayout
+  uint32_t panel_n;               // panel width the blob was packed for
+  uint32_t rank_ffn;              // FFN fc1/fc2 factor rank, 0 = dense
+  uint32_t rank_head;             // policy head (fc_1) factor rank, 0 = dense
+  uint32_t dim_cnn;               // model dims the blob was extracted for;
+  uint32_t dim_vit;               //   0 = the Maia 2 default (older headers)
+  uint32_t num_blocks_cnn;
+  uint32_t num_blocks_vit;
+  uint32_t elo_dim;
+  uint32_t reserved[4];
+};
+
 // Indexed view into the loaded weights blob. Each pointer is offset into
 // the contiguous fp32 buffer that was extracted from the .onnx by the
-// Python `extract_weights.py` script.
+// Python `extract_weights.py` script. Under LAYOUT_PANEL8 the conv weights
+// are [Cin*9, Cout] and the attention/FFN/policy matrices [in, out], both
+// stored as packed panels.
+//
+// A low-rank blob (python/lowrank.py) replaces a factored [in, out] matrix
+// by U [in, rank] followed by V [rank, out]: `*_w` then points at U and
+// `*_w2` at V. The `*_w2` pointers are null for dense layers.
 struct ModelWeights {
+  WeightsLayout layout;
+  uint32_t rank_ffn;
+  uint32_t rank_head;
+
   // ChessResNet
   const float* cnn_conv1_w;        // [DIM_CNN, INPUT_CHANNELS, 3, 3]
   const float* cnn_bn1_g;          // [DIM_CNN]
@@ -74,6 +131,7 @@ struct ModelWeights {
     const float* ffn_ln_g, *ffn_ln_b;                 // [DIM_VIT]
     const float* ffn_fc1_w, *ffn_fc1_b;               // [DIM_VIT, MLP_DIM=DIM_VIT], [DIM_VIT]
     const float* ffn_fc2_w, *ffn_fc2_b;               // [MLP_DIM, DIM_VIT], [DIM_VIT]
+    const float* ffn_fc1_w2, *ffn_fc2_w2;             // low-rank V factors
   } vit_blocks[NUM_BLOCKS_VIT];
 
   // Transformer outer LN (applied after all blocks, before mean pool)
@@ -82,14 +140,25 @@ struct ModelWeights {
   // Final LN + heads
   const float* last_ln_g, *last_ln_b;
   const float* fc_1_w, *fc_1_b;        // [DIM_VIT, NUM_MOVES]
+  const float* fc_1_w2;                // low-rank V factor
   const float* fc_3_1_w, *fc_3_1_b;    // [DIM_VIT, 128]
   const float* fc_3_w, *fc_3_b;        // [128, 1]
 };
 
 // Load weights from a flat fp32 binary file into a ModelWeights struct.
-// Returns the total size consumed, or 0 on size mismatch.
+// Returns the total size consumed (header included), or 0 on size mismatch
+// or a layout / model config this build cannot run.
 size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& out);
 
+// Per-caller activation arena (~700 KB). Weights are only ever read, so any
+// number of contexts can share one ModelWeights; a context itself must not
+// be used by two threads at once.
+struct Context;
+
+Context* create_context();            // nullptr on allocation failure
+void     destroy_context(Context* ctx);
+size_t   context_bytes();             // arena size of one context
+
 // Forward pass.
 //   board:   [INPUT_CHANNELS, 8, 8] = 1152 floats
 //   elo_self / elo_oppo: scalar bucket indices in [0, NUM_ELO_BUCKETS)
@@ -97,6 +166,14 @@ size_t load_weights(const float* blob, size_t blob_floats, ModelWeights& out);
 //   value_out:  scalar in [-1, 1] before clamp; caller does (v/2 + 0.5)
 //
 // Returns true on success.
+bool forward(const ModelWeights& w,
+             Context& ctx,
+             const float* board,
+             int64_t elo_self, int64_t elo_oppo,
+             float* logits_out,
+             float* value_out);
+
+// Same, on a context owned by the calling thread (created on first use).
 bool forward(const ModelWeights& w,
              const float* board,
              int64_t elo_self, int64_t elo_oppo,
@@ -3,6 +3,14 @@
 #include <cmath>
 #include <algorithm>
 #include <cstring>
+#include <type_traits>
+
+#ifdef MAIA_THREADS
+#include <condition_variable>
+#include <mutex>
+#include <thread>
+#include <vector>
+#endif
 
 #ifdef __wasm_simd128__
 #include <wasm_simd128.h>
@@ -10,6 +18,147 @@
 
 namespace ops {
 
+// ─── Thread pool ─────────────────────────────────────────────────────────
+//
+// parallel_for(n, work, fn) cuts [0, n) into one contiguous range per pool
+// thread and runs fn(begin, end) on each, the caller taking the first range.
+// `work` (multiply-adds) keeps small ops inline, where waking the pool costs
+// more than it saves. The pool serves one op at a time: a second thread
+// calling in while it is busy (concurrent forward() on the native build)
+// just runs its op inline.
+
+namespace {
+
+constexpr size_t MIN_PARALLEL_WORK = size_t(1) << 16;
+
+#ifdef MAIA_THREADS
+
+using RangeFn = void (*)(void* ctx, size_t begin, size_t end);
+
+class Pool {
+ public:
+  ~Pool() { resize(1); }
+
+  size_t size() {
+    std::lock_guard<std::mutex> lock(m_);
+    return workers_.size() + 1;
+  }
+
+  // Caller + (threads - 1) workers.
+  void resize(size_t threads) {
+    std::lock_guard<std::mutex> busy(busy_);
+    {
+      std::lock_guard<std::mutex> lock(m_);
+      stop_ = true;
+    }
+    wake_.notify_all();
+    for (auto& t : workers_) t.join();
+    std::lock_guard<std::mutex> lock(m_);
+    workers_.clear();
+    stop_ = false;
+    for (size_t i = 1; i < threads; i++) {
+      workers_.emplace_back(&Pool::work, this, i, generation_);
+    }
+  }
+
+  // False when another op holds the pool; the caller then runs it inline.
+  bool run(size_t n, RangeFn fn, void* ctx) {
+    std::unique_lock<std::mutex> busy(busy_, std::try_to_lock);
+    if (!busy.owns_lock()) return false;
+    size_t parts;
+    {
+      std::lock_guard<std::mutex> lock(m_);
+      parts = std::min(workers_.size() + 1, n);
+      fn_ = fn;
+      ctx_ = ctx;
+      n_ = n;
+      parts_ = parts;
+      pending_ = parts - 1;
+      generation_++;
+    }
+    wake_.notify_all();
+    fn(ctx, 0, n / parts);
+    std::unique_lock<std::mutex> lock(m_);
+    done_.wait(lock, [&] { return pending_ == 0; });
+    return true;
+  }
+
+ private:
+  // Worker `index` runs range `index` of each op with that many parts.
+  // `seen` is the generation at spawn, so no op is missed or run twice.
+  void work(size_t index, uint64_t seen) {
+    std::unique_lock<std::mutex> lock(m_);
+    for (;;) {
+      wake_.wait(lock, [&] { return stop_ || generation_ != seen; });
+      if (stop_) return;
+      seen = generation_;
+      if (index >= parts_) continue;
+      const RangeFn fn = fn_;
+      void* const ctx = ctx_;
+      const size_t begin = n_ * index / parts_;
+      const size_t end = n_ * (index + 1) / parts_;
+      lock.unlock();
+      fn(ctx, begin, end);
+      lock.lock();
+      if (--pending_ == 0) done_.notify_one();
+    }
+  }
+
+  std::mutex busy_;  // held for a whole op (or a resize)
+  std::mutex m_;     // guards the fields below
+  std::condition_variable wake_, done_;
+  std::vector<std::thread> workers_;
+  RangeFn fn_ = nullptr;
+  void* ctx_ = nullptr;
+  size_t n_ = 0, parts_ = 0, pending_ = 0;
+  uint64_t generation_ = 0;
+  bool stop_ = false;
+};
+
+Pool& pool() {
+  static Pool p;
+  return p;
+}
+
+#endif
+
+template <typename F>
+void parallel_for(size_t n, size_t work, F&& fn) {
+#ifdef MAIA_THREADS
+  if (n > 1 && work >= MIN_PARALLEL_WORK && pool().size() > 1) {
+    using Fn = std::remove_reference_t<F>;
+    auto call = [](void* ctx, size_t begin, size_t end) {
+      (*static_cast<Fn*>(ctx))(begin, end);
+    };
+    if (pool().run(n, call, &fn)) return;
+  }
+#else
+  (void)work;
+#endif
+  fn(size_t{0}, n);
+}
+
+} // namespace
+
+size_t set_num_threads(size_t n) {
+#ifdef MAIA_THREADS
+  n = std::clamp<size_t>(n, 1, MAIA_THREADS);
+  if (n != pool().size()) pool().resize(n);
+  return n;
+#else
+  (void)n;
+  return 1;
+#endif
+}
+
+size_t num_threads() {
+#ifdef MAIA_THREADS
+  return pool().size();
+#else
+  return 1;
+#endif
+}
+
 // ─── Linear (matmul) ─────────────────────────────────────────────────────
 //
 // Input  shape: in    [B, I]     (rank-2)
@@ -21,6 +170,8 @@ namespace ops {
 // SIMD strategy: vectorise the inner loop over O in chunks of 4 floats
 // (wasm v128 = 4 × f32). For each (b, i) pair we broadcast in[b][i] and
 // FMA into 4 output cells at a time.
+//
+// Threads split O: each one computes a column range [o0, o1) of every row.
 
 void linear(const Tensor& in, const Tensor& weight, const Tensor* bias,
             Tensor& out) {
@@ -28,30 +179,161 @@ void linear(const Tensor& in, const Tensor& weight, const Tensor* bias,
   const size_t I = in.shape[1];
   const size_t O = weight.shape[1];
 
-  for (size_t b = 0; b < B; b++) {
-    float* out_row = out.data + b * O;
-    if (bias) {
-      std::memcpy(out_row, bias->data, O * sizeof(float));
-    } else {
-      std::memset(out_row, 0, O * sizeof(float));
-    }
-    const float* in_row = in.data + b * I;
-    for (size_t i = 0; i < I; i++) {
-      const float a = in_row[i];
-      const float* w_row = weight.data + i * O;
+  parallel_for(O, B * I * O, [&](size_t o0, size_t o1) {
+    const size_t n = o1 - o0;
+    for (size_t b = 0; b < B; b++) {
+      float* out_row = out.data + b * O + o0;
+      if (bias) {
+        std::memcpy(out_row, bias->data + o0, n * sizeof(float));
+      } else {
+        std::memset(out_row, 0, n * sizeof(float));
+      }
+      const float* in_row = in.data + b * I;
+      for (size_t i = 0; i < I; i++) {
+        const float a = in_row[i];
+        const float* w_row = weight.data + i * O + o0;
 #ifdef __wasm_simd128__
-      const v128_t va = wasm_f32x4_splat(a);
-      size_t o = 0;
-      for (; o + 4 <= O; o += 4) {
-        v128_t vw = wasm_v128_load(w_row + o);
-        v128_t vo = wasm_v128_load(out_row + o);
-        vo = wasm_f32x4_add(vo, wasm_f32x4_mul(va, vw));
-        wasm_v128_store(out_row + o, vo);
+        const v128_t va = wasm_f32x4_splat(a);
+        size_t o = 0;
+        for (; o + 4 <= n; o += 4) {
+          v128_t vw = wasm_v128_load(w_row + o);
+          v128_t vo = wasm_v128_load(out_row + o);
+          vo = wasm_f32x4_add(vo, wasm_f32x4_mul(va, vw));
+          wasm_v128_store(out_row + o, vo);
+        }
+        for (; o < n; o++) out_row[o] += a * w_row[o];
+#else
+        for (size_t o = 0; o < n; o++) out_row[o] += a * w_row[o];
+#endif
       }
-      for (; o < O; o++) out_row[o] += a * w_row[o];
+    }
+  });
+}
+
+// ─── Packed linear ───────────────────────────────────────────────────────
+//
+// Loop order: K-block → row tile → panel. Each row tile of the input is
+// re-laid out once per K-block as [kc][PACK_MR] (zero rows past B), so the
+// micro-kernel reads both operands contiguously: per k, one PACK_NR-wide row
+// of the panel and PACK_MR broadcast inputs, PACK_MR × PACK_NR FMAs.
+// Threads split the panels; each packs its own copy of the row tiles.
+
+namespace {
+
+inline void kernel_tile(const float* a, const float* w, size_t kc,
+                        float acc[PACK_MR][PACK_NR]) {
+#ifdef __wasm_simd128__
+  static_assert(PACK_NR == 8, "wasm kernel assumes two v128 per panel row");
+  v128_t lo[PACK_MR], hi[PACK_MR];
+  for (size_t r = 0; r < PACK_MR; r++) {
+    lo[r] = wasm_v128_load(acc[r]);
+    hi[r] = wasm_v128_load(acc[r] + 4);
+  }
+  for (size_t k = 0; k < kc; k++) {
+    const v128_t w0 = wasm_v128_load(w + k * PACK_NR);
+    const v128_t w1 = wasm_v128_load(w + k * PACK_NR + 4);
+    for (size_t r = 0; r < PACK_MR; r++) {
+      const v128_t va = wasm_f32x4_splat(a[k * PACK_MR + r]);
+      lo[r] = wasm_f32x4_add(lo[r], wasm_f32x4_mul(va, w0));
+      hi[r] = wasm_f32x4_add(hi[r], wasm_f32x4_mul(va, w1));
+    }
+  }
+  for (size_t r = 0; r < PACK_MR; r++) {
+    wasm_v128_store(acc[r], lo[r]);
+    wasm_v128_store(acc[r] + 4, hi[r]);
+  }
 #else
-      for (size_t o = 0; o < O; o++) out_row[o] += a * w_row[o];
+  // Fixed trip counts: the compiler keeps acc in vector registers.
+  for (size_t k = 0; k < kc; k++) {
+    const float* wr = w + k * PACK_NR;
+    const float* ar = a + k * PACK_MR;
+    for (size_t r = 0; r < PACK_MR; r++) {
+      for (size_t c = 0; c < PACK_NR; c++) acc[r][c] += ar[r] * wr[c];
+    }
+  }
 #endif
+}
+
+} // namespace
+
+void linear_packed(const Tensor& in, const float* panels, size_t N,
+                   const Tensor* bias, Tensor& out) {
+  const size_t B = in.shape[0];
+  const size_t K = in.shape[1];
+  const size_t num_panels = (N + PACK_NR - 1) / PACK_NR;
+
+  parallel_for(num_panels, B * K * N, [&](size_t p0, size_t p1) {
+    alignas(64) float a_tile[PACK_KC * PACK_MR];
+    for (size_t k0 = 0; k0 < K; k0 += PACK_KC) {
+      const size_t kc = std::min(PACK_KC, K - k0);
+      for (size_t b0 = 0; b0 < B; b0 += PACK_MR) {
+        const size_t mr = std::min(PACK_MR, B - b0);
+        for (size_t k = 0; k < kc; k++) {
+          for (size_t r = 0; r < PACK_MR; r++) {
+            a_tile[k * PACK_MR + r] = r < mr ? in.data[(b0 + r) * K + k0 + k] : 0.f;
+          }
+        }
+        for (size_t p = p0; p < p1; p++) {
+          const size_t n0 = p * PACK_NR;
+          const size_t nr = std::min(PACK_NR, N - n0);
+          alignas(64) float acc[PACK_MR][PACK_NR];
+          // First K-block starts from the bias, later ones from the partial sums.
+          for (size_t r = 0; r < PACK_MR; r++) {
+            for (size_t c = 0; c < PACK_NR; c++) {
+              float v = 0.f;
+              if (r < mr && c < nr) {
+                v = k0 ? out.data[(b0 + r) * N + n0 + c] : (bias ? bias->data[n0 + c] : 0.f);
+              }
+              acc[r][c] = v;
+            }
+          }
+          kernel_tile(a_tile, panels + p * K * PACK_NR + k0 * PACK_NR, kc, acc);
+          for (size_t r = 0; r < mr; r++) {
+            std::memcpy(out.data + (b0 + r) * N + n0, acc[r], nr * sizeof(float));
+          }
+        }
+      }
+    }
+  });
+}
+
+// ─── Packed conv (im2col + packed GEMM) ──────────────────────────────────
+// One row per output pixel, one column per (cin, tap): the GEMM output is
+// pixel-major [H*W, Cout] and gets transposed back to [Cout, H, W].
+
+void conv2d_3x3_packed(const Tensor& in, const float* panels, size_t Cout,
+                       float* scratch, Tensor& out) {
+  const size_t B   = in.shape[0];
+  const size_t Cin = in.shape[1];
+  const size_t H   = in.shape[2];
+  const size_t W   = in.shape[3];
+  const size_t HW  = H * W;
+  const size_t K   = Cin * 9;
+  Tensor cols = Tensor::borrow(scratch, HW, K);
+  Tensor gemm = Tensor::borrow(scratch + HW * K, HW, Cout);
+
+  for (size_t b = 0; b < B; b++) {
+    const float* img = in.data + b * Cin * HW;
+    for (size_t h = 0; h < H; h++) {
+      for (size_t w = 0; w < W; w++) {
+        float* row = cols.data + (h * W + w) * K;
+        for (size_t c = 0; c < Cin; c++) {
+          const float* chan = img + c * HW;
+          for (int dy = -1; dy <= 1; dy++) {
+            const int yy = (int)h + dy;
+            for (int dx = -1; dx <= 1; dx++) {
+              const int xx = (int)w + dx;
+              const bool inside = yy >= 0 && yy < (int)H && xx >= 0 && xx < (int)W;
+              *row++ = inside ? chan[yy * W + xx] : 0.f;
+            }
+          }
+        }
+      }
+    }
+    linear_packed(cols, panels, Cout, nullptr, gemm);
+    float* dst = out.data + b * Cout * HW;
+    for (size_t px = 0; px < HW; px++) {
+      for (size_t c = 0; c < Cout; c++) dst[c * HW + px] = gemm.data[px * Cout + c];
     }
   }
 }
@@ -181,7 +463,7 @@ void batchnorm2d(const Tensor& in,
 // Maia's only conv shape. Naive implementation: loop over output positions,
 // accumulate the 3x3 window from each input channel into each output channel.
 // This is the "direct" form (no im2col); for the tiny board (8x8) it's
-// efficient enough — no need for full BLAS GEMM.
+// efficient enough — no need for full BLAS GEMM. Threads split Cout.
 
 void conv2d_3x3_s1_p1(const Tensor& in, const Tensor& weight, Tensor& out) {
   const size_t B    = in.shape[0];
@@ -190,37 +472,39 @@ void conv2d_3x3_s1_p1(const Tensor& in, const Tensor& weight, Tensor& out) {
   const size_t W    = in.shape[3];
   const size_t Cout = weight.shape[0];
 
-  std::memset(out.data, 0, out.size * sizeof(float));
-
-  for (size_t b = 0; b < B; b++) {
-    for (size_t cout = 0; cout < Cout; cout++) {
-      float* out_chan = out.data + ((b * Cout) + cout) * H * W;
-      for (size_t cin = 0; cin < Cin; cin++) {
-        const float* in_chan = in.data + ((b * Cin) + cin) * H * W;
-        const float* k = weight.data + ((cout * Cin) + cin) * 9;  // 3x3
-        for (size_t h = 0; h < H; h++) {
-          for (size_t w = 0; w < W; w++) {
-            float acc = 0.f;
-            // Manually unrolled 3x3 with bounds check
-            for (int dy = -1; dy <= 1; dy++) {
-              const int yy = (int)h + dy;
-              if (yy < 0 || yy >= (int)H) continue;
-              for (int dx = -1; dx <= 1; dx++) {
-                const int xx = (int)w + dx;
-                if (xx < 0 || xx >= (int)W) continue;
-                acc += in_chan[yy * W + xx] * k[(dy + 1) * 3 + (dx + 1)];
+  parallel_for(Cout, B * Cout * Cin * H * W * 9, [&](size_t c0, size_t c1) {
+    for (size_t b = 0; b < B; b++) {
+      for (size_t cout = c0; cout < c1; cout++) {
+        float* out_chan = out.data + ((b * Cout) + cout) * H * W;
+        std::memset(out_chan, 0, H * W * sizeof(float));
+        for (size_t cin = 0; cin < Cin; cin++) {
+          const float* in_chan = in.data + ((b * Cin) + cin) * H * W;
+          const float* k = weight.data + ((cout * Cin) + cin) * 9;  // 3x3
+          for (size_t h = 0; h < H; h++) {
+            for (size_t w = 0; w < W; w++) {
+              float acc = 0.f;
+              // Manually unrolled 3x3 with bounds check
+              for (int dy = -1; dy <= 1; dy++) {
+                const int yy = (int)h + dy;
+                if (yy < 0 || yy >= (int)H) continue;
+                for (int dx = -1; dx <= 1; dx++) {
+                  const int xx = (int)w + dx;
+                  if (xx < 0 || xx >= (int)W) continue;
+                  acc += in_chan[yy * W + xx] * k[(dy + 1) * 3 + (dx + 1)];
+                }
               }
+              out_chan[h * W + w] += acc;
             }
-            out_chan[h * W + w] += acc;
           }
         }
       }
     }
-  }
+  });
 }
 
 // ─── Batched matmul ──────────────────────────────────────────────────────
 // A[B,H,M,K] @ B[B,H,K,N] = out[B,H,M,N]
+// Threads split the B*H independent matrices (attention heads).
 
 void matmul_batched(const Tensor& A, const Tensor& B, Tensor& out) {
   const size_t b  = A.shape[0];
@@ -228,11 +512,11 @@ void matmul_batched(const Tensor& A, const Tensor& B, Tensor& out) {
   const size_t M  = A.shape[2];
   const size_t K  = A.shape[3];
   const size_t N  = B.shape[3];
-  for (size_t bi = 0; bi < b; bi++) {
-    for (size_t hi = 0; hi < h; hi++) {
-      const float* a_mat = A.data + ((bi * h + hi) * M) * K;
-      const float* b_mat = B.data + ((bi * h + hi) * K) * N;
-      float* o_mat = out.data + ((bi * h + hi) * M) * N;
+  parallel_for(b * h, b * h * M * K * N, [&](size_t m0, size_t m1) {
+    for (size_t mat = m0; mat < m1; mat++) {
+      const float* a_mat = A.data + (mat * M) * K;
+      const float* b_mat = B.data + (mat * K) * N;
+      float* o_mat = out.data + (mat * M) * N;
       std::memset(o_mat, 0, M * N * sizeof(float));
       for (size_t m = 0; m < M; m++) {
         for (size_t k = 0; k < K; k++) {
@@ -253,7 +537,7 @@ void matmul_batched(const Tensor& A, const Tensor& B, Tensor& out) {
         }
       }
     }
-  }
+  });
 }
 
 // ─── Transpose last two dims ─────────────────────────────────────────────
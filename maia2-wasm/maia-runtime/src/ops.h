@@ -7,6 +7,18 @@
 
 namespace ops {
 
+// ─── Intra-op threads ─────────────────────────────────────────────────────
+//
+// Builds with -DMAIA_THREADS=<max> (the pthreads WASM variant) split the
+// conv / linear / batched-matmul loops over a small pool, up to <max>
+// threads counting the caller. Each thread owns a range of output columns or
+// channels, so results are bit-identical to the single-threaded loops.
+// Without MAIA_THREADS both calls are no-ops and everything runs inline.
+//
+// set_num_threads clamps to [1, max] and returns the count now in use.
+size_t set_num_threads(size_t n);
+size_t num_threads();
+
 // Linear: out[B,O] = in[B,I] @ weight[I,O] + (bias ? bias[O] : 0)
 void linear(const Tensor& in, const Tensor& weight, const Tensor* bias,
             Tensor& out);
@@ -42,6 +54,33 @@ void batchnorm2d(const Tensor& in,
 //   out:    [B, Cout, H, W]
 void conv2d_3x3_s1_p1(const Tensor& in, const Tensor& weight, Tensor& out);
 
+// ─── Packed ("panel") weights ─────────────────────────────────────────────
+//
+// extract_weights.py --layout panel8 stores the big weight matrices [K, N]
+// as ceil(N / PACK_NR) panels, each a contiguous [K, PACK_NR] block
+// (k-major, last panel zero-padded). The kernels below compute PACK_MR ×
+// PACK_NR output tiles in registers while streaming one panel front to back,
+// in K-blocks of PACK_KC rows so a block of every panel stays cache-resident
+// across the row tiles.
+constexpr size_t PACK_NR = 8;
+constexpr size_t PACK_MR = 8;
+constexpr size_t PACK_KC = 256;
+
+// Floats taken by a packed [K, N] matrix.
+constexpr size_t packed_size(size_t K, size_t N) {
+  return (N + PACK_NR - 1) / PACK_NR * PACK_NR * K;
+}
+
+// Linear on packed weights: out[B,N] = in[B,K] @ W + (bias ? bias[N] : 0).
+void linear_packed(const Tensor& in, const float* panels, size_t N,
+                   const Tensor* bias, Tensor& out);
+
+// Conv2d 3x3 s1 p1 on packed weights, as an im2col GEMM:
+//   panels: packed [Cin*9, Cout], row k = cin*9 + ky*3 + kx
+//   scratch: H*W * (Cin*9 + Cout) floats
+void conv2d_3x3_packed(const Tensor& in, const float* panels, size_t Cout,
+                       float* scratch, Tensor& out);
+
 // Matmul (4D batched): A[B,H,M,K] @ B[B,H,K,N] = out[B,H,M,N]
 void matmul_batched(const Tensor& A, const Tensor& B, Tensor& out);
 
@@ -2,12 +2,17 @@
 // PyTorch reference on a fixed set of positions.
 //
 // Run after building the Node variant of the runtime:
-//   cd ../wasm && MASTER_PUBLIC_KEY_HEX=... LICENSE_URL=http://localhost:8080/api/license/verify ./build.sh
-//   (then re-build with -s ENVIRONMENT=node and copy maia_node.js next to this file)
+//   cd ../wasm && ENV_TARGET=node OUT_BASENAME=maia_node ./build.sh
+//   (copy maia_node.{js,wasm} next to this file)
 //
 // Then:
 //   node parity_test.mjs reference.json
 //
+// The pthreads variant is checked the same way (MAIA_THREADS picks the
+// thread count, default 4):
+//   cd ../wasm && THREADS=4 ENV_TARGET=node OUT_BASENAME=maia_node_mt ./build.sh
+//   MAIA_MODULE=./maia_node_mt.js node parity_test.mjs reference.json
+//
 // reference.json is produced by ../scripts/make_reference.py (PyTorch).
 
 import { readFileSync } from 'node:fs';
@@ -22,10 +27,9 @@ if (process.argv.length < 3) {
 const refPath = process.argv[2];
 const reference = JSON.parse(readFileSync(refPath, 'utf8'));
 
-const createModule = require('./maia_node.js');
+const createModule = require(process.env.MAIA_MODULE || './maia_node.js');
 const mod = await createModule({});
 const init = mod.cwrap('wasm_init', null, []);
-const setAuth = mod.cwrap('wasm_set_auth_token', null, ['string']);
 const predict = mod.cwrap('wasm_predict', 'number', ['string', 'number', 'number']);
 const logitsPtr = mod.cwrap('wasm_logits_ptr', 'number', []);
 const logitsCount = mod.cwrap('wasm_logits_count', 'number', []);
@@ -34,8 +38,13 @@ const valueOf = mod.cwrap('wasm_value', 'number', []);
 init();
 // For parity testing we bypass the license check by stubbing it server-side
 // or by building with a debug flag. The test harness assumes the WASM is
-// built so that license_verify always passes (debug build).
-setAuth('test-bypass');
+// built so that license_verify always passes (debug build). Builds without
+// the license check don't export the token setter.
+if (mod._wasm_set_auth_token) mod.cwrap('wasm_set_auth_token', null, ['string'])('test-bypass');
+if (mod._wasm_set_threads) {
+  const threads = mod._wasm_set_threads(Number(process.env.MAIA_THREADS || 4));
+  console.log(`runtime threads: ${threads}`);
+}
 
 let pass = 0;
 let fail = 0;
@@ -3,12 +3,21 @@
 #
 # Optional env:
 #   BUILD_TYPE   — "release" (default) or "debug"
+#   MODEL_DEFINES — -DMAIA_* dims of a non-default model such as a distilled
+#                   student (printed by extract_weights.py)
+#   THREADS      — build the pthreads variant, maia-mt.{js,wasm}, whose
+#                  conv / linear loops run on up to THREADS threads
+#                  (wasm_set_threads picks the count at runtime). It needs
+#                  SharedArrayBuffer, i.e. a cross-origin isolated page;
+#                  maia_loader.js falls back to maia.{js,wasm} elsewhere, so
+#                  ship both.
 #
 # Inputs:
 #   wasm/weights_data.cpp — auto-generated by extract_weights.py
 #
 # Outputs:
-#   wasm/maia.{js,wasm}
+#   wasm/maia.{js,wasm}       (default)
+#   wasm/maia-mt.{js,wasm}    (THREADS=N)
 
 set -euo pipefail
 cd "$(dirname "$0")"
@@ -28,11 +37,22 @@ else
 fi
 
 ENV_TARGET="${ENV_TARGET:-worker}"
+THREADS="${THREADS:-}"
+
+# The pool's workers are started up front: a pthread spawned later only
+# comes up once the calling worker yields to its event loop, which a
+# synchronous wasm_set_threads never does.
+THREAD_FLAGS=""
+if [[ -n "$THREADS" ]]; then
+  OUT_BASENAME="${OUT_BASENAME:-maia-mt}"
+  THREAD_FLAGS="-pthread -DMAIA_THREADS=$THREADS -s PTHREAD_POOL_SIZE=$THREADS -s DEFAULT_PTHREAD_STACK_SIZE=256KB"
+fi
 OUT_BASENAME="${OUT_BASENAME:-maia}"
 
 echo "Building $OUT_BASENAME.{js,wasm}"
 echo "  build_type = $BUILD_TYPE"
 echo "  env_target = $ENV_TARGET"
+echo "  threads    = ${THREADS:-1}"
 
 em++ \
   maia_wasm.cpp \
@@ -41,7 +61,7 @@ em++ \
   ../src/encoding.cpp \
   weights_data.cpp \
   $OPT_FLAGS \
-  -std=c++20 -DNDEBUG \
+  -std=c++20 -DNDEBUG ${MODEL_DEFINES:-} $THREAD_FLAGS \
   -I../src \
   -s WASM=1 -s MODULARIZE=1 -s EXPORT_ES6=0 \
   -s ENVIRONMENT=$ENV_TARGET \
@@ -49,7 +69,7 @@ em++ \
   -s STACK_SIZE=8MB \
   -s NO_EXIT_RUNTIME=1 \
   -s EXPORTED_RUNTIME_METHODS='["cwrap","ccall","HEAPF32","HEAPU8","getValue","addRunDependency","removeRunDependency"]' \
-  -s EXPORTED_FUNCTIONS='["_wasm_init","_wasm_predict","_wasm_logits_ptr","_wasm_logits_count","_wasm_value","_malloc","_free"]' \
+  -s EXPORTED_FUNCTIONS='["_wasm_init","_wasm_predict","_wasm_logits_ptr","_wasm_logits_count","_wasm_value","_wasm_set_threads","_wasm_threads","_malloc","_free"]' \
   -o "$OUT_BASENAME.js"
 
 echo "Built:"
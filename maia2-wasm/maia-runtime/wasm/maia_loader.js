@@ -0,0 +1,52 @@
+// Loads the Maia runtime build that fits the current context.
+//
+// maia-mt.{js,wasm} (build.sh with THREADS=N) splits the conv / linear loops
+// across a pthread pool, which needs SharedArrayBuffer — browsers only
+// expose it on cross-origin isolated pages (COOP: same-origin + COEP:
+// require-corp). Anywhere else, or if the threaded module fails to start,
+// this falls back to the single-threaded maia.{js,wasm}. Ship both builds
+// side by side.
+//
+// Both are ENVIRONMENT=worker builds, so this runs in a classic worker:
+//   importScripts('/engine/maia2/maia_loader.js');
+//   const { module, threads } = await loadMaia({ baseUrl: '/engine/maia2/' });
+//   module.cwrap('wasm_predict', 'number', ['string', 'number', 'number']);
+
+function maiaThreadsAvailable() {
+  if (!self.crossOriginIsolated || typeof SharedArrayBuffer === 'undefined') return false;
+  try {
+    // Some embedders keep the global but refuse shared wasm memory.
+    new WebAssembly.Memory({ initial: 1, maximum: 1, shared: true });
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+async function instantiateMaia(baseUrl, name) {
+  // MODULARIZE builds define a global `Module` factory; each import
+  // replaces the previous one.
+  importScripts(baseUrl + name + '.js');
+  return self.Module({
+    locateFile: (path) => baseUrl + path,
+    // pthread workers re-load the glue from here, not from this worker's URL.
+    mainScriptUrlOrBlob: baseUrl + name + '.js',
+  });
+}
+
+async function loadMaia({ baseUrl = '', threads = self.navigator?.hardwareConcurrency || 1 } = {}) {
+  if (threads > 1 && maiaThreadsAvailable()) {
+    try {
+      const module = await instantiateMaia(baseUrl, 'maia-mt');
+      module._wasm_init();
+      return { module, threads: module._wasm_set_threads(threads), variant: 'maia-mt' };
+    } catch (err) {
+      console.warn('[maia] threaded runtime unavailable, using single-threaded build:', err);
+    }
+  }
+  const module = await instantiateMaia(baseUrl, 'maia');
+  module._wasm_init();
+  return { module, threads: 1, variant: 'maia' };
+}
+
+self.loadMaia = loadMaia;
@@ -1,5 +1,6 @@
 #include "../src/model.h"
 #include "../src/encoding.h"
+#include "../src/ops.h"
 
 #include <emscripten/emscripten.h>
 
@@ -73,4 +74,12 @@ int wasm_logits_count() { return (int)maia::NUM_MOVES; }
 EMSCRIPTEN_KEEPALIVE
 float wasm_value() { return g_value_buf; }
 
+// Intra-op threads for the pthreads build (maia-mt); the single-threaded
+// build always reports 1. Returns the count actually in use.
+EMSCRIPTEN_KEEPALIVE
+int wasm_set_threads(int n) { return (int)ops::set_num_threads(n < 1 ? 1 : (size_t)n); }
+
+EMSCRIPTEN_KEEPALIVE
+int wasm_threads() { return (int)ops::num_threads(); }
+
 }
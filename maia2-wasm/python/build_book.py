@@ -0,0 +1,249 @@
+"""
+Compile a Polyglot opening book (.bin) from a PGN corpus.
+
+Every (position, move) pair in the first `--max-plies` plies of each game is
+counted with the mover's score (win 2, draw 1, loss 0). Counts accumulate
+in a bounded in-memory buffer; when it fills, the buffer is sorted,
+aggregated and spilled to a run file, and the runs are k-way merged at the
+end — so the corpus can be far larger than RAM. Parsing reuses ingest.py's
+game-aligned chunks, process pool and header filters.
+
+Output is the standard Polyglot layout read by the JS PolyglotBook and by
+python-chess: 16-byte big-endian entries (key, move, weight, learn), sorted
+by key, heaviest move first. Weights are the aggregated scores, scaled down
+per position when they exceed 16 bits.
+
+Usage:
+    python build_book.py lichess_2024-01.pgn.zst --min-elo 1800 --time-control blitz rapid
+    python build_book.py games.pgn --out models/book.bin --max-plies 24 --min-games 5
+"""
+
+import argparse
+import heapq
+import io
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import chess
+import chess.polyglot
+import numpy as np
+
+import dataset
+import ingest
+
+ROOT = Path(__file__).parent.resolve()
+DEFAULT_OUT = ROOT / "models" / "book.bin"
+
+MAX_PLIES = 30
+MIN_GAMES = 3
+RUN_ENTRIES = 1 << 23  # ~150 MB of buffered pairs before a spill
+
+BOOK_DTYPE = np.dtype([("key", ">u8"), ("move", ">u2"), ("weight", ">u2"), ("learn", ">u4")])
+PAIR_DTYPE = np.dtype([("key", "<u8"), ("move", "<u2"), ("count", "<u4"), ("score", "<u4")])
+
+
+def polyglot_move(board: chess.Board, move: chess.Move) -> int:
+    """Polyglot raw move; castling is encoded king-takes-own-rook (e1h1)."""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+# ─── Workers ──────────────────────────────────────────────────────────────
+
+def _work(job) -> tuple[np.ndarray, dict]:
+    """(key, move, count, score) pairs of one chunk's opening plies."""
+    task, game_filter, max_plies = job
+    stats = {"games": 0, "filtered": 0, "errors": 0, "kept": 0}
+    keys, moves, scores = [], [], []
+    for game in dataset.read_games(io.StringIO(ingest._read_chunk(task)), None, game_filter.accepts):
+        stats["games"] += 1
+        if game.skipped:
+            stats["filtered"] += 1
+            continue
+        if game.error:
+            stats["errors"] += 1
+            continue
+        white_score = dataset.RESULTS[game.headers["Result"]] + 1  # 2 / 1 / 0
+        fen = game.headers.get("FEN") if game.headers.get("SetUp") == "1" else None
+        board = chess.Board(fen) if fen else chess.Board()
+        for move in game.moves[:max_plies]:
+            keys.append(chess.polyglot.zobrist_hash(board))
+            moves.append(polyglot_move(board, move))
+            scores.append(white_score if board.turn == chess.WHITE else 2 - white_score)
+            board.push(move)
+        stats["kept"] += 1
+    pairs = np.empty(len(keys), dtype=PAIR_DTYPE)
+    pairs["key"] = np.array(keys, dtype=np.uint64)
+    pairs["move"] = moves
+    pairs["count"] = 1
+    pairs["score"] = scores
+    return pairs, stats
+
+
+# ─── External sort ────────────────────────────────────────────────────────
+
+def aggregate(pairs: np.ndarray) -> np.ndarray:
+    """Sort by (key, move) and sum count/score over duplicates."""
+    if not len(pairs):
+        return pairs
+    pairs = pairs[np.lexsort((pairs["move"], pairs["key"]))]
+    starts = np.flatnonzero(np.r_[True, (pairs["key"][1:] != pairs["key"][:-1])
+                                   | (pairs["move"][1:] != pairs["move"][:-1])])
+    out = pairs[starts].copy()
+    out["count"] = np.add.reduceat(pairs["count"], starts)
+    out["score"] = np.add.reduceat(pairs["score"], starts)
+    return out
+
+
+class RunSpiller:
+    """Buffers pairs and spills sorted, aggregated runs to disk."""
+
+    def __init__(self, tmp_dir: Path, run_entries: int = RUN_ENTRIES):
+        self.tmp = tmp_dir
+        self.run_entries = run_entries
+        self.runs: list[Path] = []
+        self._buf: list[np.ndarray] = []
+        self._buffered = 0
+
+    def add(self, pairs: np.ndarray):
+        self._buf.append(pairs)
+        self._buffered += len(pairs)
+        if self._buffered >= self.run_entries:
+            self.spill()
+
+    def spill(self):
+        if not self._buf:
+            return
+        run = aggregate(np.concatenate(self._buf))
+        path = self.tmp / f"run{len(self.runs):04d}.bin"
+        run.tofile(path)
+        self.runs.append(path)
+        self._buf, self._buffered = [], 0
+
+
+def _iter_run(path: Path, block: int = 1 << 16):
+    n = path.stat().st_size // PAIR_DTYPE.itemsize
+    for start in range(0, n, block):
+        chunk = np.fromfile(path, dtype=PAIR_DTYPE, count=min(block, n - start),
+                            offset=start * PAIR_DTYPE.itemsize)
+        yield from chunk.tolist()
+
+
+def merge_runs(runs: list[Path]):
+    """Yield (key, move, count, score) in (key, move) order, duplicates summed."""
+    current = None
+    for key, move, count, score in heapq.merge(*(_iter_run(p) for p in runs)):
+        if current and current[0] == key and current[1] == move:
+            current[2] += count
+            current[3] += score
+            continue
+        if current:
+            yield tuple(current)
+        current = [key, move, count, score]
+    if current:
+        yield tuple(current)
+
+
+def write_book(entries, out: Path, min_games: int = MIN_GAMES) -> tuple[int, int]:
+    """Write merged (key, move, count, score) records as Polyglot entries.
+
+    Returns (entries written, positions).
+    """
+    n_entries = n_positions = 0
+    pending: list[tuple[int, int, int]] = []
+    block: list[tuple] = []
+
+    def flush_key():
+        nonlocal n_entries, n_positions
+        if not pending:
+            return
+        scale = max(1.0, max(s for _, _, s in pending) / 0xFFFF)
+        for key, move, score in sorted(pending, key=lambda e: -e[2]):
+            block.append((key, move, max(1, int(score / scale)), 0))
+        n_entries += len(pending)
+        n_positions += 1
+
+    with open(out, "wb") as f:
+        last_key = None
+        for key, move, count, score in entries:
+            if key != last_key:
+                flush_key()
+                pending = []
+                last_key = key
+                if len(block) >= 1 << 16:
+                    np.array(block, dtype=BOOK_DTYPE).tofile(f)
+                    block = []
+            if count >= min_games:
+                pending.append((key, move, score))
+        flush_key()
+        if block:
+            np.array(block, dtype=BOOK_DTYPE).tofile(f)
+    return n_entries, n_positions
+
+
+# ─── Driver ───────────────────────────────────────────────────────────────
+
+def build_book(pgns, out=DEFAULT_OUT, game_filter: ingest.GameFilter = None,
+               max_plies: int = MAX_PLIES, min_games: int = MIN_GAMES,
+               workers: int = None, chunk_bytes: int = ingest.CHUNK_BYTES,
+               run_entries: int = RUN_ENTRIES) -> dict:
+    game_filter = game_filter or ingest.GameFilter()
+    workers = workers or os.cpu_count() or 1
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    totals = {"games": 0, "filtered": 0, "errors": 0, "kept": 0, "pairs": 0}
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="book-runs-") as tmp, Pool(workers) as pool:
+        spiller = RunSpiller(Path(tmp), run_entries)
+        for pgn in pgns:
+            jobs = ((task, game_filter, max_plies) for task in ingest.iter_tasks(pgn, chunk_bytes))
+            for pairs, stats in ingest.imap_ordered(pool, _work, jobs, max_inflight=2 * workers):
+                for k in stats:
+                    totals[k] += stats[k]
+                totals["pairs"] += len(pairs)
+                spiller.add(pairs)
+                print(f"  {totals['games']:,} games read, {totals['kept']:,} kept, "
+                      f"{len(spiller.runs)} runs spilled", file=sys.stderr)
+        spiller.spill()
+        totals["runs"] = len(spiller.runs)
+        totals["entries"], totals["positions"] = write_book(merge_runs(spiller.runs), out, min_games)
+    totals["seconds"] = round(time.perf_counter() - t0, 2)
+    return totals
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pgn", nargs="+")
+    ap.add_argument("--out", default=str(DEFAULT_OUT))
+    ap.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    ap.add_argument("--min-games", type=int, default=MIN_GAMES,
+                    help="drop moves played fewer times than this from a position")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunk-mb", type=float, default=ingest.CHUNK_BYTES / (1 << 20))
+    ap.add_argument("--run-entries", type=int, default=RUN_ENTRIES,
+                    help="pairs buffered in memory before spilling a sorted run")
+    ap.add_argument("--time-control", nargs="*", default=[],
+                    choices=[name for name, _ in ingest.SPEEDS] + ["correspondence"])
+    ap.add_argument("--min-elo", type=int, default=0)
+    ap.add_argument("--max-elo", type=int, default=0)
+    args = ap.parse_args()
+
+    game_filter = ingest.GameFilter(speeds=args.time_control, min_elo=args.min_elo, max_elo=args.max_elo)
+    totals = build_book(args.pgn, args.out, game_filter, args.max_plies, args.min_games, args.workers,
+                        int(args.chunk_mb * (1 << 20)), args.run_entries)
+    size = Path(args.out).stat().st_size
+    print(f"✓ {args.out}: {totals['entries']:,} moves in {totals['positions']:,} positions "
+          f"({size / 1024:.0f} KB) from {totals['kept']:,} games, {totals['runs']} runs, {totals['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
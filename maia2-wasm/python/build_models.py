@@ -0,0 +1,490 @@
+"""
+Build every model artifact from the checkpoints, skipping what's up to date.
+
+export.py, fuse.py, to_fp16.py, quantize.py and extract_weights.py each
+turn one artifact into another. This runs them as one graph of steps per
+model type:
+
+    checkpoint  models/{type}_model.pt          downloaded if missing (a
+                                                student's is models/{type}.pt)
+    onnx        {type}_model.onnx               export.py (a student's comes
+                                                from distill.py, taken as is)
+    fused       {type}_model.fused.onnx         fuse.py
+    fp16        {type}_model.fp16.onnx          to_fp16.py  (--fused: from fused)
+    int8        {type}_model.int8.onnx          quantize.py (--fused: from fused)
+    weights     {type}_weights[.{layout}].bin   extract_weights.py, per --layouts
+
+Each step is keyed by a hash of everything that decides its output: the
+sha256 of its inputs, the source of the script it runs, its options and
+the versions of the packages doing the work. A step whose key matches the
+manifest and whose outputs are in place is skipped; a key built before is
+restored from the content-addressed store (models/.build/<key>/, outputs
+hard-linked into models/) without running anything; the rest run,
+independent ones in parallel (--jobs). Editing quantize.py rebuilds the
+int8 models and nothing else; switching an option back costs a relink.
+Outputs in models/ share storage with the store, so treat them as
+read-only (a restore re-checks the stored sha256 and rebuilds on mismatch).
+
+models/build_manifest.json records per step its key, input hashes,
+outputs (bytes, sha256) and build time, and for the ONNX artifacts a check
+against the fp32 export: max |Δ| of the policy / value outputs, top-1
+agreement (lowrank.score's agree@1 / KL with --positions) and ORT CPU
+ms per position at batch 1 and 64. Checks run one at a time after the
+builds, so parallel work doesn't skew the timings.
+
+Usage:
+    python build_models.py                              # blitz + rapid
+    python build_models.py --types blitz --layouts plain,panel8 --fused -j 4
+    python build_models.py --positions data/positions   # real-position parity
+    python build_models.py --dry-run                    # what would run
+    python build_models.py --install ../../chessr-next/maia-wrapper
+    python build_models.py --gc                         # drop unreferenced store entries
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+
+ROOT = Path(__file__).parent.resolve()
+EXTRACT_WEIGHTS = ROOT.parent / "maia-runtime" / "scripts" / "extract_weights.py"
+
+MANIFEST = "build_manifest.json"
+STORE = ".build"
+MANIFEST_VERSION = 1
+TYPES = ("blitz", "rapid", "blitz_student", "rapid_student")
+LAYOUTS = ("plain", "panel8")
+
+# Packages whose version goes into a step's key, by artifact.
+TOOLS = {
+    "onnx": ("torch",),
+    "fused": ("onnx", "onnxruntime"),
+    "fp16": ("onnx", "onnxconverter-common"),
+    "int8": ("onnx", "onnxruntime"),
+    "weights": ("numpy", "torch"),
+}
+CHECK_BATCHES = (1, 64)
+
+
+@dataclass
+class Step:
+    name: str                    # "{type}/{artifact}"
+    artifact: str                # key into TOOLS
+    script: Path
+    args: list[str]              # "{stage}" is the step's scratch directory
+    inputs: dict[str, Path]      # name staged in the scratch dir → artifact path
+    outputs: list[str]           # files the step leaves in models/
+    deps: list[str] = field(default_factory=list)
+    check: Path | None = None    # fp32 export to compare an ONNX output against
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tool_versions(names) -> dict:
+    versions = {}
+    for name in names:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def checkpoint_path(models_dir: Path, model_type: str) -> Path:
+    return models_dir / (f"{model_type}.pt" if model_type.endswith("_student") else f"{model_type}_model.pt")
+
+
+def fetch_checkpoint(models_dir: Path, model_type: str):
+    """Download an official checkpoint the way export.py does."""
+    sys.path.insert(0, str(ROOT / "maia2_src"))
+    from maia2 import model as maia_model_mod
+
+    maia_model_mod.from_pretrained(type=model_type, device="cpu", save_root=str(models_dir))
+
+
+def plan(models_dir: Path, types, layouts, fused: bool) -> list[Step]:
+    """Steps for `types`, dependencies first."""
+    steps = []
+    for t in types:
+        ckpt = checkpoint_path(models_dir, t)
+        onnx_name = f"{t}_model.onnx"
+        onnx_deps = []
+        if not t.endswith("_student"):
+            steps.append(Step(
+                f"{t}/onnx", "onnx", ROOT / "export.py",
+                ["--type", t, "--out-dir", "{stage}"],
+                {f"{t}_model.pt": ckpt},
+                [onnx_name, f"{t}_meta.json", "moves.json", "elo_dict.json"],
+            ))
+            onnx_deps = [f"{t}/onnx"]
+        export = models_dir / onnx_name
+        fused_name = f"{t}_model.fused.onnx"
+        steps.append(Step(
+            f"{t}/fused", "fused", ROOT / "fuse.py",
+            ["--type", t, "--models-dir", "{stage}", "--batch-sizes", "1"],
+            {onnx_name: export}, [fused_name, f"{t}_fused.json"], onnx_deps, check=export,
+        ))
+        src_name, src_deps = (fused_name, [f"{t}/fused"]) if fused else (onnx_name, onnx_deps)
+        for artifact, script in (("fp16", "to_fp16.py"), ("int8", "quantize.py")):
+            steps.append(Step(
+                f"{t}/{artifact}", artifact, ROOT / script,
+                ["--type", t, "--models-dir", "{stage}"] + (["--fused"] if fused else []),
+                {src_name: models_dir / src_name}, [f"{t}_model.{artifact}.onnx"], src_deps, check=export,
+            ))
+        for layout in layouts:
+            out = f"{t}_weights{'' if layout == 'plain' else '.' + layout}.bin"
+            steps.append(Step(
+                f"{t}/weights.{layout}", "weights", EXTRACT_WEIGHTS,
+                ["--checkpoint", "{stage}/checkpoint.pt", "--layout", layout, "--out", f"{{stage}}/{out}"],
+                {"checkpoint.pt": ckpt}, [out, Path(out).with_suffix(".json").name],
+            ))
+    return steps
+
+
+class Builder:
+    def __init__(self, models_dir: Path, steps: list[Step], jobs: int, force=(), dry_run: bool = False):
+        self.models_dir = models_dir
+        self.store = models_dir / STORE
+        self.steps = steps
+        self.jobs = jobs
+        self.force = force
+        self.dry_run = dry_run
+        self.manifest_path = models_dir / MANIFEST
+        self.manifest = {"version": MANIFEST_VERSION, "sources": {}, "steps": {}}
+        if self.manifest_path.exists():
+            previous = json.loads(self.manifest_path.read_text())
+            if previous.get("version") == MANIFEST_VERSION:
+                self.manifest = previous
+        self.producers = {models_dir / name: step for step in steps for name in step.outputs}
+        self.status: dict[str, str] = {}
+
+    # ─── hashing ──────────────────────────────────────────────────────────
+
+    def source_hash(self, path: Path) -> str | None:
+        """sha256 of a file no step produces, cached by (size, mtime)."""
+        if not path.exists():
+            return None
+        stat = path.stat()
+        cached = self.manifest["sources"].get(str(path))
+        if cached and cached["bytes"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        digest = sha256_file(path)
+        self.manifest["sources"][str(path)] = {"bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                               "sha256": digest}
+        return digest
+
+    def input_hash(self, path: Path) -> str | None:
+        producer = self.producers.get(path)
+        if producer is None:
+            return self.source_hash(path)
+        if self.status.get(producer.name) not in ("up to date", "restored", "built"):
+            return None
+        return self.manifest["steps"][producer.name]["outputs"][path.name]["sha256"]
+
+    def key(self, step: Step) -> tuple[str | None, dict]:
+        """(key, input hashes); key is None while an input is still to be built."""
+        inputs = {name: self.input_hash(path) for name, path in step.inputs.items()}
+        if None in inputs.values():
+            return None, inputs
+        payload = {
+            "version": MANIFEST_VERSION,
+            "step": step.name,
+            "script": sha256_file(step.script),
+            "args": step.args,
+            "inputs": inputs,
+            "tools": tool_versions(TOOLS[step.artifact]),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32], inputs
+
+    # ─── up to date / restore / build ─────────────────────────────────────
+
+    def up_to_date(self, step: Step, key: str) -> bool:
+        record = self.manifest["steps"].get(step.name)
+        if not record or record["key"] != key:
+            return False
+        for name, out in record["outputs"].items():
+            path = self.models_dir / name
+            if not path.exists() or path.stat().st_size != out["bytes"]:
+                return False
+        return True
+
+    def restore(self, step: Step, key: str) -> bool:
+        entry = self.store / key
+        record_path = entry / "step.json"
+        if not record_path.exists():
+            return False
+        record = json.loads(record_path.read_text())
+        for name, out in record["outputs"].items():
+            if not (entry / name).exists() or sha256_file(entry / name) != out["sha256"]:
+                print(f"  {step.name}: store entry {key} was modified, rebuilding", file=sys.stderr)
+                shutil.rmtree(entry)
+                return False
+        for name in record["outputs"]:
+            place(entry / name, self.models_dir / name)
+        self.manifest["steps"][step.name] = record
+        return True
+
+    def build(self, step: Step, key: str, inputs: dict) -> dict:
+        """Run the step's script in a scratch dir and move its outputs into the store."""
+        stage = self.store / f"tmp-{key}"
+        shutil.rmtree(stage, ignore_errors=True)
+        stage.mkdir(parents=True)
+        for name, path in step.inputs.items():
+            if not path.exists():
+                raise FileNotFoundError(f"missing input: {path}")
+            (stage / name).symlink_to(path.resolve())
+        cmd = [sys.executable, str(step.script)] + [a.replace("{stage}", str(stage)) for a in step.args]
+        t0 = time.perf_counter()
+        with open(stage / "build.log", "w") as log:
+            log.write(" ".join(cmd) + "\n\n")
+            log.flush()
+            result = subprocess.run(cmd, cwd=step.script.parent, stdout=log, stderr=subprocess.STDOUT)
+        seconds = time.perf_counter() - t0
+        if result.returncode != 0:
+            tail = (stage / "build.log").read_text().splitlines()[-15:]
+            raise RuntimeError(f"exit {result.returncode} (log: {stage / 'build.log'})\n    "
+                               + "\n    ".join(tail))
+
+        outputs = {}
+        for name in step.outputs:
+            path = stage / name
+            if not path.exists() or path.is_symlink():
+                raise RuntimeError(f"{step.script.name} did not write {name} (log: {stage / 'build.log'})")
+            outputs[name] = {"bytes": path.stat().st_size, "sha256": sha256_file(path)}
+        record = {
+            "key": key,
+            "script": step.script.name,
+            "args": step.args,
+            "inputs": inputs,
+            "outputs": outputs,
+            "seconds": round(seconds, 1),
+            "built": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        entry = self.store / key
+        shutil.rmtree(entry, ignore_errors=True)
+        entry.mkdir()
+        for name in step.outputs:
+            os.replace(stage / name, entry / name)
+        os.replace(stage / "build.log", entry / "build.log")
+        (entry / "step.json").write_text(json.dumps(record, indent=2) + "\n")
+        shutil.rmtree(stage)
+        for name in step.outputs:
+            place(entry / name, self.models_dir / name)
+        return record
+
+    def run(self) -> bool:
+        """Bring every step up to date; False if any failed."""
+        pending = list(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for step in list(pending):
+                    if any(self.status.get(dep) in (None, "building") for dep in step.deps):
+                        continue
+                    pending.remove(step)
+                    failed = [d for d in step.deps if self.status[d] in ("failed", "skipped")]
+                    if failed:
+                        self.report(step, "skipped", f"needs {', '.join(failed)}")
+                        continue
+                    key, inputs = self.key(step)
+                    forced = any(fnmatch.fnmatch(step.name, pattern) for pattern in self.force)
+                    if key is not None and not forced and self.up_to_date(step, key):
+                        self.report(step, "up to date")
+                    elif key is not None and not forced and self.restore(step, key):
+                        self.report(step, "restored", f"from {STORE}/{key}")
+                        self.save()
+                    elif self.dry_run:
+                        self.report(step, "would build", "" if key else "after its inputs")
+                    elif key is None:
+                        missing = [str(step.inputs[name]) for name, h in inputs.items() if h is None]
+                        self.report(step, "failed", f"missing input: {', '.join(missing)}")
+                    else:
+                        self.report(step, "building")
+                        running[pool.submit(self.build, step, key, inputs)] = step
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    try:
+                        self.manifest["steps"][step.name] = future.result()
+                    except Exception as e:
+                        self.report(step, "failed", str(e))
+                        continue
+                    self.report(step, "built", f"{self.manifest['steps'][step.name]['seconds']:.1f}s")
+                    self.save()
+        return not any(s == "failed" for s in self.status.values())
+
+    def report(self, step: Step, status: str, detail: str = ""):
+        self.status[step.name] = status
+        print(f"  {status:12s} {step.name:26s} {detail}".rstrip(), file=sys.stderr)
+
+    def save(self):
+        self.manifest["updated"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2) + "\n")
+        os.replace(tmp, self.manifest_path)
+
+    # ─── checks ───────────────────────────────────────────────────────────
+
+    def check_all(self, positions: str | None, n: int, seed: int):
+        """Parity / latency for ONNX outputs whose check is missing or stale."""
+        from fuse import ms_per_position, random_feeds
+        from lowrank import load_positions, log_softmax_legal, run_model, score
+
+        feeds, mask, played = random_feeds(max(n, max(CHECK_BATCHES)), seed), None, None
+        data_id = None
+        if positions:
+            feeds, mask, played = load_positions(positions, n, seed)
+            data_id = {"positions": str(Path(positions).resolve()), "n": int(len(played)), "seed": seed}
+        references = {}
+        for step in self.steps:
+            record = self.manifest["steps"].get(step.name)
+            if step.check is None or self.status.get(step.name) not in ("up to date", "restored", "built"):
+                continue
+            out = next(name for name in step.outputs if name.endswith(".onnx"))
+            reference = self.models_dir / step.check.name
+            check_id = {"output": record["outputs"][out]["sha256"], "reference": self.input_hash(reference),
+                        "data": data_id, "batches": list(CHECK_BATCHES)}
+            if record.get("check", {}).get("id") == check_id:
+                continue
+            if reference not in references:
+                references[reference] = run_model(reference, feeds)
+            base, variant = references[reference], run_model(self.models_dir / out, feeds)
+            check = {"id": check_id,
+                     "max_abs_diff": {"policy": float(abs(base[0] - variant[0]).max()),
+                                      "value": float(abs(base[1] - variant[1]).max())}}
+            if mask is not None:
+                check.update(score(base, variant, mask, played))
+                check["match@1_base"] = round(float((log_softmax_legal(base[0], mask).argmax(1) == played).mean()), 4)
+            else:
+                check["agree@1"] = round(float((base[0].argmax(1) == variant[0].argmax(1)).mean()), 4)
+            check["ms_per_position"] = {str(b): round(ms_per_position(self.models_dir / out, feeds, b), 4)
+                                        for b in CHECK_BATCHES}
+            check["reference_ms_per_position"] = {
+                str(b): round(ms_per_position(reference, feeds, b), 4) for b in CHECK_BATCHES}
+            record["check"] = check
+            stored = self.store / record["key"] / "step.json"
+            if stored.exists():  # a later restore brings the check back too
+                stored.write_text(json.dumps(record, indent=2) + "\n")
+            print(f"  checked      {step.name:26s} |Δ| policy {check['max_abs_diff']['policy']:.2e}  "
+                  f"agree@1 {check['agree@1']:.4f}  "
+                  + "  ".join(f"b{b} {check['ms_per_position'][str(b)]:.2f} ms" for b in CHECK_BATCHES),
+                  file=sys.stderr)
+            self.save()
+
+    def gc(self) -> int:
+        """Remove store entries no manifest step points at; returns bytes freed."""
+        keep = {record["key"] for record in self.manifest["steps"].values()}
+        freed = 0
+        for entry in self.store.iterdir() if self.store.exists() else ():
+            if entry.name not in keep:
+                freed += sum(f.stat().st_size for f in entry.rglob("*") if f.is_file() and not f.is_symlink())
+                shutil.rmtree(entry)
+        return freed
+
+
+def place(src: Path, dst: Path):
+    """Point `dst` at `src`'s content: a hard link where possible, else a copy."""
+    if dst.exists() and os.path.samefile(src, dst):
+        return  # already linked (and rename() onto the same inode would be a no-op)
+    tmp = dst.with_name(f".{dst.name}.{src.parent.name}.tmp")  # unique per store entry
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def install(models_dir: Path, dest: Path, types):
+    """Copy the blitz / rapid ONNX variants where the desktop app's model
+    registry (maia-wrapper/src/registry.py) discovers them."""
+    dest.mkdir(parents=True, exist_ok=True)
+    for t in types:
+        if t not in ("blitz", "rapid"):
+            continue
+        for suffix in (".onnx", ".fp16.onnx", ".int8.onnx"):
+            src = models_dir / f"{t}_model{suffix}"
+            if src.exists():
+                shutil.copy2(src, dest / src.name)
+                print(f"  installed    {src.name:26s} → {dest}", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--types", default="blitz,rapid", help=f"comma-separated subset of {','.join(TYPES)}")
+    ap.add_argument("--layouts", default="plain", help=f"weights blob layouts ({','.join(LAYOUTS)})")
+    ap.add_argument("--fused", action="store_true", help="derive fp16 / int8 from the fused graph")
+    ap.add_argument("--models-dir", default=str(ROOT / "models"))
+    ap.add_argument("-j", "--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--force", default="", help="comma-separated step globs to rebuild (e.g. 'blitz/*')")
+    ap.add_argument("--positions", help="packed dataset directory for real-position parity")
+    ap.add_argument("--n", type=int, default=500, help="positions per check")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-check", action="store_true", help="skip the parity / latency checks")
+    ap.add_argument("--dry-run", action="store_true", help="report what would run, build nothing")
+    ap.add_argument("--install", help="copy the blitz / rapid ONNX variants into this directory")
+    ap.add_argument("--gc", action="store_true", help="after building, drop unreferenced store entries")
+    args = ap.parse_args()
+
+    types = [t for t in args.types.split(",") if t]
+    layouts = [l for l in args.layouts.split(",") if l]
+    if set(types) - set(TYPES) or set(layouts) - set(LAYOUTS):
+        raise SystemExit(f"--types ⊆ {','.join(TYPES)}, --layouts ⊆ {','.join(LAYOUTS)}")
+    models_dir = Path(args.models_dir).resolve()
+    models_dir.mkdir(parents=True, exist_ok=True)
+
+    for t in types:
+        if not checkpoint_path(models_dir, t).exists():
+            if t.endswith("_student"):
+                raise SystemExit(f"missing {checkpoint_path(models_dir, t)}: run distill.py train / export first")
+            if args.dry_run:
+                print(f"  would fetch  {checkpoint_path(models_dir, t).name}", file=sys.stderr)
+                continue
+            fetch_checkpoint(models_dir, t)
+        if t.endswith("_student") and not (models_dir / f"{t}_model.onnx").exists():
+            raise SystemExit(f"missing {models_dir / f'{t}_model.onnx'}: run distill.py export first")
+
+    steps = plan(models_dir, types, layouts, args.fused)
+    builder = Builder(models_dir, steps, args.jobs, [p for p in args.force.split(",") if p], args.dry_run)
+    print(f"{len(steps)} steps, {args.jobs} jobs", file=sys.stderr)
+    t0 = time.perf_counter()
+    ok = builder.run()
+    if args.dry_run:
+        return
+    if ok and not args.no_check:
+        builder.check_all(args.positions, args.n, args.seed)
+    builder.save()
+    if args.install:
+        install(models_dir, Path(args.install), types)
+    if args.gc:
+        print(f"  gc           freed {builder.gc() / 1e6:.1f} MB", file=sys.stderr)
+    counts = {}
+    for status in builder.status.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("  " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))
+          + f" in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    if not ok:
+        raise SystemExit("build failed")
+    print(f"✓ {builder.manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
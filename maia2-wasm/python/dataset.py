@@ -0,0 +1,465 @@
+"""
+Packed, memory-mapped position dataset built from PGN.
+
+Every position tool (reference / parity checks, quantization checks, phase
+calibration, benchmarks) used to re-derive positions from hardcoded FENs or
+re-parse SAN. `build` parses PGN once and streams every position into a
+columnar store; `PositionDataset` maps it back zero-copy with NumPy.
+
+Layout — one raw little-endian file per column, one row per position
+(the position *before* the played move):
+
+    pieces.bin      uint64[N, 12]  bitboards: white P N B R Q K, black P N B R Q K
+                                    (python-chess square order, a1 = bit 0)
+    flags.bin       uint8[N]       bit 0: black to move; bits 1-4: castling
+                                    rights WK, WQ, BK, BQ
+    ep.bin          int8[N]        en-passant square when a capture is legal, else -1
+    elo_white.bin   int16[N]       0 when unknown
+    elo_black.bin   int16[N]
+    move.bin        uint16[N]      played move as a Maia vocab index, in the
+                                    model's orientation (mirrored when black
+                                    moves); 0xFFFF if not in the vocab
+    result.bin      int8[N]        game result for white: 1, 0, -1
+    ply.bin         uint16[N]      ply number within the game (0 = first move)
+    game_offsets.bin uint64[G + 1] first row of each game (rows of game g are
+                                    game_offsets[g]:game_offsets[g + 1])
+    meta.json       row/game counts, column dtypes, sources
+
+Usage:
+    python dataset.py build games.pgn [more.pgn.zst ...] --out data/positions
+    python dataset.py info data/positions
+
+For large corpora, `python ingest.py positions ...` builds the same store
+with a process pool and header filters.
+"""
+
+import argparse
+import bz2
+import gzip
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import chess
+import chess.pgn
+import numpy as np
+
+ROOT = Path(__file__).parent.resolve()
+DEFAULT_VOCAB = ROOT.parent.parent / "chessr-next" / "maia-wrapper" / "src" / "move_vocab.json"
+
+FORMAT_VERSION = 2  # v2: ep only when an en passant capture is legal (as in FENs)
+NO_MOVE = 0xFFFF
+
+COLUMNS = {
+    "pieces": ("<u8", (12,)),
+    "flags": ("u1", ()),
+    "ep": ("i1", ()),
+    "elo_white": ("<i2", ()),
+    "elo_black": ("<i2", ()),
+    "move": ("<u2", ()),
+    "result": ("i1", ()),
+    "ply": ("<u2", ()),
+}
+
+FLAG_BLACK = 1
+FLAG_CASTLING = (2, 4, 8, 16)  # WK, WQ, BK, BQ
+
+RESULTS = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+
+# ─── PGN input ────────────────────────────────────────────────────────────
+
+def open_pgn(path) -> io.TextIOBase:
+    """Open a PGN file, transparently decompressing .gz / .bz2 / .zst."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("reading .zst needs `pip install zstandard` (or decompress first)")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def load_vocab(path=DEFAULT_VOCAB) -> tuple[dict, dict]:
+    """(white-view, black-view) UCI → vocab index tables."""
+    moves = json.loads(Path(path).read_text())
+    white = {m: i for i, m in enumerate(moves)}
+    black = {mirror_uci(m): i for i, m in enumerate(moves)}
+    return white, black
+
+
+def mirror_uci(uci: str) -> str:
+    return uci[0] + str(9 - int(uci[1])) + uci[2] + str(9 - int(uci[3])) + uci[4:]
+
+
+def header_elo(value) -> int:
+    try:
+        return max(0, min(int(value), 32767))
+    except (TypeError, ValueError):
+        return 0
+
+
+# ─── Encoding ─────────────────────────────────────────────────────────────
+
+_CASTLING_SQUARES = tuple(chess.BB_SQUARES[sq] for sq in (chess.H1, chess.A1, chess.H8, chess.A8))
+
+
+def _encode_row(board: chess.Board, move: chess.Move, vocab: tuple[dict, dict]) -> tuple:
+    occ_b, occ_w = board.occupied_co  # indexed by colour: BLACK = 0
+    bbs = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    flags = 0 if board.turn == chess.WHITE else FLAG_BLACK
+    cr = board.castling_rights
+    for bit, mask in zip(FLAG_CASTLING, _CASTLING_SQUARES):
+        if cr & mask:
+            flags |= bit
+    # As the FEN has it: python-chess keeps the square after every double push.
+    ep = board.ep_square if board.has_legal_en_passant() else -1
+    table = vocab[0] if board.turn == chess.WHITE else vocab[1]
+    return (*(bb & occ_w for bb in bbs), *(bb & occ_b for bb in bbs),
+            flags, ep, table.get(move.uci(), NO_MOVE))
+
+
+def _game_columns(headers, rows: list[tuple]) -> dict | None:
+    result = RESULTS.get(headers.get("Result"))
+    if result is None or not rows:
+        return None
+    n = len(rows)
+    cols = list(zip(*rows))
+    return {
+        "pieces": np.array(cols[:12], dtype=np.uint64).T.copy(),
+        "flags": np.array(cols[12], dtype=np.uint8),
+        "ep": np.array(cols[13], dtype=np.int8),
+        "elo_white": np.full(n, header_elo(headers.get("WhiteElo")), dtype=np.int16),
+        "elo_black": np.full(n, header_elo(headers.get("BlackElo")), dtype=np.int16),
+        "move": np.array(cols[14], dtype=np.uint16),
+        "result": np.full(n, result, dtype=np.int8),
+        "ply": np.arange(n, dtype=np.uint16),
+    }
+
+
+def encode_game(headers, moves, vocab: tuple[dict, dict], start_fen: str = None) -> dict | None:
+    """Column arrays for one game (None if it has no usable moves/result).
+
+    `moves` are chess.Move objects or UCI strings, played from `start_fen`
+    (standard start if None).
+    """
+    board = chess.Board(start_fen) if start_fen else chess.Board()
+    rows = []
+    for move in moves:
+        if isinstance(move, str):
+            move = chess.Move.from_uci(move)
+        rows.append(_encode_row(board, move, vocab))
+        board.push(move)
+    return _game_columns(headers, rows)
+
+
+class GameVisitor(chess.pgn.BaseVisitor):
+    """Streaming PGN visitor: mainline only, no game tree.
+
+    Encodes each position as its move is parsed (when `vocab` is given) or
+    just collects the moves. `accept(headers)` runs once the tag pairs are
+    read; rejected games are skipped without parsing their movetext.
+    Non-standard variants are always skipped.
+    """
+
+    def __init__(self, vocab: tuple[dict, dict] = None, accept=None):
+        self.vocab = vocab
+        self.accept = accept
+
+    def begin_game(self):
+        self.headers = chess.pgn.Headers({})
+        self.rows, self.moves = [], []
+        self.skipped = self.error = False
+
+    def begin_headers(self):
+        return self.headers
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self):
+        if self.headers.get("Variant", "Standard").lower() not in ("standard", "from position") \
+                or (self.accept is not None and not self.accept(self.headers)):
+            self.skipped = True
+            return chess.pgn.SKIP
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        if self.vocab is not None:
+            self.rows.append(_encode_row(board, move, self.vocab))
+        else:
+            self.moves.append(move)
+
+    def handle_error(self, error):
+        self.error = True
+
+    def columns(self) -> dict | None:
+        return _game_columns(self.headers, self.rows)
+
+    def result(self):
+        return self
+
+
+def read_games(handle, vocab: tuple[dict, dict] = None, accept=None):
+    """Yield a finished GameVisitor per game in a text handle (see GameVisitor)."""
+    while True:
+        game = chess.pgn.read_game(handle, Visitor=lambda: GameVisitor(vocab, accept))
+        if game is None:
+            return
+        yield game
+
+
+def iter_pgn_games(path, vocab):
+    """Yield encoded games from one PGN file, in file order."""
+    with open_pgn(path) as f:
+        for game in read_games(f, vocab):
+            if game.skipped or game.error:
+                continue
+            encoded = game.columns()
+            if encoded is not None:
+                yield encoded
+
+
+def concat_games(games: list[dict]) -> tuple[dict, np.ndarray]:
+    """Stack encoded games into one block of columns plus per-game lengths."""
+    lengths = np.array([len(g["move"]) for g in games], dtype=np.uint64)
+    if not games:
+        return {name: np.zeros((0, *shape), dtype=dt) for name, (dt, shape) in COLUMNS.items()}, lengths
+    return {name: np.concatenate([g[name] for g in games]) for name in COLUMNS}, lengths
+
+
+# ─── Writer ───────────────────────────────────────────────────────────────
+
+class PositionWriter:
+    """Append-only writer; games are buffered and flushed in large blocks."""
+
+    def __init__(self, out_dir, flush_rows: int = 1 << 16):
+        self.out = Path(out_dir)
+        self.out.mkdir(parents=True, exist_ok=True)
+        self._files = {name: open(self.out / f"{name}.bin", "wb") for name in COLUMNS}
+        self._offsets = open(self.out / "game_offsets.bin", "wb")
+        self._offsets.write(np.zeros(1, dtype="<u8").tobytes())
+        self._pending: list[tuple[dict, np.ndarray]] = []
+        self._pending_rows = 0
+        self.pending_games = 0
+        self._flush_rows = flush_rows
+        self.rows = 0
+        self.games = 0
+        self.sources: list[str] = []
+
+    def add_game(self, columns: dict):
+        self.add_block(columns, np.array([len(columns["move"])], dtype=np.uint64))
+
+    def add_block(self, columns: dict, lengths: np.ndarray):
+        """Append several consecutive games at once (see `concat_games`)."""
+        self._pending.append((columns, np.asarray(lengths, dtype=np.uint64)))
+        self._pending_rows += len(columns["move"])
+        self.pending_games += len(lengths)
+        if self._pending_rows >= self._flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        for name, (dtype, _) in COLUMNS.items():
+            block = np.concatenate([cols[name] for cols, _ in self._pending]).astype(dtype, copy=False)
+            self._files[name].write(block.tobytes())
+        lengths = np.concatenate([lens for _, lens in self._pending])
+        self._offsets.write((self.rows + np.cumsum(lengths)).astype("<u8").tobytes())
+        self.rows += int(lengths.sum())
+        self.games += len(lengths)
+        self._pending, self._pending_rows, self.pending_games = [], 0, 0
+
+    def close(self, extra_meta: dict = None):
+        self.flush()
+        for f in (*self._files.values(), self._offsets):
+            f.close()
+        meta = {
+            "version": FORMAT_VERSION,
+            "rows": self.rows,
+            "games": self.games,
+            "columns": {name: {"dtype": dt, "shape": list(shape)} for name, (dt, shape) in COLUMNS.items()},
+            "sources": self.sources,
+            **(extra_meta or {}),
+        }
+        (self.out / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+# ─── Reader ───────────────────────────────────────────────────────────────
+
+class PositionDataset:
+    """Read-only, memory-mapped view of a dataset directory.
+
+    Columns are attributes (`ds.pieces`, `ds.move`, ...) backed by np.memmap,
+    so opening is instant and only touched pages are read.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        if self.meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path}: dataset format v{self.meta['version']}, expected v{FORMAT_VERSION}")
+        n = self.meta["rows"]
+        for name, spec in self.meta["columns"].items():
+            shape = (n, *spec["shape"])
+            setattr(self, name, self._map(f"{name}.bin", spec["dtype"], shape))
+        self.game_offsets = self._map("game_offsets.bin", "<u8", (self.meta["games"] + 1,))
+
+    def _map(self, filename, dtype, shape):
+        if not shape[0]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path / filename, dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def num_games(self) -> int:
+        return self.meta["games"]
+
+    def game_rows(self, g: int) -> slice:
+        return slice(int(self.game_offsets[g]), int(self.game_offsets[g + 1]))
+
+    def game_of(self, rows) -> np.ndarray:
+        """Game index of each row."""
+        return np.searchsorted(self.game_offsets, rows, side="right") - 1
+
+    def model_inputs(self, rows) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(boards [n, 18, 8, 8] float32, elos_self, elos_oppo) for the Maia model.
+
+        Vectorized over rows; matches the wrapper's encode_position (board
+        mirrored when black is to move) and Elo categories.
+        """
+        pieces = np.ascontiguousarray(self.pieces[rows], dtype="<u8")
+        flags = np.asarray(self.flags[rows])
+        ep = np.asarray(self.ep[rows]).astype(np.int64)
+        n = len(pieces)
+        black = (flags & FLAG_BLACK).astype(bool)
+
+        # Each uint64 is 8 bytes = 8 ranks; unpack bits (file order) per byte.
+        planes = np.unpackbits(pieces.view(np.uint8).reshape(n, 12, 8, 1), axis=3, bitorder="little")
+        planes = planes.reshape(n, 12, 8, 8).astype(np.float32)
+        # Mirrored view for black to move: swap colours, flip ranks.
+        planes[black] = planes[black][:, [6, 7, 8, 9, 10, 11, 0, 1, 2, 3, 4, 5], ::-1]
+
+        boards = np.zeros((n, 18, 8, 8), dtype=np.float32)
+        boards[:, :12] = planes
+        boards[:, 12] = 1.0
+        castling = np.stack([(flags & bit) > 0 for bit in FLAG_CASTLING], axis=1)  # WK WQ BK BQ
+        castling[black] = castling[black][:, [2, 3, 0, 1]]
+        boards[:, 13:17] = castling[:, :, None, None]
+        has_ep = ep >= 0
+        ep_rank = np.where(black, 7 - (ep >> 3), ep >> 3)
+        idx = np.nonzero(has_ep)[0]
+        boards[idx, 17, ep_rank[idx], (ep & 7)[idx]] = 1.0
+
+        elo_w = np.asarray(self.elo_white[rows]).astype(np.int64)
+        elo_b = np.asarray(self.elo_black[rows]).astype(np.int64)
+        elos_self = elo_category(np.where(black, elo_b, elo_w))
+        elos_oppo = elo_category(np.where(black, elo_w, elo_b))
+        return boards, elos_self, elos_oppo
+
+    def legal_mask(self, rows, vocab: tuple[dict, dict] = None) -> np.ndarray:
+        """[n, vocab size] bool: legal moves of each row, in model orientation
+        (the mask the engine applies before its softmax)."""
+        white, black = vocab or load_vocab()
+        rows = np.asarray(rows)
+        mask = np.zeros((len(rows), len(white)), dtype=bool)
+        for i, row in enumerate(rows.tolist()):
+            board = self.board(row)
+            table = white if board.turn == chess.WHITE else black
+            idx = [table[m.uci()] for m in board.legal_moves if m.uci() in table]
+            mask[i, idx] = True
+        return mask
+
+    def board(self, row: int) -> chess.Board:
+        """Rebuild a python-chess board (for spot checks; slow)."""
+        board = chess.Board.empty()
+        for i, bb in enumerate(self.pieces[row].tolist()):
+            color = chess.WHITE if i < 6 else chess.BLACK
+            for sq in chess.scan_forward(bb):
+                board.set_piece_at(sq, chess.Piece(i % 6 + 1, color))
+        flags = int(self.flags[row])
+        board.turn = chess.BLACK if flags & FLAG_BLACK else chess.WHITE
+        rights = 0
+        for bit, sq in zip(FLAG_CASTLING, (chess.H1, chess.A1, chess.H8, chess.A8)):
+            if flags & bit:
+                rights |= chess.BB_SQUARES[sq]
+        board.castling_rights = rights
+        ep = int(self.ep[row])
+        board.ep_square = ep if ep >= 0 else None
+        board.fullmove_number = int(self.ply[row]) // 2 + 1
+        return board
+
+
+def elo_category(elo: np.ndarray) -> np.ndarray:
+    """Vectorized Maia Elo bucket (0: <1100, 1-9: 100-wide, 10: >=2000)."""
+    return np.clip((np.asarray(elo) - 1100) // 100 + 1, 0, 10).astype(np.int64)
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────
+
+def build(pgns, out, vocab_path=DEFAULT_VOCAB, max_games: int = None):
+    vocab = load_vocab(vocab_path)
+    writer = PositionWriter(out)
+    t0 = time.perf_counter()
+    for pgn in pgns:
+        writer.sources.append(str(pgn))
+        for columns in iter_pgn_games(pgn, vocab):
+            writer.add_game(columns)
+            done = writer.games + writer.pending_games
+            if done % 10000 == 0:
+                print(f"  {done:,} games…", file=sys.stderr)
+            if max_games and done >= max_games:
+                break
+        if max_games and writer.games + writer.pending_games >= max_games:
+            break
+    writer.close()
+    dt = time.perf_counter() - t0
+    print(f"✓ {out}: {writer.games:,} games, {writer.rows:,} positions in {dt:.1f}s "
+          f"({writer.games / max(dt, 1e-9):,.0f} games/s)")
+
+
+def info(path):
+    ds = PositionDataset(path)
+    print(json.dumps({k: v for k, v in ds.meta.items() if k != "columns"}, indent=2))
+    if len(ds):
+        elos = np.concatenate([ds.elo_white[ds.elo_white > 0], ds.elo_black[ds.elo_black > 0]])
+        if len(elos):
+            print(f"Elo: median {int(np.median(elos))}, range {elos.min()}–{elos.max()}")
+        print(f"Moves outside vocab: {int((ds.move == NO_MOVE).sum())}")
+        print(f"Results (white): +{int((ds.result[ds.game_offsets[:-1]] == 1).sum())} "
+              f"={int((ds.result[ds.game_offsets[:-1]] == 0).sum())} "
+              f"-{int((ds.result[ds.game_offsets[:-1]] == -1).sum())}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="PGN → packed dataset")
+    b.add_argument("pgn", nargs="+")
+    b.add_argument("--out", required=True)
+    b.add_argument("--vocab", default=str(DEFAULT_VOCAB))
+    b.add_argument("--max-games", type=int)
+    i = sub.add_parser("info", help="summary of a dataset")
+    i.add_argument("path")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        build(args.pgn, args.out, args.vocab, args.max_games)
+    else:
+        info(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Distil Maia 2 into a small Elo-conditioned student for bulk analysis.
+
+The student is the same MAIA2Model architecture at a fraction of the size
+(default: 2 ResNet blocks at 64 channels, one 256-wide transformer block —
+~2 M weights against Maia 2's ~23 M), so it keeps the I/O contract (boards
+[N, 18, 8, 8], elos_self / elos_oppo bucket indices, 1880-move policy logits
+and the value head) and goes through the same export.py / quantize.py /
+extract_weights.py path as the full model.
+
+Three steps:
+
+    record  run the teacher (MaiaEngine, any provider) over positions of a
+            packed dataset (dataset.py / ingest.py) and store its targets:
+            the top-k legal moves with their probabilities (renormalized
+            over the k kept) and the value head
+    train   fit the student on CPU with torch: soft cross-entropy against
+            the teacher's policy plus MSE against its value, optionally
+            mixed with the played move. Games are split train / validation
+            by index; the checkpoint with the best validation KL is kept
+    export  student checkpoint → models/{type}_student_model.onnx
+            (export.py), then score it against the teacher through
+            MaiaEngine on held-out positions (lowrank.py's metrics)
+
+Teacher record — one raw little-endian file per column, like the position
+store:
+
+    rows.bin        uint64[N]      dataset row
+    elos_self.bin   uint8[N]       Elo buckets the teacher was queried with
+    elos_oppo.bin   uint8[N]
+    top_idx.bin     uint16[N, K]   teacher's K most likely legal moves
+    top_prob.bin    float32[N, K]  their probabilities, renormalized (0 = padding)
+    value.bin       float32[N]     teacher value head
+    meta.json       rows, K, teacher model, dataset, Elo mode
+
+Usage:
+    python distill.py record --positions data/positions --out data/teacher \\
+        --model ../../chessr-next/maia-wrapper/model.onnx --n 500000
+    python distill.py train --positions data/positions --teacher data/teacher --type blitz
+    python distill.py export --positions data/positions --teacher data/teacher --type blitz
+    python quantize.py --type blitz_student
+    python ../maia-runtime/scripts/extract_weights.py \\
+        --checkpoint models/blitz_student.pt --layout panel8 --out models/blitz_student_weights.bin
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from dataset import NO_MOVE, PositionDataset, load_vocab
+
+ROOT = Path(__file__).parent.resolve()
+WRAPPER = ROOT.parent.parent / "chessr-next" / "maia-wrapper"
+sys.path.insert(0, str(ROOT / "maia2_src"))
+
+RECORD_VERSION = 1
+TOP_K = 16
+NUM_ELO_BUCKETS = 11
+
+# Student shape (MAIA2Model cfg fields; heads / dim_head are fixed by the
+# architecture at 16 × 64).
+STUDENT = {
+    "input_channels": 18,
+    "dim_cnn": 64,
+    "dim_vit": 256,
+    "num_blocks_cnn": 2,
+    "num_blocks_vit": 1,
+    "vit_length": 8,
+    "elo_dim": 64,
+}
+
+COLUMNS = {
+    "rows": ("<u8", ()),
+    "elos_self": ("u1", ()),
+    "elos_oppo": ("u1", ()),
+    "top_idx": ("<u2", "k"),
+    "top_prob": ("<f4", "k"),
+    "value": ("<f4", ()),
+}
+
+
+def open_engine(model: str, provider: str = "auto", threads: int = 0):
+    sys.path.insert(0, str(WRAPPER))
+    from src.engine import EngineConfig, MaiaEngine
+
+    return MaiaEngine(model, EngineConfig(provider=provider, threads=threads, model_cache=False))
+
+
+def run_engine(engine, feeds, batch: int = 256) -> tuple[np.ndarray, np.ndarray, float]:
+    """(policy logits, values, ms per position) through `engine.infer`."""
+    boards, elos_self, elos_oppo = feeds
+    logits, values = [], []
+    t0 = time.perf_counter()
+    for s in range(0, len(boards), batch):
+        out = engine.infer(boards[s:s + batch], elos_self[s:s + batch], elos_oppo[s:s + batch])
+        logits.append(out[0])
+        values.append(np.asarray(out[1]).reshape(-1))
+    ms = (time.perf_counter() - t0) * 1000 / max(1, len(boards))
+    return np.concatenate(logits), np.concatenate(values), ms
+
+
+def teacher_targets(logits: np.ndarray, mask: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(top-k vocab indices, their probabilities renormalized over k, mass
+    the k kept) of the legal-move softmax."""
+    masked = np.where(mask, logits.astype(np.float64), -np.inf)
+    probs = np.exp(masked - masked.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    top_p = np.take_along_axis(probs, top, axis=1)
+    order = np.argsort(-top_p, axis=1)
+    top, top_p = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_p, order, axis=1)
+    mass = top_p.sum(axis=1)
+    return top.astype(np.uint16), (top_p / mass[:, None]).astype(np.float32), mass
+
+
+class TeacherRecord:
+    """Memory-mapped teacher targets written by `record`."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        if self.meta["version"] != RECORD_VERSION:
+            raise ValueError(f"{path}: teacher record v{self.meta['version']}, expected v{RECORD_VERSION}")
+        n, k = self.meta["rows"], self.meta["k"]
+        for name, (dtype, shape) in COLUMNS.items():
+            full = (n, k) if shape == "k" else (n,)
+            setattr(self, name, np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="r", shape=full))
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def split(self, ds: PositionDataset, val_every: int) -> tuple[np.ndarray, np.ndarray]:
+        """(train, validation) record indices; every `val_every`-th game is held out."""
+        held_out = ds.game_of(np.asarray(self.rows)) % val_every == 0
+        return np.nonzero(~held_out)[0], np.nonzero(held_out)[0]
+
+
+# ─── record ───────────────────────────────────────────────────────────────
+
+def record(args):
+    ds = PositionDataset(args.positions)
+    rng = np.random.default_rng(args.seed)
+    rows = np.nonzero(np.asarray(ds.move) != NO_MOVE)[0]
+    if args.n and args.n < len(rows):
+        rows = np.sort(rng.choice(rows, args.n, replace=False))
+    if not len(rows):
+        raise SystemExit(f"{args.positions}: no positions with a vocabulary move")
+
+    print(f"Teacher {args.model} ({args.provider})", file=sys.stderr)
+    engine = open_engine(args.model, args.provider, args.threads)
+    vocab = load_vocab()
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    files = {name: open(out / f"{name}.bin", "wb") for name in COLUMNS}
+    kept_mass = 0.0
+    t0 = time.perf_counter()
+    try:
+        for s in range(0, len(rows), args.batch):
+            batch = rows[s:s + args.batch]
+            boards, elos_self, elos_oppo = ds.model_inputs(batch)
+            if args.elo == "uniform":
+                elos_self = rng.integers(0, NUM_ELO_BUCKETS, len(batch))
+                elos_oppo = rng.integers(0, NUM_ELO_BUCKETS, len(batch))
+            logits, values = engine.infer(boards, elos_self, elos_oppo)
+            top_idx, top_prob, mass = teacher_targets(logits, ds.legal_mask(batch, vocab), args.k)
+            kept_mass += float(mass.sum())
+            columns = {
+                "rows": batch, "elos_self": elos_self, "elos_oppo": elos_oppo,
+                "top_idx": top_idx, "top_prob": top_prob, "value": np.asarray(values).reshape(-1),
+            }
+            for name, (dtype, _) in COLUMNS.items():
+                files[name].write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+            done = s + len(batch)
+            if done // args.batch % 50 == 0 or done == len(rows):
+                rate = done / (time.perf_counter() - t0)
+                print(f"  {done:,}/{len(rows):,} positions ({rate:,.0f}/s)", file=sys.stderr)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        "version": RECORD_VERSION,
+        "rows": int(len(rows)),
+        "k": args.k,
+        "kept_mass": round(kept_mass / len(rows), 4),
+        "elo": args.elo,
+        "teacher": {"model": str(Path(args.model).resolve()), "provider": args.provider},
+        "dataset": str(Path(args.positions).resolve()),
+        "seed": args.seed,
+    }
+    (out / "meta.json").write_text(json.dumps(meta, indent=2) + "\n")
+    print(f"✓ {out}: {len(rows):,} positions, top-{args.k} keeps {meta['kept_mass'] * 100:.1f}% "
+          f"of the teacher's mass")
+
+
+# ─── train ────────────────────────────────────────────────────────────────
+
+def student_cfg(args=None, base: dict = None) -> SimpleNamespace:
+    fields = dict(base or STUDENT)
+    for name in STUDENT:
+        value = getattr(args, name, None) if args is not None else None
+        if value is not None:
+            fields[name] = value
+    return SimpleNamespace(**fields)
+
+
+def build_student(cfg):
+    from maia2.main import MAIA2Model
+    from maia2.utils import create_elo_dict, get_all_possible_moves
+
+    return MAIA2Model(len(get_all_possible_moves()), create_elo_dict(), cfg)
+
+
+def load_batch(rec: TeacherRecord, ds: PositionDataset, idx: np.ndarray):
+    """Torch tensors (boards, elos_self, elos_oppo, top_idx, top_prob, value, played)."""
+    import torch
+
+    rows = np.asarray(rec.rows[idx])
+    boards, _, _ = ds.model_inputs(rows)
+    arrays = (
+        boards,
+        np.asarray(rec.elos_self[idx], dtype=np.int64),
+        np.asarray(rec.elos_oppo[idx], dtype=np.int64),
+        np.asarray(rec.top_idx[idx], dtype=np.int64),
+        np.array(rec.top_prob[idx], dtype=np.float32),
+        np.array(rec.value[idx], dtype=np.float32),
+        np.asarray(ds.move[rows], dtype=np.int64),
+    )
+    return tuple(torch.from_numpy(a) for a in arrays)
+
+
+def losses(model, batch, hard_weight: float, value_weight: float):
+    """(total loss, {policy KL, value MSE, played-move NLL}) of one batch."""
+    import torch.nn.functional as F
+
+    boards, elos_self, elos_oppo, top_idx, top_prob, value, played = batch
+    logits, _, value_pred = model(boards, elos_self, elos_oppo)
+    logp = F.log_softmax(logits, dim=1)
+    cross = -(top_prob * logp.gather(1, top_idx)).sum(dim=1).mean()
+    entropy = -(top_prob * top_prob.clamp_min(1e-12).log()).sum(dim=1).mean()
+    value_mse = F.mse_loss(value_pred.reshape(-1), value)
+    nll = F.nll_loss(logp, played)
+    total = cross + value_weight * value_mse
+    if hard_weight:
+        total = total + hard_weight * nll
+    return total, {"kl": float(cross - entropy), "value_mse": float(value_mse), "nll": float(nll)}
+
+
+def evaluate(model, rec, ds, idx: np.ndarray, batch: int) -> dict:
+    """Validation KL / value MSE / played-move NLL, plus agreement with the
+    teacher's top move among its recorded top k."""
+    import torch
+
+    model.eval()
+    sums, agree = {}, 0
+    with torch.no_grad():
+        for s in range(0, len(idx), batch):
+            tensors = load_batch(rec, ds, idx[s:s + batch])
+            _, parts = losses(model, tensors, 0.0, 1.0)
+            m = len(tensors[0])
+            for key, value in parts.items():
+                sums[key] = sums.get(key, 0.0) + value * m
+            logits = model(*tensors[:3])[0]
+            top_idx = tensors[3]
+            agree += int((logits.gather(1, top_idx).argmax(dim=1) == 0).sum())
+    n = max(1, len(idx))
+    result = {key: round(value / n, 5) for key, value in sums.items()}
+    result["agree@1"] = round(agree / n, 4)
+    return result
+
+
+def train(args):
+    import torch
+
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.threads or os.cpu_count() or 1)
+    ds = PositionDataset(args.positions)
+    rec = TeacherRecord(args.teacher)
+    train_idx, val_idx = rec.split(ds, args.val_every)
+    if not len(train_idx) or not len(val_idx):
+        raise SystemExit(f"{args.teacher}: too few games to split (--val-every {args.val_every})")
+    val_idx = val_idx[:args.val_max]
+
+    cfg = student_cfg(args)
+    model = build_student(cfg)
+    params = sum(p.numel() for p in model.parameters())
+    print(f"Student {vars(cfg)}: {params / 1e6:.2f} M weights; "
+          f"{len(train_idx):,} train / {len(val_idx):,} validation positions", file=sys.stderr)
+
+    steps = args.epochs * math.ceil(len(train_idx) / args.batch)
+    opt = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    sched = torch.optim.lr_scheduler.OneCycleLR(opt, max_lr=args.lr, total_steps=steps, pct_start=0.05)
+    rng = np.random.default_rng(args.seed)
+    out = Path(args.out or ROOT / "models" / f"{args.type}_student.pt")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    best, history = math.inf, []
+
+    for epoch in range(1, args.epochs + 1):
+        model.train()
+        perm = rng.permutation(train_idx)
+        t0 = time.perf_counter()
+        running = {}
+        for step, s in enumerate(range(0, len(perm), args.batch), 1):
+            batch = load_batch(rec, ds, np.sort(perm[s:s + args.batch]))
+            loss, parts = losses(model, batch, args.hard_weight, args.value_weight)
+            opt.zero_grad(set_to_none=True)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            opt.step()
+            sched.step()
+            for key, value in parts.items():
+                running[key] = 0.98 * running.get(key, value) + 0.02 * value
+            if step % args.log_every == 0:
+                rate = s / (time.perf_counter() - t0)
+                print(f"  epoch {epoch} step {step}: KL {running['kl']:.4f}  "
+                      f"value {running['value_mse']:.4f}  ({rate:,.0f} positions/s)", file=sys.stderr)
+
+        val = evaluate(model, rec, ds, val_idx, args.batch)
+        val["epoch"] = epoch
+        history.append(val)
+        print(f"  epoch {epoch}: validation KL {val['kl']:.4f}  agree@1 {val['agree@1']:.4f}  "
+              f"value MSE {val['value_mse']:.4f}", file=sys.stderr)
+        if val["kl"] < best:
+            best = val["kl"]
+            torch.save({
+                "model_state_dict": model.state_dict(),
+                "cfg": vars(cfg),
+                "epoch": epoch,
+                "validation": val,
+                "history": history,
+                "teacher": rec.meta,
+            }, out)
+
+    print(f"✓ {out} (best validation KL {best:.4f})")
+
+
+# ─── export ───────────────────────────────────────────────────────────────
+
+def export(args):
+    import torch
+    from export import export_onnx, verify_onnx
+    from lowrank import score
+
+    models_dir = Path(args.models_dir)
+    ckpt_path = Path(args.checkpoint or models_dir / f"{args.type}_student.pt")
+    ckpt = torch.load(ckpt_path, map_location="cpu", weights_only=False)
+    cfg = student_cfg(base=ckpt["cfg"])
+    model = build_student(cfg)
+    model.load_state_dict(ckpt["model_state_dict"])
+    model.eval()
+
+    onnx_out = models_dir / f"{args.type}_student_model.onnx"
+    print(f"Exporting {ckpt_path} → {onnx_out}", file=sys.stderr)
+    export_onnx(model, str(onnx_out), args.opset)
+    verify_onnx(model, str(onnx_out))
+
+    ds = PositionDataset(args.positions)
+    rec = TeacherRecord(args.teacher)
+    _, val_idx = rec.split(ds, args.val_every)
+    val_idx = val_idx[:args.n]
+    rows = np.asarray(rec.rows[val_idx])
+    boards, _, _ = ds.model_inputs(rows)
+    feeds = (boards, np.asarray(rec.elos_self[val_idx], dtype=np.int64),
+             np.asarray(rec.elos_oppo[val_idx], dtype=np.int64))
+    mask = ds.legal_mask(rows)
+    played = np.asarray(ds.move[rows], dtype=np.int64)
+
+    teacher_model = args.teacher_model or rec.meta["teacher"]["model"]
+    print(f"Scoring on {len(rows):,} held-out positions against {teacher_model}", file=sys.stderr)
+    base = run_engine(open_engine(teacher_model, args.provider, args.threads), feeds)
+    student = run_engine(open_engine(str(onnx_out), args.provider, args.threads), feeds)
+    report = {
+        "type": args.type,
+        "cfg": vars(cfg),
+        "params": sum(p.numel() for p in model.parameters()),
+        "epoch": ckpt.get("epoch"),
+        "teacher": teacher_model,
+        "positions": int(len(rows)),
+        "teacher_ms_per_position": round(base[2], 3),
+        **score(base, student, mask, played),
+        "onnx": onnx_out.name,
+    }
+    report_path = models_dir / f"{args.type}_student.json"
+    report_path.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"  match@1 {report['match@1']:.4f} (teacher {report['match@1_base']:.4f})  "
+          f"agree@1 {report['agree@1']:.4f}  KL {report['kl']:.4f}  "
+          f"{report['ms_per_position']:.2f} vs {report['teacher_ms_per_position']:.2f} ms/position",
+          file=sys.stderr)
+    print(f"✓ {onnx_out}, {report_path}")
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("record", help="teacher targets over a packed dataset")
+    r.add_argument("--positions", required=True, help="packed dataset directory")
+    r.add_argument("--out", required=True, help="teacher record directory")
+    r.add_argument("--model", default=str(WRAPPER / "model.onnx"), help="teacher .onnx")
+    r.add_argument("--provider", default="auto", help="MaiaEngine provider (auto, cpu, native, …)")
+    r.add_argument("--threads", type=int, default=0)
+    r.add_argument("--n", type=int, default=0, help="positions to sample (0 = all)")
+    r.add_argument("--k", type=int, default=TOP_K, help="teacher moves kept per position")
+    r.add_argument("--elo", choices=["dataset", "uniform"], default="dataset",
+                   help="query the teacher with the players' buckets or uniformly random ones")
+    r.add_argument("--batch", type=int, default=256)
+    r.add_argument("--seed", type=int, default=0)
+
+    t = sub.add_parser("train", help="fit the student on CPU (needs torch)")
+    t.add_argument("--positions", required=True)
+    t.add_argument("--teacher", required=True, help="teacher record directory")
+    t.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
+    t.add_argument("--out", help="checkpoint (default: models/{type}_student.pt)")
+    for name, default in STUDENT.items():
+        if name != "input_channels":
+            t.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name,
+                           help=f"student {name} (default {default})")
+    t.add_argument("--epochs", type=int, default=4)
+    t.add_argument("--batch", type=int, default=256)
+    t.add_argument("--lr", type=float, default=2e-3)
+    t.add_argument("--weight-decay", type=float, default=1e-4)
+    t.add_argument("--hard-weight", type=float, default=0.0,
+                   help="weight of the played-move cross-entropy next to the teacher's")
+    t.add_argument("--value-weight", type=float, default=1.0)
+    t.add_argument("--val-every", type=int, default=20, help="hold out every n-th game")
+    t.add_argument("--val-max", type=int, default=20000, help="validation positions per epoch")
+    t.add_argument("--threads", type=int, default=0, help="torch threads (0 = all cores)")
+    t.add_argument("--log-every", type=int, default=200)
+    t.add_argument("--seed", type=int, default=0)
+
+    e = sub.add_parser("export", help="student → ONNX, scored against the teacher")
+    e.add_argument("--positions", required=True)
+    e.add_argument("--teacher", required=True, help="teacher record directory")
+    e.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
+    e.add_argument("--models-dir", default=str(ROOT / "models"))
+    e.add_argument("--checkpoint", help="default: {models-dir}/{type}_student.pt")
+    e.add_argument("--teacher-model", help="default: the model the record was made with")
+    e.add_argument("--provider", default="cpu")
+    e.add_argument("--threads", type=int, default=0)
+    e.add_argument("--opset", type=int, default=17)
+    e.add_argument("--n", type=int, default=5000, help="held-out positions to score on")
+    e.add_argument("--val-every", type=int, default=20)
+    args = ap.parse_args()
+
+    {"record": record, "train": train, "export": export}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 Maia 2 → ONNX export.
 
 Loads the official Maia 2 PyTorch checkpoint, strips DataParallel,
-and exports to ONNX with dynamic batch dimension.
+and exports to ONNX with dynamic batch dimension. `export_onnx` is also
+used by distill.py for student models, so every variant has the same
+input / output names.
 
 Usage:
     python export.py --type blitz
@@ -30,34 +32,14 @@ from maia2.utils import (  # noqa: E402
 from maia2.main import MAIA2Model  # noqa: E402
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
-    ap.add_argument("--out-dir", default=str(ROOT / "models"))
-    ap.add_argument("--opset", type=int, default=17)
-    args = ap.parse_args()
-
-    os.makedirs(args.out_dir, exist_ok=True)
-
-    print(f"[1/4] Downloading {args.type} checkpoint via maia2.from_pretrained …")
-    model = maia_model_mod.from_pretrained(type=args.type, device="cpu",
-                                           save_root=args.out_dir)
-    model.eval()
-
-    all_moves = get_all_possible_moves()
-    elo_dict = create_elo_dict()
-    print(f"      moves={len(all_moves)}  elo_buckets={len(elo_dict)}")
-
+def export_onnx(model, out_path, opset: int = 17):
+    """Export a MAIA2Model with the runtime's I/O contract and a dynamic batch."""
     # Dummy inputs matching MAIA2Model.forward signature.
-    cfg = model.cfg
-    in_ch = cfg.input_channels
+    in_ch = model.cfg.input_channels
     boards = torch.zeros(1, in_ch, 8, 8, dtype=torch.float32)
     elos_self = torch.zeros(1, dtype=torch.long)
     elos_oppo = torch.zeros(1, dtype=torch.long)
 
-    out_path = os.path.join(args.out_dir, f"{args.type}_model.onnx")
-    print(f"[2/4] Exporting to ONNX (opset={args.opset}) → {out_path}")
-
     torch.onnx.export(
         model,
         (boards, elos_self, elos_oppo),
@@ -72,16 +54,18 @@ def main():
             "logits_side_info": {0: "batch"},
             "logits_value":     {0: "batch"},
         },
-        opset_version=args.opset,
+        opset_version=opset,
         do_constant_folding=True,
         dynamo=False,  # Use legacy TorchScript exporter (cleaner ONNX, plays nice with quantizer).
     )
 
-    # Sanity-check: load with onnxruntime and compare a single forward pass.
-    print("[3/4] Verifying parity with onnxruntime …")
+
+def verify_onnx(model, out_path):
+    """Sanity-check: load with onnxruntime and compare a forward pass."""
     import onnxruntime as ort
     import numpy as np
 
+    in_ch = model.cfg.input_channels
     sess = ort.InferenceSession(out_path, providers=["CPUExecutionProvider"])
     np.random.seed(0)
     rng_boards = np.random.rand(2, in_ch, 8, 8).astype(np.float32)
@@ -105,6 +89,32 @@ def main():
         print(f"      output[{i}] max_abs_diff = {diff:.2e}")
         assert diff < 1e-3, f"output[{i}] diverges: {diff}"
 
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
+    ap.add_argument("--out-dir", default=str(ROOT / "models"))
+    ap.add_argument("--opset", type=int, default=17)
+    args = ap.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    print(f"[1/4] Downloading {args.type} checkpoint via maia2.from_pretrained …")
+    model = maia_model_mod.from_pretrained(type=args.type, device="cpu",
+                                           save_root=args.out_dir)
+    model.eval()
+
+    all_moves = get_all_possible_moves()
+    elo_dict = create_elo_dict()
+    print(f"      moves={len(all_moves)}  elo_buckets={len(elo_dict)}")
+
+    out_path = os.path.join(args.out_dir, f"{args.type}_model.onnx")
+    print(f"[2/4] Exporting to ONNX (opset={args.opset}) → {out_path}")
+    export_onnx(model, out_path, args.opset)
+
+    print("[3/4] Verifying parity with onnxruntime …")
+    verify_onnx(model, out_path)
+
     # Dump moves and elo dict so the JS side reuses the exact same encoding.
     print("[4/4] Writing moves.json and elo_dict.json …")
     with open(os.path.join(args.out_dir, "moves.json"), "w") as f:
@@ -114,7 +124,7 @@ def main():
 
     meta = {
         "type": args.type,
-        "input_channels": in_ch,
+        "input_channels": model.cfg.input_channels,
         "num_moves": len(all_moves),
         "num_elo_buckets": len(elo_dict),
         "opset": args.opset,
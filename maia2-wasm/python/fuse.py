@@ -0,0 +1,394 @@
+"""
+Fuse Maia 2's transformer blocks into ONNX Runtime's contrib kernels.
+
+The TorchScript export leaves every ViT block as ~100 primitive nodes:
+EloAwareAttention's rearranges (Shape / Gather / Slice / Reshape /
+Transpose arithmetic), two attention MatMuls around a Softmax, an
+Erf-expanded GELU, and LayerNormalization nodes fed by separate residual
+Adds. This pass rewrites them as
+
+    attention     → com.microsoft.MultiHeadAttention, fed by one Split of
+                    to_qkv. The Elo query ((B, h·d), from elo_query) is
+                    added to Q first: broadcast over the 8 tokens it is the
+                    same (B, h, 1, d) add PyTorch does per head.
+    GELU          → Gelu / BiasGelu
+    residual + LN → SkipLayerNormalization
+                    (these two via onnxruntime.transformers' BERT fusions)
+
+checks the fused graph against the export (max |Δ| per output on random
+inputs and, with --positions, agree@1 / KL / value MAE on real positions
+via lowrank.score) and times both under ORT CPU: session load, then
+latency at a few batch sizes with ORT's own graph optimizations at "all"
+(what the app and onnxruntime-web run) and "basic". At "all" ORT already
+fuses GELU and skip-LayerNorm by itself, though not this attention, and the
+ResNet trunk dominates the FLOPs, so the gains are modest; the report has
+them as measured:
+    models/{type}_model.fused.onnx
+    models/{type}_fused.json          parity + ms per position
+`quantize.py --fused` / `to_fp16.py --fused` take the fused graph as their
+input. The contrib ops run under onnxruntime (CPU / web wasm), not in the
+custom maia-runtime, which keeps reading the weights blob.
+
+Usage:
+    python fuse.py --type blitz [--positions data/positions]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper
+
+ROOT = Path(__file__).parent.resolve()
+
+# MAIA2Model fixes heads × dim_head at 16 × 64; only used when the reshape
+# feeding the attention doesn't carry the head count as a constant.
+NUM_HEADS = 16
+BATCH_SIZES = (1, 16, 256)
+LEVELS = ("all", "basic")
+MAX_ABS_DIFF = 1e-3
+
+
+# ─── Graph matching ───────────────────────────────────────────────────────
+
+class GraphIndex:
+    """Producer / consumer / constant lookups over a GraphProto."""
+
+    def __init__(self, graph: onnx.GraphProto):
+        self.graph = graph
+        self.producers = {out: node for node in graph.node for out in node.output}
+        self.consumers = defaultdict(list)
+        for node in graph.node:
+            for name in node.input:
+                self.consumers[name].append(node)
+        self.constants = {init.name: numpy_helper.to_array(init) for init in graph.initializer}
+        for node in graph.node:
+            if node.op_type == "Constant":
+                for attr in node.attribute:
+                    if attr.name == "value":
+                        self.constants[node.output[0]] = numpy_helper.to_array(attr.t)
+
+    def producer(self, name: str, op_type: str, perm=None):
+        node = self.producers.get(name)
+        if node is None or node.op_type != op_type:
+            return None
+        if perm is not None and attribute(node, "perm") != list(perm):
+            return None
+        return node
+
+    def sole_consumer(self, name: str, op_type: str, perm=None):
+        """The one node reading `name`, not counting Shape nodes (the export's
+        reshape arithmetic, which dies with the fused pattern)."""
+        nodes = [n for n in self.consumers.get(name, []) if n.op_type != "Shape"]
+        if len(nodes) != 1 or nodes[0].op_type != op_type:
+            return None
+        if perm is not None and attribute(nodes[0], "perm") != list(perm):
+            return None
+        return nodes[0]
+
+
+def attribute(node, name: str):
+    for attr in node.attribute:
+        if attr.name == name:
+            return helper.get_attribute_value(attr)
+    return None
+
+
+def split_heads_input(idx: GraphIndex, name: str, perm) -> tuple:
+    """(b, n, h·d) tensor and its Reshape for `name` = transpose(reshape(x)), else (None, None)."""
+    transpose = idx.producer(name, "Transpose", perm)
+    reshape = transpose and idx.producer(transpose.input[0], "Reshape")
+    return (reshape.input[0], reshape) if reshape else (None, None)
+
+
+def head_count(idx: GraphIndex, reshape) -> int | None:
+    """h from a `b n (h d) -> b n h d` Reshape whose shape is a constant or a Concat."""
+    shape = idx.constants.get(reshape.input[1])
+    if shape is not None and shape.size == 4 and shape[2] > 0:
+        return int(shape[2])
+    concat = idx.producer(reshape.input[1], "Concat")
+    if concat is not None and len(concat.input) == 4:
+        heads = idx.constants.get(concat.input[2])
+        if heads is not None and heads.size == 1 and int(heads.reshape(-1)[0]) > 0:
+            return int(heads.reshape(-1)[0])
+    return None
+
+
+def match_attention(idx: GraphIndex, softmax) -> dict | None:
+    """EloAwareAttention's core around `softmax`, or None if it doesn't fit.
+
+        scores  = (q [+ elo]) @ kᵀ · scale         q, k, v: (b, h, n, d)
+        context = softmax(scores) @ v  →  (b, n, h·d)
+    """
+    scaled = idx.producers.get(softmax.input[0])
+    if scaled is None or scaled.op_type not in ("Mul", "Div") or attribute(softmax, "axis") not in (-1, 3):
+        return None
+    const = [i for i in scaled.input if i in idx.constants and idx.constants[i].size == 1]
+    if len(const) != 1:
+        return None
+    value = float(idx.constants[const[0]].reshape(-1)[0])
+    scale = value if scaled.op_type == "Mul" else 1.0 / value
+    scores = idx.producer(next(i for i in scaled.input if i != const[0]), "MatMul")
+    if scores is None:
+        return None
+
+    elo = None
+    query = idx.producers.get(scores.input[0])
+    if query is not None and query.op_type == "Add":
+        for a, b in (query.input, reversed(query.input)):
+            q, q_reshape = split_heads_input(idx, a, (0, 2, 1, 3))
+            elo_reshape = idx.producer(b, "Reshape")
+            if q and elo_reshape:
+                elo = elo_reshape.input[0]
+                break
+        else:
+            return None
+    else:
+        q, q_reshape = split_heads_input(idx, scores.input[0], (0, 2, 1, 3))
+    k, _ = split_heads_input(idx, scores.input[1], (0, 2, 3, 1))
+    if not (q and k):
+        return None
+
+    context = idx.sole_consumer(softmax.output[0], "MatMul")
+    if context is None or context.input[0] != softmax.output[0]:
+        return None
+    v, _ = split_heads_input(idx, context.input[1], (0, 2, 1, 3))
+    merge = idx.sole_consumer(context.output[0], "Transpose", (0, 2, 1, 3))
+    out = merge and idx.sole_consumer(merge.output[0], "Reshape")
+    if not (v and out):
+        return None
+    return {"q": q, "k": k, "v": v, "elo": elo, "scale": scale,
+            "heads": head_count(idx, q_reshape), "output": out}
+
+
+def qkv_split(idx: GraphIndex, names) -> tuple | None:
+    """(packed tensor, width) when q, k, v are the three equal Slices of one tensor."""
+    slices = [idx.producer(name, "Slice") for name in names]
+    if not all(slices) or len({s.input[0] for s in slices}) != 1:
+        return None
+    packed = slices[0].input[0]
+    matmul = idx.producer(packed, "MatMul")
+    weight = matmul and idx.constants.get(matmul.input[1])
+    if weight is None or weight.ndim != 2 or weight.shape[1] % 3:
+        return None
+    return packed, weight.shape[1] // 3
+
+
+def fuse_attention(model: onnx.ModelProto, num_heads: int = NUM_HEADS) -> tuple[onnx.ModelProto, int]:
+    """Replace every matched attention with MultiHeadAttention; (model, count)."""
+    graph = model.graph
+    idx = GraphIndex(graph)
+    replaced, new_nodes, new_inits = {}, [], []
+    for softmax in [n for n in graph.node if n.op_type == "Softmax"]:
+        match = match_attention(idx, softmax)
+        if match is None:
+            continue
+        prefix = match["output"].name.rsplit("/", 1)[0] + "/fused"
+        q, k, v = match["q"], match["k"], match["v"]
+        nodes = []
+        split = qkv_split(idx, (q, k, v))
+        if split is not None:
+            packed, width = split
+            sizes = f"{prefix}/qkv_sizes"
+            new_inits.append(numpy_helper.from_array(np.array([width] * 3, dtype=np.int64), sizes))
+            q, k, v = f"{prefix}/q", f"{prefix}/k", f"{prefix}/v"
+            nodes.append(helper.make_node("Split", [packed, sizes], [q, k, v], axis=-1,
+                                          name=f"{prefix}/Split"))
+        if match["elo"] is not None:
+            axes = f"{prefix}/elo_axes"
+            new_inits.append(numpy_helper.from_array(np.array([1], dtype=np.int64), axes))
+            nodes += [
+                helper.make_node("Unsqueeze", [match["elo"], axes], [f"{prefix}/elo"],
+                                 name=f"{prefix}/Unsqueeze"),
+                helper.make_node("Add", [q, f"{prefix}/elo"], [f"{prefix}/q_elo"], name=f"{prefix}/Add"),
+            ]
+            q = f"{prefix}/q_elo"
+        nodes.append(helper.make_node(
+            "MultiHeadAttention", [q, k, v], [match["output"].output[0]], domain="com.microsoft",
+            num_heads=match["heads"] or num_heads, scale=match["scale"], name=f"{prefix}/MultiHeadAttention",
+        ))
+        replaced[match["output"].name] = nodes
+
+    for node in graph.node:
+        new_nodes += replaced.get(node.name, [node])
+    del graph.node[:]
+    graph.node.extend(new_nodes)
+    graph.initializer.extend(new_inits)
+    prune(graph)
+    return model, len(replaced)
+
+
+def prune(graph: onnx.GraphProto):
+    """Drop nodes and initializers nothing downstream reads."""
+    live = {o.name for o in graph.output}
+    kept = []
+    for node in reversed(graph.node):
+        if any(out in live for out in node.output):
+            kept.append(node)
+            live.update(node.input)
+    kept.reverse()
+    del graph.node[:]
+    graph.node.extend(kept)
+    inits = [init for init in graph.initializer if init.name in live]
+    del graph.initializer[:]
+    graph.initializer.extend(inits)
+
+
+def fuse_ort(model: onnx.ModelProto, num_heads: int, hidden: int) -> tuple[onnx.ModelProto, dict]:
+    """GELU and skip-LayerNorm fusions from onnxruntime.transformers; (model, fused op counts)."""
+    from onnxruntime.transformers.fusion_options import FusionOptions
+    from onnxruntime.transformers.onnx_model_bert import BertOnnxModel
+
+    options = FusionOptions("bert")
+    options.enable_attention = False  # done above; ORT's BERT pattern has no Elo query
+    options.enable_embed_layer_norm = False
+    bert = BertOnnxModel(model, num_heads, hidden)
+    bert.optimize(options)
+    bert.topological_sort()
+    model = bert.model
+    if not any(o.domain == "com.microsoft" for o in model.opset_import):
+        model.opset_import.append(helper.make_opsetid("com.microsoft", 1))
+    return model, bert.get_fused_operator_statistics()
+
+
+def hidden_size(model: onnx.ModelProto) -> int:
+    """Width of the transformer (LayerNormalization scale length)."""
+    idx = GraphIndex(model.graph)
+    for node in model.graph.node:
+        if node.op_type == "LayerNormalization" and node.input[1] in idx.constants:
+            return int(idx.constants[node.input[1]].size)
+    return 0
+
+
+# ─── Parity / timing ──────────────────────────────────────────────────────
+
+def random_feeds(n: int, seed: int, channels: int = 18):
+    rng = np.random.default_rng(seed)
+    boards = (rng.random((n, channels, 8, 8)) < 0.1).astype(np.float32)
+    elos = rng.integers(0, 11, size=(2, n)).astype(np.int64)
+    return boards, elos[0], elos[1]
+
+
+def session(path, level: str = "all"):
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, f"ORT_ENABLE_{level.upper()}")
+    return ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+
+
+def max_abs_diff(base_path, fused_path, feeds) -> list[float]:
+    base, fused = session(base_path), session(fused_path)
+    boards, elos_self, elos_oppo = feeds
+    feed = {"boards": boards, "elos_self": elos_self, "elos_oppo": elos_oppo}
+    return [float(np.abs(a - b).max()) for a, b in zip(base.run(None, feed), fused.run(None, feed))]
+
+
+def load_ms(path, level: str = "all", repeats: int = 3) -> float:
+    """Session creation time (graph optimization included), best of `repeats`."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        session(path, level)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def ms_per_position(path, feeds, batch: int, level: str = "all", min_seconds: float = 1.0) -> float:
+    """Best-of-repeats CPU latency per position at one batch size."""
+    sess = session(path, level)
+    boards, elos_self, elos_oppo = (f[:batch] for f in feeds)
+    feed = {"boards": boards, "elos_self": elos_self, "elos_oppo": elos_oppo}
+    sess.run(None, feed)  # warm-up
+    best, spent = float("inf"), 0.0
+    while spent < min_seconds:
+        t0 = time.perf_counter()
+        sess.run(None, feed)
+        elapsed = time.perf_counter() - t0
+        best, spent = min(best, elapsed), spent + elapsed
+    return best * 1000 / len(boards)
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--type", choices=["blitz", "rapid", "blitz_student", "rapid_student"], default="blitz")
+    ap.add_argument("--models-dir", default=str(ROOT / "models"))
+    ap.add_argument("--positions", help="packed dataset directory for the agree@1 / KL check")
+    ap.add_argument("--n", type=int, default=1000, help="positions to score on")
+    ap.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    ap.add_argument("--num-heads", type=int, default=NUM_HEADS)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    models_dir = Path(args.models_dir)
+    src = models_dir / f"{args.type}_model.onnx"
+    dst = models_dir / f"{args.type}_model.fused.onnx"
+    # Checked under a temporary name, so a graph that fails parity never
+    # sits where quantize.py / to_fp16.py --fused and build_models.py look.
+    tmp = dst.with_suffix(".tmp.onnx")
+    if not src.exists():
+        raise SystemExit(f"missing input: {src}")
+
+    model = onnx.load(str(src))
+    before = len(model.graph.node)
+    model, attention = fuse_attention(model, args.num_heads)
+    model, fused_ops = fuse_ort(model, args.num_heads, hidden_size(model))
+    fused_ops = {op: n for op, n in fused_ops.items() if n}
+    fused_ops["MultiHeadAttention"] = attention
+    onnx.checker.check_model(model)
+    onnx.save(model, str(tmp))
+    print(f"Fused {src.name}: {before} → {len(model.graph.node)} nodes  "
+          + "  ".join(f"{op}×{n}" for op, n in sorted(fused_ops.items())), file=sys.stderr)
+    if not attention:
+        print("  warning: no attention block matched", file=sys.stderr)
+
+    batch_sizes = sorted({int(b) for b in args.batch_sizes.split(",") if b})
+    feeds = random_feeds(max(batch_sizes + [64]), args.seed)
+    diffs = max_abs_diff(src, tmp, feeds)
+    print("Parity (random inputs): " + "  ".join(f"output[{i}] {d:.2e}" for i, d in enumerate(diffs)),
+          file=sys.stderr)
+    report = {"type": args.type, "nodes": {"export": before, "fused": len(model.graph.node)},
+              "fused_ops": fused_ops, "max_abs_diff": [round(d, 7) for d in diffs]}
+
+    if args.positions:
+        from lowrank import load_positions, run_model, score
+
+        real, mask, played = load_positions(args.positions, args.n, args.seed)
+        report["positions"] = int(len(played))
+        report["score"] = score(run_model(src, real), run_model(tmp, real), mask, played)
+        feeds = real if len(played) >= max(batch_sizes) else feeds
+        print(f"Parity ({len(played)} positions): agree@1 {report['score']['agree@1']:.4f}  "
+              f"KL {report['score']['kl']:.2e}  value MAE {report['score']['value_mae']:.2e}", file=sys.stderr)
+
+    for level in LEVELS:
+        base, fused = load_ms(src, level), load_ms(tmp, level)
+        timings = {"load_ms": {"export": round(base, 1), "fused": round(fused, 1)}}
+        print(f"ORT level {level}: session load {base:.0f} → {fused:.0f} ms", file=sys.stderr)
+        for batch in batch_sizes:
+            base, fused = ms_per_position(src, feeds, batch, level), ms_per_position(tmp, feeds, batch, level)
+            timings[f"batch_{batch}"] = {"export": round(base, 4), "fused": round(fused, 4),
+                                         "speedup": round(base / fused, 3)}
+            print(f"  batch {batch:4d}: {base:8.3f} → {fused:8.3f} ms/position  ({base / fused:.2f}×)",
+                  file=sys.stderr)
+        report[f"ort_{level}"] = timings
+
+    report_path = models_dir / f"{args.type}_fused.json"
+    report_path.write_text(json.dumps(report, indent=2) + "\n")
+    if max(diffs) > MAX_ABS_DIFF:
+        tmp.unlink()
+        dst.unlink(missing_ok=True)  # an older fused graph no longer matches the export
+        raise SystemExit(f"fused model diverges (max |Δ| {max(diffs):.2e} > {MAX_ABS_DIFF}); see {report_path}")
+    os.replace(tmp, dst)
+    print(f"✓ {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Parallel PGN ingestion.
+
+SAN parsing in python-chess is the bottleneck of corpus work and runs on
+one core. This splits PGN input into chunks at game boundaries, parses the
+chunks in a process pool and writes the results back in input order, as
+either move streams (JSONL, one game per line) or a packed position
+dataset (see dataset.py).
+
+Plain .pgn files are split by byte offset: each worker seeks to its own
+range, so the parent never reads the file. Compressed input (.gz / .bz2 /
+.zst) cannot be seeked; the parent decompresses and hands out game-aligned
+text chunks instead.
+
+Header filters (time control, Elo range) are checked on the tag pairs
+alone — games that fail them are skipped without parsing a single move.
+
+Usage:
+    python ingest.py positions lichess_2024-01.pgn --out data/positions \\
+        --time-control blitz rapid --min-elo 1100 --max-elo 2000
+    python ingest.py moves games.pgn.zst --out games.jsonl --workers 8
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from functools import cache
+from multiprocessing import Pool
+from pathlib import Path
+
+import dataset
+
+CHUNK_BYTES = 8 << 20
+
+# Lichess speed categories: estimated duration = base + 40 × increment (s).
+SPEEDS = (("ultrabullet", 29), ("bullet", 179), ("blitz", 479), ("rapid", 1499), ("classical", float("inf")))
+
+
+def speed_of(time_control: str) -> str | None:
+    """'180+2' → 'blitz'; '-' → 'correspondence'; None if unparseable."""
+    if time_control == "-":
+        return "correspondence"
+    try:
+        base, _, inc = time_control.partition("+")
+        estimate = int(base) + 40 * int(inc or 0)
+    except ValueError:
+        return None
+    return next(name for name, limit in SPEEDS if estimate <= limit)
+
+
+@dataclass
+class GameFilter:
+    """Tag-pair filter, applied before any move is parsed."""
+    speeds: list[str] = field(default_factory=list)  # empty = any
+    min_elo: int = 0
+    max_elo: int = 0  # 0 = no upper bound
+    both_players: bool = True  # Elo bounds apply to both players (else to either)
+    require_result: bool = True
+
+    def accepts(self, headers: dict) -> bool:
+        if self.require_result and headers.get("Result") not in dataset.RESULTS:
+            return False
+        if self.speeds and speed_of(headers.get("TimeControl", "")) not in self.speeds:
+            return False
+        if self.min_elo or self.max_elo:
+            elos = [dataset.header_elo(headers.get(tag)) for tag in ("WhiteElo", "BlackElo")]
+            ok = [e > 0 and e >= self.min_elo and (not self.max_elo or e <= self.max_elo) for e in elos]
+            if not (all(ok) if self.both_players else any(ok)):
+                return False
+        return True
+
+
+# ─── Chunking ─────────────────────────────────────────────────────────────
+
+def _next_game_start(f, offset: int) -> int:
+    """First byte offset >= `offset` where a game's tag section begins."""
+    if offset == 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()  # finish the line we landed in
+    seen_moves = False
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            return pos
+        if line.startswith(b"["):
+            if seen_moves:
+                return pos
+        elif line.strip():
+            seen_moves = True
+
+
+def byte_chunks(path, chunk_bytes: int = CHUNK_BYTES) -> list[tuple[int, int]]:
+    """(start, end) byte ranges of an uncompressed PGN, aligned to games."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for offset in range(chunk_bytes, size, chunk_bytes):
+            start = _next_game_start(f, offset)
+            if start > bounds[-1]:
+                bounds.append(start)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def text_chunks(path, chunk_bytes: int = CHUNK_BYTES):
+    """Game-aligned text chunks of a (compressed) PGN, read sequentially."""
+    buf, size, seen_moves = [], 0, False
+    with dataset.open_pgn(path) as f:
+        for line in f:
+            if line.startswith("[") and seen_moves:
+                seen_moves = False
+                if size >= chunk_bytes:
+                    yield "".join(buf)
+                    buf, size = [], 0
+            elif line.strip() and not line.startswith("["):
+                seen_moves = True
+            buf.append(line)
+            size += len(line)
+    if buf:
+        yield "".join(buf)
+
+
+def iter_tasks(path, chunk_bytes: int = CHUNK_BYTES):
+    path = str(path)
+    if path.endswith((".gz", ".bz2", ".zst")):
+        for text in text_chunks(path, chunk_bytes):
+            yield ("text", text)
+    else:
+        for start, end in byte_chunks(path, chunk_bytes):
+            yield ("range", (path, start, end))
+
+
+# ─── Workers ──────────────────────────────────────────────────────────────
+
+@cache
+def _vocab(path: str):
+    return dataset.load_vocab(path)
+
+
+def _read_chunk(task) -> str:
+    kind, payload = task
+    if kind == "text":
+        return payload
+    path, start, end = payload
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode("utf-8", errors="replace")
+
+
+def _work(job):
+    """Parse one chunk. Returns (output, stats) — output depends on `mode`."""
+    task, mode, game_filter, vocab_path = job
+    vocab = _vocab(vocab_path) if mode == "positions" else None
+    stats = {"games": 0, "filtered": 0, "errors": 0, "kept": 0}
+    out = []
+    for game in dataset.read_games(io.StringIO(_read_chunk(task)), vocab, game_filter.accepts):
+        stats["games"] += 1
+        if game.skipped:
+            stats["filtered"] += 1
+            continue
+        if game.error:
+            stats["errors"] += 1
+            continue
+        headers = game.headers
+        if mode == "moves":
+            if not game.moves:
+                continue
+            record = {
+                "white_elo": dataset.header_elo(headers.get("WhiteElo")),
+                "black_elo": dataset.header_elo(headers.get("BlackElo")),
+                "time_control": headers.get("TimeControl"),
+                "result": headers.get("Result"),
+                "moves": [m.uci() for m in game.moves],
+            }
+            if headers.get("SetUp") == "1" and "FEN" in headers:
+                record["fen"] = headers["FEN"]
+            out.append(json.dumps(record))
+        else:
+            encoded = game.columns()
+            if encoded is None:
+                continue
+            out.append(encoded)
+        stats["kept"] += 1
+    if mode == "positions":
+        out = dataset.concat_games(out)
+    return out, stats
+
+
+def imap_ordered(pool, func, jobs, max_inflight: int):
+    """pool.imap with bounded look-ahead (imap would read all of `jobs` eagerly)."""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.apply_async(func, (job,)))
+        if len(pending) >= max_inflight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+# ─── Driver ───────────────────────────────────────────────────────────────
+
+def ingest(pgns, out, mode: str = "positions", game_filter: GameFilter = None,
+           workers: int = None, chunk_bytes: int = CHUNK_BYTES,
+           vocab_path=dataset.DEFAULT_VOCAB, max_games: int = None) -> dict:
+    """Parse `pgns` in parallel and write games in input order.
+
+    Args:
+        mode: "positions" (packed dataset directory) or "moves" (JSONL file).
+        game_filter: Tag-pair filter; None keeps every game with a result.
+        workers: Process count (default: all cores).
+        max_games: Stop after this many kept games.
+    """
+    game_filter = game_filter or GameFilter()
+    workers = workers or os.cpu_count() or 1
+    totals = {"games": 0, "filtered": 0, "errors": 0, "kept": 0}
+
+    if mode == "positions":
+        writer = dataset.PositionWriter(out)
+        sink = None
+    else:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        writer = None
+        sink = open(out, "w")
+
+    t0 = time.perf_counter()
+    with Pool(workers) as pool:
+        for pgn in pgns:
+            if writer:
+                writer.sources.append(str(pgn))
+            jobs = ((task, mode, game_filter, str(vocab_path)) for task in iter_tasks(pgn, chunk_bytes))
+            for output, stats in imap_ordered(pool, _work, jobs, max_inflight=2 * workers):
+                if max_games:
+                    room = max_games - totals["kept"]
+                    if stats["kept"] > room:
+                        output = _truncate(output, mode, room)
+                        stats["kept"] = room
+                for k in totals:
+                    totals[k] += stats[k]
+                if mode == "positions":
+                    if len(output[1]):
+                        writer.add_block(*output)
+                elif output:
+                    sink.write("\n".join(output) + "\n")
+                dt = time.perf_counter() - t0
+                print(f"  {totals['games']:,} games read, {totals['kept']:,} kept "
+                      f"({totals['games'] / max(dt, 1e-9):,.0f} games/s)", file=sys.stderr)
+                if max_games and totals["kept"] >= max_games:
+                    break
+            if max_games and totals["kept"] >= max_games:
+                break
+
+    if writer:
+        writer.close(extra_meta={"filter": asdict(game_filter)})
+    else:
+        sink.close()
+    totals["seconds"] = round(time.perf_counter() - t0, 2)
+    return totals
+
+
+def _truncate(output, mode: str, keep: int):
+    if mode == "moves":
+        return output[:keep]
+    columns, lengths = output
+    rows = int(lengths[:keep].sum())
+    return {name: col[:rows] for name, col in columns.items()}, lengths[:keep]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("mode", choices=["positions", "moves"],
+                    help="packed position dataset, or JSONL move streams")
+    ap.add_argument("pgn", nargs="+")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1 << 20))
+    ap.add_argument("--time-control", nargs="*", default=[],
+                    choices=[name for name, _ in SPEEDS] + ["correspondence"])
+    ap.add_argument("--min-elo", type=int, default=0)
+    ap.add_argument("--max-elo", type=int, default=0)
+    ap.add_argument("--either-player", action="store_true",
+                    help="Elo bounds need only hold for one player")
+    ap.add_argument("--vocab", default=str(dataset.DEFAULT_VOCAB))
+    ap.add_argument("--max-games", type=int)
+    args = ap.parse_args()
+
+    game_filter = GameFilter(speeds=args.time_control, min_elo=args.min_elo, max_elo=args.max_elo,
+                             both_players=not args.either_player)
+    totals = ingest(args.pgn, args.out, args.mode, game_filter, args.workers,
+                    int(args.chunk_mb * (1 << 20)), args.vocab, args.max_games)
+    print(f"✓ {args.out}: {totals['kept']:,} of {totals['games']:,} games "
+          f"({totals['filtered']:,} filtered, {totals['errors']:,} with errors) in {totals['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
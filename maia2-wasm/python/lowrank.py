@@ -0,0 +1,310 @@
+"""
+Low-rank (truncated SVD) variants of Maia 2's largest dense layers.
+
+The policy head `fc_1` (1024 × 1880) and the ViT FFN linears (1024 × 1024,
+two per block) hold most of the non-conv weight bytes. Each selected
+[in, out] matrix W is replaced by U [in, r] · V [r, out] from its rank-r
+SVD (singular values split evenly between the factors), which stores and
+multiplies r · (in + out) weights instead of in · out.
+
+For every rank the tool writes
+    models/{type}_model.lr{r}.onnx      ONNX variant (MatMul/Gemm → two MatMuls)
+    models/{type}_weights.lr{r}.bin     custom-runtime blob (+ manifest .json),
+                                        factors declared in the blob header
+and scores the ONNX variant against the unmodified model on real positions
+from a packed dataset (dataset.py / ingest.py):
+    match@1   top legal move == the move actually played (vs the base model's)
+    agree@1   top legal move == the base model's top move
+    kl        mean KL(base ‖ variant) over the legal-move distribution
+    value_mae mean |Δ value|
+The report goes to models/{type}_lowrank.json.
+
+Layers are located in the ONNX graph by content — the initializer equal to
+the runtime tensor (or its transpose, for Gemm transB=1) — so this works on
+any export of the same checkpoint whatever the initializer names.
+
+Usage:
+    python lowrank.py --type blitz \\
+        --weights ../maia-runtime/native/weights.bin \\
+        --positions data/positions --ranks 128,256,384 --layers head,ffn
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper
+
+from dataset import NO_MOVE, PositionDataset
+
+ROOT = Path(__file__).parent.resolve()
+sys.path.insert(0, str(ROOT.parent / "maia-runtime" / "scripts"))
+
+import extract_weights  # noqa: E402
+
+LAYERS = ("head", "ffn")
+
+
+def selected(name: str, layers) -> bool:
+    """Is runtime tensor `name` one of the `layers` groups?"""
+    if "head" in layers and name == "fc_1.weight":
+        return True
+    return "ffn" in layers and name.endswith((".1.net.1.weight", ".1.net.4.weight"))
+
+
+def load_runtime_tensors(weights_path) -> list[tuple[str, np.ndarray]]:
+    """(name, array) of a plain weights.bin, in load_weights() order."""
+    source = extract_weights.BlobSource(Path(weights_path).read_bytes())
+    tensors = extract_weights.collect_tensors(source, extract_weights.default_cfg())
+    if source.pos != len(source.floats):
+        raise SystemExit(f"{weights_path}: not a Maia 2 blob ({len(source.floats) - source.pos} trailing floats)")
+    return tensors
+
+
+class Factorizer:
+    """Truncated SVDs of a set of matrices; each matrix is decomposed once."""
+
+    def __init__(self, matrices: dict[str, np.ndarray]):
+        self.svd = {}
+        for name, mat in matrices.items():
+            u, s, vt = np.linalg.svd(mat.astype(np.float64), full_matrices=False)
+            self.svd[name] = (u, s, vt)
+
+    def factors(self, name: str, rank: int) -> tuple[np.ndarray, np.ndarray]:
+        u, s, vt = self.svd[name]
+        root = np.sqrt(s[:rank])
+        return ((u[:, :rank] * root).astype(np.float32),
+                (root[:, None] * vt[:rank]).astype(np.float32))
+
+    def energy(self, name: str, rank: int) -> float:
+        """Share of the squared Frobenius norm a rank-`rank` factorization keeps."""
+        s2 = self.svd[name][1] ** 2
+        return float(s2[:rank].sum() / s2.sum())
+
+
+# ─── ONNX rewriting ───────────────────────────────────────────────────────
+
+def locate(model: onnx.ModelProto, targets: dict[str, np.ndarray]) -> dict[str, tuple[str, bool]]:
+    """runtime name → (initializer name, stored transposed) for every target."""
+    by_shape = {}
+    for init in model.graph.initializer:
+        if len(init.dims) == 2:
+            by_shape.setdefault(tuple(init.dims), []).append(init)
+    found = {}
+    for name, mat in targets.items():
+        for transposed, want in ((False, mat), (True, mat.T)):
+            for init in by_shape.get(want.shape, []):
+                if np.array_equal(numpy_helper.to_array(init), want):
+                    found[name] = (init.name, transposed)
+                    break
+            if name in found:
+                break
+        else:
+            raise SystemExit(f"{name}: no matching initializer in the ONNX graph (different checkpoint?)")
+    return found
+
+
+def factor_onnx(model: onnx.ModelProto, located: dict, factors: dict) -> onnx.ModelProto:
+    """Copy of `model` with each located weight replaced by its U · V factors."""
+    model = onnx.ModelProto.FromString(model.SerializeToString())
+    graph = model.graph
+    by_init = {init_name: name for name, (init_name, _) in located.items()}
+    added = set()
+
+    def add_init(arr, name):
+        if name not in added:
+            graph.initializer.extend([numpy_helper.from_array(arr, name)])
+            added.add(name)
+
+    nodes = []
+    for node in graph.node:
+        weight = node.input[1] if len(node.input) > 1 else None
+        if weight not in by_init or node.op_type not in ("MatMul", "Gemm"):
+            nodes.append(node)
+            continue
+        u, v = factors[by_init[weight]]
+        attrs = {a.name: helper.get_attribute_value(a) for a in node.attribute}
+        if node.op_type == "Gemm" and attrs.get("transA", 0):
+            raise SystemExit(f"{node.name}: Gemm with transA is not supported")
+        u_name, v_name, mid = f"{weight}.lr_u", f"{weight}.lr_v", f"{node.output[0]}.lr_mid"
+        node_name = node.name or node.output[0]
+        add_init(u, u_name)
+        nodes.append(helper.make_node("MatMul", [node.input[0], u_name], [mid], name=f"{node_name}.lr_u"))
+        if node.op_type == "MatMul":
+            add_init(v, v_name)
+            nodes.append(helper.make_node("MatMul", [mid, v_name], list(node.output), name=f"{node_name}.lr_v"))
+        else:
+            # Keep the Gemm (bias, alpha, beta); its B becomes V in the same orientation.
+            add_init(v.T.copy() if attrs.get("transB", 0) else v, v_name)
+            nodes.append(helper.make_node("Gemm", [mid, v_name, *node.input[2:]], list(node.output),
+                                          name=f"{node_name}.lr_v", **attrs))
+    del graph.node[:]
+    graph.node.extend(nodes)
+    still_used = {i for node in graph.node for i in node.input}
+    kept = [init for init in graph.initializer if init.name in still_used]
+    del graph.initializer[:]
+    graph.initializer.extend(kept)
+    return model
+
+
+# ─── Scoring ──────────────────────────────────────────────────────────────
+
+def load_positions(path, n: int, seed: int):
+    """(feeds, legal mask, played idx) for `n` random rows with a vocab move."""
+    ds = PositionDataset(path)
+    candidates = np.nonzero(np.asarray(ds.move) != NO_MOVE)[0]
+    if not len(candidates):
+        raise SystemExit(f"{path}: no positions with a vocabulary move")
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(candidates, min(n, len(candidates)), replace=False))
+    boards, elos_self, elos_oppo = ds.model_inputs(rows)
+    return ((boards, elos_self, elos_oppo), ds.legal_mask(rows),
+            np.asarray(ds.move[rows]).astype(np.int64))
+
+
+def run_model(path, feeds, batch: int = 256) -> tuple[np.ndarray, np.ndarray, float]:
+    """(policy logits, values, ms per position) under ONNX Runtime CPU."""
+    import onnxruntime as ort
+
+    sess = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+    names = [o.name for o in sess.get_outputs()]
+    value_name = "logits_value" if "logits_value" in names else names[-1]
+    boards, elos_self, elos_oppo = feeds
+    logits, values = [], []
+    t0 = time.perf_counter()
+    for s in range(0, len(boards), batch):
+        out = sess.run([names[0], value_name], {
+            "boards": boards[s:s + batch],
+            "elos_self": elos_self[s:s + batch],
+            "elos_oppo": elos_oppo[s:s + batch],
+        })
+        logits.append(out[0])
+        values.append(np.asarray(out[1]).reshape(-1))
+    ms = (time.perf_counter() - t0) * 1000 / max(1, len(boards))
+    return np.concatenate(logits), np.concatenate(values), ms
+
+
+def log_softmax_legal(logits: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    masked = np.where(mask, logits.astype(np.float64), -np.inf)
+    peak = masked.max(axis=1, keepdims=True)
+    return masked - peak - np.log(np.exp(masked - peak).sum(axis=1, keepdims=True))
+
+
+def score(base, variant, mask, played) -> dict:
+    base_lp, var_lp = log_softmax_legal(base[0], mask), log_softmax_legal(variant[0], mask)
+    base_top, var_top = base_lp.argmax(axis=1), var_lp.argmax(axis=1)
+    p = np.exp(base_lp)
+    diff = np.subtract(base_lp, var_lp, out=np.zeros_like(base_lp), where=mask)
+    kl = (p * diff).sum(axis=1)
+    return {
+        "match@1": round(float((var_top == played).mean()), 4),
+        "match@1_base": round(float((base_top == played).mean()), 4),
+        "agree@1": round(float((var_top == base_top).mean()), 4),
+        "kl": round(float(kl.mean()), 5),
+        "value_mae": round(float(np.abs(variant[1] - base[1]).mean()), 5),
+        "ms_per_position": round(variant[2], 3),
+    }
+
+
+def write_runtime_variant(out_path: Path, tensors, factors: dict, layers, rank: int,
+                          layout: str, scores: dict):
+    """Runtime blob with each factored tensor's slot holding `.u` then `.v`."""
+    runtime = []
+    for name, arr in tensors:
+        if name in factors:
+            u, v = factors[name]
+            runtime += [(f"{name}.u", u), (f"{name}.v", v)]
+        else:
+            runtime.append((name, arr))
+    blob, manifest = extract_weights.build_blob(
+        runtime, layout,
+        rank_ffn=rank if "ffn" in layers else 0,
+        rank_head=rank if "head" in layers else 0,
+    )
+    manifest["lowrank"] = {k: scores[k] for k in ("match@1", "agree@1", "kl")}
+    extract_weights.write_blob(out_path, blob, manifest)
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
+    ap.add_argument("--models-dir", default=str(ROOT / "models"))
+    ap.add_argument("--onnx", help="fp32 model (default: {models-dir}/{type}_model.onnx)")
+    ap.add_argument("--weights", required=True, help="plain runtime weights.bin of the same checkpoint")
+    ap.add_argument("--positions", required=True, help="packed dataset directory (dataset.py build)")
+    ap.add_argument("--ranks", default="128,256,384", help="comma-separated ranks to try")
+    ap.add_argument("--layers", default="head,ffn", help=f"comma-separated subset of {','.join(LAYERS)}")
+    ap.add_argument("--layout", choices=sorted(extract_weights.LAYOUTS), default="plain",
+                    help="runtime blob layout (see extract_weights.py)")
+    ap.add_argument("--n", type=int, default=2000, help="positions to score on")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--score-only", action="store_true", help="don't keep the variant files")
+    args = ap.parse_args()
+
+    layers = [l for l in args.layers.split(",") if l]
+    if not layers or set(layers) - set(LAYERS):
+        raise SystemExit(f"--layers must be a subset of {','.join(LAYERS)}")
+    ranks = sorted({int(r) for r in args.ranks.split(",") if r})
+    models_dir = Path(args.models_dir)
+    onnx_path = Path(args.onnx or models_dir / f"{args.type}_model.onnx")
+    if not onnx_path.exists():
+        raise SystemExit(f"missing input: {onnx_path}")
+
+    tensors = load_runtime_tensors(args.weights)
+    targets = {name: arr for name, arr in tensors if selected(name, layers)}
+    dense_params = sum(t.size for t in targets.values())
+    total_params = sum(t.size for _, t in tensors)
+    print(f"Factorizing {len(targets)} layers ({dense_params / 1e6:.1f} M of {total_params / 1e6:.1f} M weights)",
+          file=sys.stderr)
+    model = onnx.load(str(onnx_path))
+    located = locate(model, targets)
+    factorizer = Factorizer(targets)
+
+    print(f"Scoring on {args.n} positions from {args.positions}", file=sys.stderr)
+    feeds, mask, played = load_positions(args.positions, args.n, args.seed)
+    base = run_model(onnx_path, feeds)
+
+    report = {"type": args.type, "layers": layers, "positions": int(len(played)),
+              "base": {"match@1": round(float((log_softmax_legal(base[0], mask).argmax(axis=1) == played).mean()), 4),
+                       "ms_per_position": round(base[2], 3), "params": int(total_params)},
+              "variants": []}
+    for rank in ranks:
+        if any(rank * sum(t.shape) >= t.size for t in targets.values()):
+            print(f"  rank {rank}: factors would not be smaller than every dense layer, skipped",
+                  file=sys.stderr)
+            continue
+        factors = {name: factorizer.factors(name, rank) for name in targets}
+        params = total_params - dense_params + sum(u.size + v.size for u, v in factors.values())
+        onnx_out = models_dir / f"{args.type}_model.lr{rank}.onnx"
+        onnx_out.parent.mkdir(parents=True, exist_ok=True)
+        onnx.save(factor_onnx(model, located, factors), str(onnx_out))
+
+        entry = {"rank": rank, "params": int(params),
+                 "params_ratio": round(params / total_params, 4),
+                 "energy": {name: round(factorizer.energy(name, rank), 4) for name in targets}}
+        entry.update(score(base, run_model(onnx_out, feeds), mask, played))
+
+        if args.score_only:
+            onnx_out.unlink()
+        else:
+            bin_out = models_dir / f"{args.type}_weights.lr{rank}.bin"
+            write_runtime_variant(bin_out, tensors, factors, layers, rank, args.layout, entry)
+            entry.update(onnx=onnx_out.name, weights=bin_out.name)
+        report["variants"].append(entry)
+        print(f"  rank {rank:4d}: {entry['params_ratio'] * 100:5.1f}% weights  "
+              f"match@1 {entry['match@1']:.4f} (base {entry['match@1_base']:.4f})  "
+              f"agree@1 {entry['agree@1']:.4f}  KL {entry['kl']:.5f}", file=sys.stderr)
+
+    report_path = models_dir / f"{args.type}_lowrank.json"
+    report_path.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"✓ {report_path}")
+
+
+if __name__ == "__main__":
+    main()
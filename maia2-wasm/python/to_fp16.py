@@ -14,11 +14,13 @@ ROOT = Path(__file__).parent.resolve()
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--type", choices=["blitz", "rapid"], default="blitz")
+    ap.add_argument("--type", choices=["blitz", "rapid", "blitz_student", "rapid_student"], default="blitz")
     ap.add_argument("--models-dir", default=str(ROOT / "models"))
+    ap.add_argument("--fused", action="store_true",
+                    help="start from {type}_model.fused.onnx (fuse.py) instead of the plain export")
     args = ap.parse_args()
 
-    src = os.path.join(args.models_dir, f"{args.type}_model.onnx")
+    src = os.path.join(args.models_dir, f"{args.type}_model{'.fused' if args.fused else ''}.onnx")
     dst = os.path.join(args.models_dir, f"{args.type}_model.fp16.onnx")
     if not os.path.exists(src):
         raise SystemExit(f"missing input: {src}")